@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Column-at-a-time act cue features shared by the probe, VoC training and the gates.
+
+Texts are lower-cased and joined with a NUL separator, each cue list is compiled into one
+regex alternation, and a single scan over the joined column marks the rows that match
+(match offsets -> row ids via searchsorted). Rules reproduce train_probe.feats (probe
+features) and the cue_bits used by build_voc_train / gate_blend (VoC features).
+"""
+import math, re
+import numpy as np
+import metrics
+
+PROBE_ACTS = ["statement","question","request","promise","expressive","declaration"]
+VOC_ACTS = ["question","request","statement","promise","expressive","declaration"]
+WH = ("who","what","when","where","why","how","which","whom","whose")
+REQ = ("please","kindly","could you","would you","let me","let us","do ","make ","give ","tell ")
+VOC_WH = ("who","what","when","where","why","how","which")
+
+# Feature order (12 dims) — keep fixed so gate_blend features match
+FEAT_NAMES = [
+  "p_q","p_req","p_stmt","margin","entropy","log_len",
+  "lang_zh","cue_starts_wh","cue_ends_q","cue_imperative","cue_zh_q","cue_zh_please"
+]
+CUE_NAMES = ["starts_wh","ends_qmark","imperative","zh_qmark","zh_request_please"]
+
+SEP = "\x00"
+ROW_START = r"(?<![^\x00])"  # start of the joined string or right after a separator
+ROW_END = r"(?![^\x00])"
+
+def _phrase(p):
+    # a trailing space only counts if it is not part of the row's trailing whitespace (t.strip())
+    return re.escape(p.rstrip()) + r" (?=\s*[^\s\x00])" if p.endswith(" ") else re.escape(p)
+
+RX = {
+    "probe_wh":  re.compile(ROW_START + r"\s*(?:" + "|".join(map(re.escape, WH)) + r") (?=\s*[^\s\x00])"),
+    "ends_q":    re.compile(r"[?？]\s*" + ROW_END),
+    "req":       re.compile("请|" + "|".join(_phrase(p) for p in REQ)),
+    "zh_q":      re.compile("？"),
+    "excl":      re.compile("[!！]"),
+    "ellipsis":  re.compile(r"…|\.\.\."),
+    "voc_wh":    re.compile(ROW_START + "(?:" + "|".join(VOC_WH) + ")"),
+    "imperative": re.compile("please|请"),
+    "zh_please": re.compile("请"),
+}
+
+class Column:
+    """A column of texts joined once so every cue is a single regex pass."""
+    def __init__(self, texts):
+        texts = [t.replace(SEP, "\x01") if SEP in t else t for t in texts]
+        self.n = len(texts); self.texts = texts
+        self.low = SEP.join(texts).lower()
+        # lower() may change lengths (e.g. U+0130), so locate row starts from the separators
+        codes = np.frombuffer(self.low.encode("utf-32-le"), dtype=np.uint32)
+        self.starts = np.concatenate([[0], np.flatnonzero(codes == 0) + 1]) if self.n else np.zeros(0, np.int64)
+
+    def hits(self, name):
+        mask = np.zeros(self.n, dtype=bool)
+        pos = np.fromiter((m.start() for m in RX[name].finditer(self.low)), dtype=np.int64)
+        if pos.size:
+            mask[np.searchsorted(self.starts, pos, side="right") - 1] = True
+        return mask
+
+@metrics.timed("features", kind="probe")
+def probe_features(texts, langs, dtype=np.float32):
+    """(n, 9) probe features, the column version of train_probe.feats."""
+    col = Column(texts); langs = np.asarray(langs, dtype=object)
+    X = np.empty((col.n, 9), dtype=np.float64)
+    X[:,0] = np.log1p(np.fromiter((len(t.strip()) for t in col.texts), dtype=np.float64, count=col.n))
+    X[:,1] = col.hits("ends_q"); X[:,2] = col.hits("probe_wh"); X[:,3] = col.hits("req")
+    X[:,4] = col.hits("zh_q"); X[:,5] = col.hits("excl"); X[:,6] = col.hits("ellipsis")
+    X[:,7] = langs == "zh"; X[:,8] = langs == "en"
+    return X.astype(dtype, copy=False)
+
+def cue_bits(texts):
+    """(n, 5) int8 VoC cue bits in CUE_NAMES order."""
+    col = Column(texts)
+    return np.stack([col.hits("voc_wh"), col.hits("ends_q"), col.hits("imperative"),
+                     col.hits("zh_q"), col.hits("zh_please")], axis=1).astype(np.int8)
+
+def prob_matrix(recs, acts=VOC_ACTS):
+    P = np.zeros((len(recs), len(acts)), dtype=np.float64)
+    for i, r in enumerate(recs):
+        p = r.get("probe_probs") or {}
+        P[i] = [p.get(a, 0.0) for a in acts]
+    return P
+
+def top2_margin(P):
+    if P.shape[1] < 2: return P[:,0].copy()
+    top = -np.partition(-P, 1, axis=1)[:, :2]
+    return top[:,0] - top[:,1]
+
+def entropy(P):
+    s = P.sum(axis=1, keepdims=True)
+    Q = np.clip(np.divide(P, s, out=np.zeros_like(P), where=s > 0), 1e-9, 1.0)
+    H = -(Q * np.log(Q)).sum(axis=1)
+    return np.where(s[:,0] > 0, H, math.log(P.shape[1]))
+
+@metrics.timed("features", kind="voc")
+def voc_features(recs, dtype=np.float32):
+    """(n, 12) VoC features in FEAT_NAMES order from records with text/lang/probe_probs."""
+    P = prob_matrix(recs); texts = [r.get("text", "") for r in recs]
+    X = np.empty((len(recs), len(FEAT_NAMES)), dtype=np.float64)
+    X[:,0:3] = P[:,0:3]; X[:,3] = top2_margin(P); X[:,4] = entropy(P)
+    X[:,5] = np.log1p(np.fromiter((len(t) for t in texts), dtype=np.float64, count=len(texts)))
+    X[:,6] = np.fromiter((r.get("lang","en") == "zh" for r in recs), dtype=bool, count=len(recs))
+    X[:,7:12] = cue_bits(texts)
+    return X.astype(dtype, copy=False)
+
+def feature_mask(feature_set):
+    """0/1 mask over FEAT_NAMES for the VoC ablations."""
+    keep = {"all": set(FEAT_NAMES),
+            "no_acts": set(FEAT_NAMES) - {"p_q","p_req","p_stmt"},
+            "uncertainty_only": {"margin","entropy","log_len"},
+            "acts_only": {"p_q","p_req","p_stmt"}}[feature_set]
+    return np.array([float(n in keep) for n in FEAT_NAMES])
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Compare score_instr.lcs (bit-parallel) with the full-table and two-row DPs.
+
+    python scripts/bench_lcs.py --lengths 100,1000,10000
+"""
+import argparse, random, time
+from score_instr import lcs, lcs_dp
+
+def lcs_table(a,b):
+    """The original (n+1)x(m+1) list-of-lists DP."""
+    n,m=len(a),len(b); dp=[[0]*(m+1) for _ in range(n+1)]
+    for i in range(n):
+        for j in range(m):
+            dp[i+1][j+1]=dp[i][j]+1 if a[i]==b[j] else max(dp[i][j+1], dp[i+1][j])
+    return dp[n][m]
+
+def tokens(n, vocab, rng):
+    return [f"w{rng.randrange(vocab)}" for _ in range(n)]
+
+def timed(fn, a, b, budget, est=None, max_secs=float("inf")):
+    """(seconds per call, result), repeating the call up to 20 times within budget seconds;
+    (nan, None) without calling it when the estimated seconds per call exceed max_secs."""
+    if est is not None and est > max_secs: return float("nan"), None
+    t = time.perf_counter(); out = fn(a, b); dt = time.perf_counter() - t
+    reps = max(1, min(20, int(budget / max(dt, 1e-9))))
+    t = time.perf_counter()
+    for _ in range(reps): fn(a, b)
+    return (time.perf_counter() - t) / reps, out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lengths", default="100,1000,10000")
+    ap.add_argument("--vocab", type=int, default=500)
+    ap.add_argument("--max_table_len", type=int, default=3000, help="skip the O(nm)-memory table above this length")
+    ap.add_argument("--max_secs", type=float, default=5.0, help="skip an engine whose call is estimated (quadratic in length) to take longer")
+    ap.add_argument("--check", type=int, default=2000, help="random pairs checked against the DP")
+    ap.add_argument("--seed", type=int, default=0)
+    a = ap.parse_args()
+    rng = random.Random(a.seed)
+
+    for _ in range(a.check):
+        x = tokens(rng.randrange(0, 40), rng.choice([2, 5, 50]), rng)
+        y = tokens(rng.randrange(0, 40), rng.choice([2, 5, 50]), rng)
+        assert lcs(x, y) == lcs_dp(x, y) == lcs_table(x, y), (x, y)
+    print(f"[check] {a.check} random pairs: bit-parallel == two-row DP == table DP")
+
+    last = {}  # engine -> (tokens, seconds) of its last timed size, for the estimate
+    def run(name, fn, x, y, n):
+        est = last[name][1] * (n / last[name][0]) ** 2 if name in last else None
+        t, L = timed(fn, x, y, 0.5, est, a.max_secs)
+        if L is not None: last[name] = (n, t)
+        return t, L
+    for n in [int(v) for v in a.lengths.split(",")]:
+        x = tokens(n, a.vocab, rng); y = tokens(n, a.vocab, rng)
+        t_bit, L = run("bitpar", lcs, x, y, n)
+        t_row, L2 = run("tworow", lcs_dp, x, y, n)
+        t_tab, L3 = run("table", lcs_table, x, y, n) if n <= a.max_table_len else (float("nan"), None)
+        assert len({v for v in (L, L2, L3) if v is not None}) <= 1
+        print(f"[bench] tokens={n} lcs={L} table_s={t_tab:.4g} tworow_s={t_row:.4g} bitpar_s={t_bit:.4g} "
+              f"speedup_vs_table={t_tab/t_bit:.1f}x speedup_vs_tworow={t_row/t_bit:.1f}x")
+
+if __name__ == "__main__":
+    main()
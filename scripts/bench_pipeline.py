@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Time and memory-profile every pipeline stage on synthetic en/zh corpora of growing size.
+
+For each --sizes N the harness writes N-row QA and instruction TSVs (70% en / 30% zh, texts from
+the seed_label_rows templates with the same act mix, padded to log-normal lengths), starts
+mock_openrouter.py on a free port and runs the pipeline.py stage commands against them:
+tsv_to_jsonl, train_probe, run_probe, call_openrouter (base/heavy), score, build_voc_train,
+train_voc and the pgbi/margin sweeps. Each stage is a child process; its wall time and peak RSS
+come from os.wait4 (ru_maxrss covers the stage's own worker processes too). A failed stage is
+recorded with its return code and the stages after it for that size are skipped.
+
+    python scripts/bench_pipeline.py --sizes 1000,100000,1000000 --out exp/reports/bench_pipeline.json
+    python scripts/bench_pipeline.py --compare exp/reports/bench_old.json exp/reports/bench_pipeline.json --threshold 0.2
+"""
+import argparse, json, math, os, platform, random, socket, subprocess, sys, time
+from seed_label_rows import EN_ROWS, ZH_ROWS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PY = sys.executable
+TASKS = ["qa", "instr"]; MODES = ["base", "heavy"]
+LAMBDAS = "0,0.001,0.002,0.005,0.01,0.02"; TAUS = "0.05,0.1,0.15,0.2,0.3"
+FILL = {"en": "the team said that this result should be checked again before we ship the next version of the model".split(),
+        "zh": list("我们认为这个结果需要在下一个版本发布之前再检查一遍并且记录在文档里")}
+INSTR = {"en": ["Summarize in one sentence.", "Rewrite formally.", "Translate to plain English.", "List the key points."],
+         "zh": ["用一句话总结。", "改写得更正式。", "列出要点。"]}
+
+def padded(rng, row, mean_words):
+    """Template text plus a filler sentence before or after it, log-normal filler length around
+    mean_words (characters for zh)."""
+    lang = row["lang"]; k = int(rng.lognormvariate(math.log(mean_words), 0.6))
+    if k < 1: return row["text"]
+    fill = (FILL[lang][rng.randrange(len(FILL[lang])):] + FILL[lang] * (k // len(FILL[lang]) + 1))[:k]
+    fill = "".join(fill) + "。" if lang == "zh" else " ".join(fill).capitalize() + "."
+    return f"{fill} {row['text']}".strip() if rng.random() < 0.5 else f"{row['text']} {fill}".strip()
+
+def answer_of(rng, text, lang):
+    toks = list(text.rstrip("?？.。!！")) if lang == "zh" else text.rstrip("?.!").split()
+    i = rng.randrange(max(len(toks) - 3, 1))
+    return ("" if lang == "zh" else " ").join(toks[i:i + 3])
+
+def generate(n, work, seed):
+    """{task}_{lang}.tsv for both tasks and langs, plus heldout_{lang}.jsonl act labels for train_probe."""
+    rng = random.Random(seed); pools = {"en": EN_ROWS, "zh": ZH_ROWS}; files = {}
+    counts = {"en": n - int(0.3 * n), "zh": int(0.3 * n)}
+    for lang, rows in pools.items():
+        with open(os.path.join(work, f"heldout_{lang}.jsonl"), "w", encoding="utf-8") as g:
+            for i in range(max(counts[lang], 1)):
+                r = rng.choice(rows); g.write(json.dumps({"id": f"act-{lang}-{i}", "text": padded(rng, r, 6), "lang": lang,
+                                                          "gold_act": r["gold_act"]}, ensure_ascii=False) + "\n")
+        for t in TASKS:
+            path = files[(t, lang)] = os.path.join(work, f"{t}_{lang}.tsv")
+            with open(path, "w", encoding="utf-8") as g:
+                g.write("id\tquestion\tanswer\n" if t == "qa" else "id\tinstruction\tinput\treference\n")
+                for i in range(counts[lang]):
+                    r = rng.choice(rows)
+                    if t == "qa":
+                        q = padded(rng, r, 8); g.write(f"{t}-{lang}-{i}\t{q}\t{answer_of(rng, q, lang)}\n")
+                    else:
+                        x = padded(rng, r, 40); ref = x.split() if lang == "en" else list(x)
+                        ref = [w for w in ref if rng.random() > 0.2]
+                        g.write(f"{t}-{lang}-{i}\t{rng.choice(INSTR[lang])}\t{x}\t{(' ' if lang == 'en' else '').join(ref)}\n")
+    return files
+
+def py(script, *args):
+    return [PY, os.path.join(ROOT, "scripts", script), *map(str, args)]
+
+def stages(work, call_args):
+    """(name, [cmd, ...], stdout file or None) in run order; mirrors pipeline.stages."""
+    w = lambda p: os.path.join(work, p); S = []
+    for t in TASKS:
+        S.append((f"tsv_to_jsonl_{t}", [py("tsv_to_jsonl.py", "--in_tsv", w(f"{t}_{g}.tsv"), "--out_jsonl", w(f"{t}_{g}.jsonl"), "--task", t, "--lang", g)
+                                        for g in ("en", "zh")] + [["cat", w(f"{t}_en.jsonl"), w(f"{t}_zh.jsonl")]], w(f"{t}.jsonl")))
+    S.append(("train_probe", [py("train_probe.py", "--en", w("heldout_en.jsonl"), "--zh", w("heldout_zh.jsonl"), "--out", w("act_probe.joblib"),
+                                 "--report", w("probe_report.txt"))], None))
+    for t in TASKS:
+        L = w(t)
+        S.append((f"run_probe_{t}", [py("run_probe.py", "--in_jsonl", f"{L}.jsonl", "--out_jsonl", f"{L}.probe.jsonl", "--model", w("act_probe.joblib"))], None))
+        for m in MODES:
+            S.append((f"call_{t}_{m}", [py("call_openrouter.py", "--in_jsonl", f"{L}.probe.jsonl", "--out_jsonl", f"{L}.{m}.jsonl", "--mode", m, *call_args)], None))
+        for m in MODES:
+            S.append((f"score_{t}_{m}", [py("score.py", "--pred_jsonl", f"{L}.{m}.jsonl", "--out_jsonl", f"{L}.{m}.scored.jsonl",
+                                            "--gold_jsonl", f"{L}.jsonl", "--modes", m, "--task", t)], None))
+        pair = ["--base_scored", f"{L}.base.scored.jsonl", "--heavy_scored", f"{L}.heavy.scored.jsonl"]
+        S.append((f"build_voc_train_{t}", [py("build_voc_train.py", *pair, "--out_train", f"{L}.voc_train.jsonl", "--task", t)], None))
+        S.append((f"train_voc_{t}", [py("train_voc.py", "--train", f"{L}.voc_train.jsonl", "--out", w(f"voc_{t}.joblib"))], None))
+        # own results store: the synthetic sweeps must never land in exp/results.sqlite
+        res = ["--results", w("results.sqlite")]
+        S.append((f"sweep_pgbi_{t}", [py("sweep_gate.py", "--task", t, *pair, "--voc_model", w(f"voc_{t}.joblib"), "--values", LAMBDAS, *res)], None))
+        S.append((f"sweep_margin_{t}", [py("sweep_gate.py", "--task", t, *pair, "--method", "margin", "--values", TAUS, *res)], None))
+    return S
+
+def run(cmd, env, log, stdout=None):
+    """(seconds, peak RSS in MB, return code) of one child process."""
+    out = open(stdout, "ab") if stdout else log
+    t0 = time.perf_counter(); p = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=out, stderr=log)
+    _, status, ru = os.wait4(p.pid, 0); p.returncode = os.waitstatus_to_exitcode(status)
+    dt = time.perf_counter() - t0
+    if stdout: out.close()
+    return dt, ru.ru_maxrss / 1024.0, p.returncode
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+def start_mock(args, log):
+    port = free_port()
+    p = subprocess.Popen(py("mock_openrouter.py", "--port", port, *args), stdout=log, stderr=log)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close(); break
+        except OSError:
+            if p.poll() is not None: raise SystemExit("[error] mock_openrouter.py exited; see the bench log")
+            time.sleep(0.05)
+    return p, f"http://127.0.0.1:{port}/api/v1/chat/completions"
+
+def bench_size(n, a, meta):
+    work = os.path.join(a.workdir, str(n)); os.makedirs(work, exist_ok=True)
+    t0 = time.perf_counter(); generate(n, work, a.seed); gen_s = time.perf_counter() - t0
+    print(f"[bench] rows={n} generated in {gen_s:.1f}s under {work}", flush=True)
+    log = open(os.path.join(work, "bench.log"), "ab")
+    mock, url = start_mock(a.mock_args.split(), log)
+    env = dict(os.environ, OPENROUTER_URL=url, OPENROUTER_API_KEY="mock", PYTHONPATH=os.path.join(ROOT, "scripts"))
+    res = {}; failed = None
+    try:
+        for name, cmds, stdout in stages(work, a.call_args.split()):
+            if a.stages and not any(name.startswith(s) for s in a.stages): continue
+            if failed:
+                res[name] = {"skipped": f"after {failed}"}; continue
+            if stdout and os.path.exists(stdout): os.remove(stdout)
+            secs = 0.0; rss = 0.0; rc = 0
+            for c in cmds:
+                dt, mb, rc = run(c, env, log, stdout if c[0] == "cat" else None); secs += dt; rss = max(rss, mb)
+                if rc: break
+            res[name] = {"secs": round(secs, 4), "maxrss_mb": round(rss, 1), "rows": n, "rows_per_s": round(n / max(secs, 1e-9), 1)}
+            if rc: res[name]["rc"] = rc; failed = name
+            print(f"[stage] rows={n} {name} secs={secs:.2f} maxrss_mb={rss:.0f}" + (f" rc={rc}" if rc else ""), flush=True)
+    finally:
+        mock.terminate(); mock.wait(); log.close()
+    return res
+
+def git_meta():
+    git = lambda *c: subprocess.run(["git", *c], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def compare(old_path, new_path, threshold, min_secs, min_mb):
+    """Print per-stage ratios and [regress] lines; returns the number of regressions."""
+    old, new = json.load(open(old_path)), json.load(open(new_path)); bad = 0
+    print(f"[compare] old={old['meta']['commit'][:10]} new={new['meta']['commit'][:10]} threshold={threshold:g}")
+    for n, stages_new in new["results"].items():
+        for name, r in stages_new.items():
+            o = old["results"].get(n, {}).get(name)
+            if not o or "secs" not in o or "secs" not in r: continue
+            ts, tm = r["secs"] / max(o["secs"], 1e-9), r["maxrss_mb"] / max(o["maxrss_mb"], 1e-9)
+            slow = ts > 1 + threshold and r["secs"] - o["secs"] >= min_secs
+            fat = tm > 1 + threshold and r["maxrss_mb"] - o["maxrss_mb"] >= min_mb
+            tag = "[regress]" if slow or fat else "[same]" if max(ts, tm) <= 1 + threshold else "[noise]"
+            if slow or fat: bad += 1
+            print(f"{tag} rows={n} {name} secs={o['secs']:.2f}->{r['secs']:.2f} ({ts:.2f}x) "
+                  f"maxrss_mb={o['maxrss_mb']:.0f}->{r['maxrss_mb']:.0f} ({tm:.2f}x)")
+    print(f"[compare] regressions={bad}")
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,100000,1000000", help="comma-separated corpus sizes (rows per task)")
+    ap.add_argument("--stages", nargs="*", default=None, help="only stages whose name starts with one of these (their inputs must exist)")
+    ap.add_argument("--workdir", default="exp/bench")
+    ap.add_argument("--out", default="exp/reports/bench_pipeline.json")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--mock_args", default="--latency 0 --malformed_rate 0.2", help="mock_openrouter.py flags")
+    ap.add_argument("--call_args", default="--concurrency 64", help="extra call_openrouter.py flags, e.g. '--pack 8'")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), default=None, help="diff two result files instead of running")
+    ap.add_argument("--threshold", type=float, default=0.2, help="--compare: flag stages this much slower or larger")
+    ap.add_argument("--min_secs", type=float, default=0.5, help="--compare: ignore slowdowns smaller than this")
+    ap.add_argument("--min_mb", type=float, default=20.0, help="--compare: ignore memory growth smaller than this")
+    a = ap.parse_args()
+    if a.compare:
+        sys.exit(1 if compare(*a.compare, a.threshold, a.min_secs, a.min_mb) else 0)
+    a.workdir = os.path.abspath(a.workdir); meta = git_meta(); results = {}
+    for n in [int(v) for v in a.sizes.split(",")]:
+        results[str(n)] = bench_size(n, a, meta)
+        os.makedirs(os.path.dirname(os.path.abspath(a.out)), exist_ok=True)
+        with open(a.out + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"meta": dict(meta, sizes=a.sizes, mock_args=a.mock_args, call_args=a.call_args), "results": results}, f, indent=1)
+        os.replace(a.out + ".tmp", a.out)
+    print(f"[ok] wrote {a.out}")
+
+if __name__ == "__main__":
+    main()
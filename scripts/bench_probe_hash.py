@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Throughput of the hashed n-gram probe (probe_hash.py): batched rows/s and single-row latency.
+
+Texts come from --in_jsonl (record_text of each row) or are generated at each --chars length
+from a random en/zh vocabulary. Without --model a probe is fit on one generated chunk;
+prediction cost does not depend on the weights. Exits 1 when a batched rate is below --min_rows_s.
+
+    python scripts/bench_probe_hash.py --chars 60,120,280 --min_rows_s 20000
+    python scripts/bench_probe_hash.py --model models/act_probe_hash.joblib --in_jsonl exp/logs/instr_en.jsonl
+"""
+import argparse, json, random, time
+import numpy as np, joblib
+from act_feats import PROBE_ACTS
+from probe_hash import HashProbe
+from router import record_text
+
+EN = "who what when where why how please could you tell me write a short list of the best ways to fix this today".split()
+ZH = list("请帮我写一封信谁什么时候哪里为什么怎么样可以告诉今天问题方法")
+
+def texts_of(n, chars, rng):
+    """n random texts of about `chars` characters, 80% en / 20% zh, some ending in ? or !."""
+    T = []; G = []
+    for _ in range(n):
+        zh = rng.random() < 0.2; out = []; k = 0
+        while k < chars:
+            w = rng.choice(ZH) if zh else rng.choice(EN); out.append(w); k += len(w) + (not zh)
+        T.append(("" if zh else " ").join(out) + rng.choice(["", "?", "!", "？"] if zh else ["", "?", "!", "."])); G.append("zh" if zh else "en")
+    return T, G
+
+def bench(model, T, G, singles):
+    model.predict_proba(T[:64], G[:64])
+    t = time.perf_counter(); P = model.predict_proba(T, G); dt = time.perf_counter() - t
+    lat = []
+    for i in range(min(singles, len(T))):
+        t0 = time.perf_counter(); model.predict_proba(T[i:i + 1], G[i:i + 1]); lat.append(time.perf_counter() - t0)
+    lat.sort()
+    assert np.allclose(P.sum(axis=1), 1.0)
+    return len(T) / dt, lat[len(lat) // 2] * 1e3, lat[int(0.99 * (len(lat) - 1))] * 1e3
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=None, help="train_probe_hash.py bundle (default: fit one on generated text)")
+    ap.add_argument("--in_jsonl", default=None, help="benchmark on these rows instead of generated text")
+    ap.add_argument("--chars", default="60,120,280", help="generated text lengths")
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--singles", type=int, default=500, help="single-row calls timed for the latency percentiles")
+    ap.add_argument("--min_rows_s", type=float, default=0.0, help="fail when a batched rate is below this")
+    ap.add_argument("--seed", type=int, default=0)
+    a = ap.parse_args()
+    rng = random.Random(a.seed)
+    if a.model:
+        model = joblib.load(a.model)["model"]; model.check()
+    else:
+        model = HashProbe(PROBE_ACTS, seed=a.seed); T, G = texts_of(5000, 100, rng)
+        model.partial_fit(T, G, [rng.randrange(len(PROBE_ACTS)) for _ in T])
+    if a.in_jsonl:
+        recs = []
+        for l in open(a.in_jsonl, "r", encoding="utf-8"):
+            if l.strip(): recs.append(json.loads(l))
+            if len(recs) >= a.n: break
+        sets = [(a.in_jsonl, [r.get("text") or record_text(r) for r in recs], [r.get("lang", "en") for r in recs])]
+    else:
+        sets = [(f"generated_{c}", *texts_of(a.n, int(c), rng)) for c in a.chars.split(",")]
+    slow = 0
+    for name, T, G in sets:
+        rate, p50, p99 = bench(model, T, G, a.singles)
+        print(f"[bench] input={name} rows={len(T)} mean_chars={np.mean([len(t) for t in T]):.0f} rows_per_s={rate:.0f} "
+              f"single_p50_ms={p50:.3f} single_p99_ms={p99:.3f}")
+        slow += rate < a.min_rows_s
+    if slow: raise SystemExit(f"[error] {slow} input(s) below --min_rows_s={a.min_rows_s:g}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Budget-constrained heavy-call selection for the PGBI gate.
+
+Offline (all rows known): greedy fractional knapsack on expected gain per token, O(n log n).
+Online (rows arrive over time): a pacer that adapts lambda so spend tracks the budget.
+K tiers: each row takes argmax_k gain_k - lambda*cost_k; tier_events gives every lambda at once.
+"""
+import math
+import numpy as np
+
+def gain_ratio(gain, cost):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(cost > 0, gain / np.where(cost > 0, cost, 1.0), np.where(gain >= 0, np.inf, -np.inf))
+
+def allocate(gain, cost, budget, fill=True):
+    """Pick rows maximizing sum(gain) subject to sum(cost) <= budget.
+
+    Rows are taken in decreasing gain/cost order while they fit; with fill=True the
+    leftover budget is then packed greedily with later rows that still fit. Returns
+    (mask, implied_lambda, spent), where implied_lambda is the gain/cost ratio of the last
+    row in the prefix, i.e. the fixed lambda whose gate picks that prefix.
+    """
+    gain = np.asarray(gain, dtype=float); cost = np.asarray(cost, dtype=float)
+    ratio = gain_ratio(gain, cost)
+    order = np.argsort(-ratio, kind="stable")
+    order = order[ratio[order] >= 0]  # rows with negative expected gain are never worth it
+    cum = np.cumsum(cost[order])
+    k = int(np.searchsorted(cum, budget, side="right"))
+    mask = np.zeros(len(gain), dtype=bool); mask[order[:k]] = True
+    spent = float(cum[k-1]) if k else 0.0
+    implied = float(ratio[order[k-1]]) if k else math.inf
+    if fill and k < len(order):
+        rest = order[k:]; rc = cost[rest]
+        suffix_min = np.minimum.accumulate(rc[::-1])[::-1]
+        for j, i in enumerate(rest.tolist()):
+            left = budget - spent
+            if suffix_min[j] > left: break
+            if rc[j] <= left:
+                mask[i] = True; spent += float(rc[j])
+    return mask, implied, spent
+
+def top_fraction(gain, frac):
+    """Heavy-call-count budget: the round(frac*n) rows with the largest expected gain."""
+    gain = np.asarray(gain, dtype=float); k = int(round(frac * len(gain)))
+    mask = np.zeros(len(gain), dtype=bool)
+    if k > 0:
+        mask[np.argsort(-gain, kind="stable")[:k]] = True
+    return mask, (float(gain[mask].min()) if k else math.inf)
+
+class Pacer:
+    """Online budget pacing for rows that arrive one at a time.
+
+    Uses heavy iff gain >= lambda*cost and the call still fits the remaining budget; after
+    every row lambda is scaled by exp(eta * (spend - target) / target), where target is the
+    per-row share budget/expected_rows, so overspending raises the bar and underspending lowers it.
+    """
+    def __init__(self, budget, expected_rows, lambda0=1e-3, eta=0.05, min_lambda=1e-9):
+        self.budget = float(budget); self.rate = self.budget / max(int(expected_rows), 1)
+        self.lam = float(lambda0); self.eta = eta; self.min_lambda = min_lambda
+        self.spent = 0.0; self.seen = 0
+
+    def decide(self, gain, cost):
+        use = gain >= self.lam * cost and self.spent + cost <= self.budget
+        used = cost if use else 0.0
+        self.spent += used; self.seen += 1
+        if self.rate > 0:
+            self.lam = max(self.min_lambda, self.lam * math.exp(self.eta * (used - self.rate) / self.rate))
+        return use
+
+def tier_events(gain, price):
+    """Per-row upper envelope of the lines gain_k - lambda*price_k, for every lambda >= 0 at once.
+
+    gain, price: (n, K) with the default tier in column 0. As lambda falls from inf to 0 a row
+    moves to ever more expensive tiers; each move is an event (lambda, row, from, to), returned
+    as arrays sorted by decreasing lambda together with the tier every row starts in (the
+    cheapest, ties to the larger gain, then the later column). A row's tier at lambda is its
+    last event with event lambda >= lambda, so ties go to the more expensive tier as in the
+    binary gate (heavy iff gain >= lambda*cost). Rows never move to a tier with lower gain.
+    """
+    gain = np.asarray(gain, dtype=float); price = np.asarray(price, dtype=float); n, K = gain.shape
+    cols = np.broadcast_to(np.arange(K), (n, K))
+    cur = np.lexsort((-cols, -gain, price), axis=-1)[:, 0] if n else np.zeros(0, dtype=int)
+    start = cur.copy(); rows = np.arange(n); ev = []
+    for _ in range(K - 1):
+        dg = gain - gain[rows, cur][:, None]; dp = price - price[rows, cur][:, None]
+        ok = (dp > 0) & (dg >= 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lam = np.where(ok, dg / np.where(ok, dp, 1.0), -np.inf)
+        # the next line on the envelope: largest crossing lambda, ties to the steeper (costlier) line
+        nxt = np.lexsort((-price, -lam), axis=-1)[:, 0] if n else cur
+        move = np.isfinite(lam[rows, nxt])
+        if not move.any(): break
+        ev.append((lam[rows, nxt][move], rows[move], cur[move], nxt[move]))
+        cur = np.where(move, nxt, cur)
+    if not ev:
+        z = np.zeros(0, dtype=int); return start, np.zeros(0), z, z, z
+    lam, row, frm, to = (np.concatenate(x) for x in zip(*ev))
+    order = np.lexsort((np.concatenate([np.full(len(e[0]), i) for i, e in enumerate(ev)]), -lam))
+    return start, lam[order], row[order], frm[order], to[order]
+
+def tier_choice(start, row, to, k):
+    """Tier of every row after the first k events (in tier_events order)."""
+    last = np.full(len(start), -1); np.maximum.at(last, row[:k], np.arange(k))
+    cur = start.copy(); hit = last >= 0; cur[hit] = to[last[hit]]
+    return cur
@@ -1,27 +1,33 @@
 #!/usr/bin/env python3
-import json, argparse
+import json, argparse, itertools
+from act_feats import CUE_NAMES, cue_bits
+from joinio import pairs, add_join_arg, warn_estimated
 ap=argparse.ArgumentParser()
 ap.add_argument("--base_scored", required=True)
 ap.add_argument("--heavy_scored", required=True)
 ap.add_argument("--out_train", required=True)
 ap.add_argument("--task", choices=["qa","instr"], required=True)
+ap.add_argument("--tier", default="heavy", help="tier whose score_<tier>/cost_<tier> the heavy file carries")
 ap.add_argument("--delta_threshold", type=float, default=0.0)
+ap.add_argument("--chunk", type=int, default=16384, help="joined rows per cue_bits batch")
+add_join_arg(ap)
 a=ap.parse_args()
-base={json.loads(l)["id"]:json.loads(l) for l in open(a.base_scored,"r",encoding="utf-8")}
-heavy={json.loads(l)["id"]:json.loads(l) for l in open(a.heavy_scored,"r",encoding="utf-8")}
-out=open(a.out_train,"w",encoding="utf-8")
-for k,b in base.items():
-    h=heavy[k]
-    if a.task=="qa":
-        sb=b.get("score_base",{}).get("f1",0.0); sh=h.get("score_heavy",{}).get("f1",0.0)
-    else:
-        sb=b.get("score_base",{}).get("rougeL",0.0); sh=h.get("score_heavy",{}).get("rougeL",0.0)
-    delta=float(sh-sb); gain=int(delta>a.delta_threshold)
-    rec={"id":k,"text":b["text"],"lang":b.get("lang","en"),"probe_probs":b.get("probe_probs",{}),
-         "cue_bits":{"starts_wh":int(b["text"].lower().startswith(("who","what","when","where","why","how","which"))),
-                     "ends_qmark":int(b["text"].strip().endswith(("?","？"))),
-                     "imperative":int("please" in b["text"].lower() or "请" in b["text"]),
-                     "zh_qmark":int("？" in b["text"]), "zh_request_please":int("请" in b["text"])},
-         "cost": float(h.get("cost_heavy",0.0) or 0.0), "delta_score":delta, "gain":gain}
-    out.write(json.dumps(rec, ensure_ascii=False)+"\n")
-out.close(); print("[ok] wrote", a.out_train)
+it=pairs(a.base_scored, a.heavy_scored, a.join)
+out=open(a.out_train,"w",encoding="utf-8"); est=0
+while True:
+    chunk=list(itertools.islice(it, a.chunk))
+    if not chunk: break
+    cues=cue_bits([b["text"] for b,_ in chunk])
+    for (b,h),cb in zip(chunk, cues.tolist()):
+        if a.task=="qa":
+            sb=b.get("score_base",{}).get("f1",0.0); sh=h.get(f"score_{a.tier}",{}).get("f1",0.0)
+        else:
+            sb=b.get("score_base",{}).get("rougeL",0.0); sh=h.get(f"score_{a.tier}",{}).get("rougeL",0.0)
+        delta=float(sh-sb); gain=int(delta>a.delta_threshold)
+        rec={"id":b["id"],"text":b["text"],"lang":b.get("lang","en"),"probe_probs":b.get("probe_probs",{}),
+             "cue_bits":dict(zip(CUE_NAMES, cb)),
+             "cost": float(h.get(f"cost_{a.tier}",0.0) or 0.0), "delta_score":delta, "gain":gain}
+        if "p_heavy" in b: rec["p_heavy"]=b["p_heavy"]
+        if h.get(f"cost_estimated_{a.tier}"): rec["cost_estimated"]=True; est+=1
+        out.write(json.dumps(rec, ensure_ascii=False)+"\n")
+out.close(); warn_estimated(est, a.tier); print("[ok] wrote", a.out_train)
@@ -1,5 +1,10 @@
 #!/usr/bin/env python3
-import os, json, time, argparse, requests, sys, re, warnings
+import os, json, time, argparse, requests, sys, re, warnings, collections, itertools, threading
+from concurrent.futures import ThreadPoolExecutor
+from llm_cache import ResponseCache
+from ratelimit import RateLimiter, retry_after_secs
+import checkpoint, metrics
+from prompts import prompt
 try:
     from urllib3.exceptions import NotOpenSSLWarning
     warnings.filterwarnings("ignore", category=NotOpenSSLWarning)
@@ -8,14 +13,94 @@ except Exception:
 
 MODEL = os.environ.get("OPENROUTER_MODEL", "mistralai/mistral-7b-instruct")
 API_KEY = os.environ.get("OPENROUTER_API_KEY")
+URL = os.environ.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+SESSION = requests.Session()
+CACHE = None  # ResponseCache, set from --cache
+LIMITER = RateLimiter()
+MAX_RETRIES = 5
+STREAM = False      # --stream: SSE with early stop on the FINAL: line
+EARLY_STOP = True
+TIER = None         # --tier: field suffix (pred_<tier>, cost_<tier>) when it differs from the prompt mode
 
-def call(messages, max_tokens=256, temperature=0.0, extra=None):
-    url = "https://openrouter.ai/api/v1/chat/completions"
+def mount_pool(size):
+    """Keep-alive pool large enough that every worker thread reuses its connection."""
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(int(size), 1))
+    SESSION.mount("https://", adapter); SESSION.mount("http://", adapter)
+
+def _post(payload, est, stream=False):
+    """POST with the limiter and retries; returns the first non-retried response."""
     headers = {
         "Authorization": f"Bearer {API_KEY}",
         "Content-Type": "application/json",
         "X-Title": "pragact-router"
     }
+    for attempt in range(MAX_RETRIES + 1):
+        LIMITER.acquire(est)
+        last = attempt == MAX_RETRIES; metrics.inc("llm_requests_total")
+        try:
+            with metrics.span("http"):
+                r = SESSION.post(URL, headers=headers, json=payload, timeout=120, stream=stream)
+        except (requests.Timeout, requests.ConnectionError):
+            if last: metrics.inc("llm_errors_total", kind="timeout"); raise
+            metrics.inc("llm_retries_total", reason="timeout"); LIMITER.backoff("timeout", attempt); continue
+        if r.status_code == 429 or r.status_code >= 500:
+            ra = retry_after_secs(r.headers.get("Retry-After")); reason = "429" if r.status_code == 429 else "5xx"
+            if r.status_code == 429: LIMITER.on_throttle(ra)
+            if not last:
+                metrics.inc("llm_retries_total", reason=reason); r.close(); LIMITER.backoff(reason, attempt, ra); continue
+        break
+    if not r.ok:
+        metrics.inc("llm_errors_total", kind=f"http_{r.status_code}")
+        try: err = r.json()
+        except Exception: err = {"text": r.text}
+        raise RuntimeError(f"HTTP {r.status_code} from OpenRouter: {err}")
+    return r
+
+FINAL_LINE = re.compile(r"(?:FINAL|Final|final|ANSWER|Answer|answer):[^\n]*\S[^\n]*\n")
+
+def read_stream(r, t0, early_stop=True):
+    """Consume an SSE chat-completion stream -> (text, usage, native, timing, content_chunks).
+
+    timing holds ttft (first content delta) and t_final (first complete FINAL: line, else end
+    of stream), in seconds since t0. The text ends with that line, as the newline stop would
+    leave it. With early_stop the connection is dropped there too, so the rest of the completion
+    is neither waited for nor (on providers that honour cancellation) billed; usage then has no
+    total from the server and call() estimates it from the number of content chunks received,
+    marking it "estimated" so process() flags the row cost_estimated_<mode> rather than passing
+    the guess off as a billed count.
+    """
+    parts = []; usage = {}; native = None; nchunks = 0; cut = None; timing = {"ttft": None, "t_final": None, "early_stop": False}
+    try:
+        for line in r.iter_lines(decode_unicode=False):
+            if not line.startswith(b"data:"): continue  # blank separators and ": keep-alive" comments
+            data = line[5:].strip()
+            if data == b"[DONE]": break
+            ev = json.loads(data)
+            if ev.get("error"): raise RuntimeError(f"stream error from OpenRouter: {ev['error']}")
+            usage = ev.get("usage") or usage; native = ev.get("native_tokens", native)
+            delta = ((ev.get("choices") or [{}])[0].get("delta") or {}).get("content")
+            if not delta: continue
+            if timing["ttft"] is None: timing["ttft"] = time.perf_counter() - t0
+            parts.append(delta); nchunks += 1
+            if "\n" in delta and cut is None:
+                m = FINAL_LINE.search("".join(parts))
+                if m:
+                    timing["t_final"] = time.perf_counter() - t0; cut = m.end() - 1
+                    if early_stop:
+                        timing["early_stop"] = True; break
+    finally:
+        r.close()
+    if timing["t_final"] is None: timing["t_final"] = time.perf_counter() - t0
+    return "".join(parts)[:cut], usage, native, timing, nchunks
+
+def call(messages, max_tokens=256, temperature=0.0, extra=None, stream=None, timing=None):
+    """(text, usage, native) of one completion.
+
+    stream=True (default: the module STREAM flag) uses SSE without the newline stop, so the
+    model may think on earlier lines, and aborts once a complete FINAL: line has arrived
+    (see read_stream); `timing`, if given, is filled with ttft/t_final/early_stop.
+    """
+    stream = STREAM if stream is None else stream
     payload = {
         "model": MODEL,
         "messages": messages,
@@ -24,16 +109,35 @@ def call(messages, max_tokens=256, temperature=0.0, extra=None):
         # stop at first newline so we get exactly one line
         "stop": ["\n"]
     }
-    if extra: payload.update(extra)
-    r = requests.post(url, headers=headers, json=payload, timeout=120)
-    if not r.ok:
-        try: err = r.json()
-        except Exception: err = {"text": r.text}
-        raise RuntimeError(f"HTTP {r.status_code} from OpenRouter: {err}")
-    data = r.json()
-    msg = data["choices"][0]["message"]["content"]
-    usage = data.get("usage", {})
-    native = data.get("native_tokens")
+    if stream:
+        del payload["stop"]; payload["stream"] = True; payload["stream_options"] = {"include_usage": True}  # usage chunk at the end
+    if extra:
+        payload.update(extra); payload = {k: v for k, v in payload.items() if v is not None}  # extra={"stop": None} drops it
+    key = None
+    if CACHE is not None:
+        key = ResponseCache.key(dict(payload, url=URL, early_stop=EARLY_STOP) if stream else dict(payload, url=URL))
+        hit = CACHE.get(key)
+        if hit is not None: metrics.inc("llm_cache_hits_total"); return hit
+    ptok = sum(len(m.get("content","")) for m in messages) // 4
+    est = ptok + max_tokens
+    with metrics.span("llm_call"):
+        r = _post(payload, est, stream=stream)
+        if stream:
+            t0 = time.perf_counter() - r.elapsed.total_seconds()
+            msg, usage, native, tm, nchunks = read_stream(r, t0, EARLY_STOP)
+            if not usage.get("total_tokens"):
+                usage = {"prompt_tokens": ptok, "completion_tokens": nchunks, "total_tokens": ptok + nchunks, "estimated": True}
+            if timing is not None: timing.update(tm)
+        else:
+            data = r.json()
+            msg = data["choices"][0]["message"]["content"]
+            usage = data.get("usage", {})
+            native = data.get("native_tokens")
+    LIMITER.on_success(); LIMITER.settle(est, (usage or {}).get("total_tokens"))
+    if metrics.ENABLED and usage:
+        metrics.inc("llm_tokens_total", usage.get("prompt_tokens") or 0, kind="prompt")
+        metrics.inc("llm_tokens_total", usage.get("completion_tokens") or 0, kind="completion")
+    if key is not None: CACHE.put(key, msg, usage, native)
     return msg, usage, native
 
 def extract_final(text: str) -> str:
@@ -47,17 +151,33 @@ def extract_final(text: str) -> str:
     out = re.sub(r"^[`'\"<>«»\[\(]+|[`'\"<>«»\]\)]+$", "", out).strip()
     return out
 
-def run(task, mode, inp):
-    if task == "qa":
-        sys_msgs = [{"role":"system","content":"Return exactly one line: FINAL: <answer>. No other text."}]
-        user = [{"role":"user","content": f"Question: {inp['question']}\nOutput one line exactly as: FINAL: <answer>"}]
-        raw, usage, native = call(sys_msgs+user, max_tokens=(32 if mode=="base" else 96), temperature=0.0)
-        return extract_final(raw), usage, native
-    else:
-        text = f"Instruction: {inp['instruction']}\nInput: {inp['input']}\nOutput one line exactly as: FINAL: <output>"
-        sys_msgs = [{"role":"system","content":"Think briefly if needed, but output only one line starting with FINAL: and nothing else."}]
-        user = [{"role":"user","content": text}]
-        raw, usage, native = call(sys_msgs+user, max_tokens=(128 if mode=="base" else 256), temperature=0.0)
+def has_final(text: str) -> bool:
+    """True when the output carries a FINAL:/ANSWER: tag with a non-empty answer."""
+    tags = ("FINAL:", "Final:", "final:", "ANSWER:", "Answer:", "answer:")
+    return any(t in text for t in tags) and bool(extract_final(text))
+
+def pack_prompt(mode, items):
+    """(messages, max_tokens) asking for one numbered FINAL: line per QA item."""
+    qs = "\n".join(f"{k}. {' '.join(str(r['question']).split())}" for k, r in enumerate(items, 1))
+    sys_msgs = [{"role":"system","content":"Answer every numbered question. Return exactly one line per question, in order: <n>. FINAL: <answer>. No other text."}]
+    user = [{"role":"user","content": f"Questions:\n{qs}\nOutput one line per question exactly as: <n>. FINAL: <answer>"}]
+    return sys_msgs+user, (prompt("qa", mode, items[0])[1] + 4) * len(items)
+
+PACK_LINE = re.compile(r"^\s*(\d+)\s*[.):]\s*(.*)$")
+
+def parse_packed(text, n):
+    """Answers 1..n from numbered FINAL: lines via extract_final; None where a line is missing or bad."""
+    out = [None] * n
+    for line in text.splitlines():
+        m = PACK_LINE.match(line)
+        if not m or not 1 <= int(m.group(1)) <= n or out[int(m.group(1)) - 1] is not None: continue
+        if has_final(m.group(2)): out[int(m.group(1)) - 1] = extract_final(m.group(2))
+    return out
+
+def run(task, mode, inp, timing=None):
+    messages, max_tokens = prompt(task, mode, inp)
+    raw, usage, native = call(messages, max_tokens=max_tokens, temperature=0.0, timing=timing)
+    with metrics.span("parse"):
         return extract_final(raw), usage, native
 
 def norm_cost(usage, native):
@@ -68,25 +188,154 @@ def norm_cost(usage, native):
         except: pass
     return None
 
+def process(r, mode):
+    task = r.get("task","qa" if "question" in r else "instr"); t = TIER or mode
+    timing = {} if STREAM else None
+    try:
+        final_text, usage, native = run(task, mode, r, timing)
+        r[f"pred_{t}"] = final_text
+        c = norm_cost(usage, native)
+        if c is not None: r[f"cost_{t}"] = c
+        if (usage or {}).get("estimated"): r[f"cost_estimated_{t}"] = True  # stream stopped before the usage chunk
+        if timing:  # empty on cache hits
+            r[f"ttft_{t}"] = timing["ttft"]; r[f"t_final_{t}"] = timing["t_final"]
+            r[f"early_stop_{t}"] = timing["early_stop"]
+    except Exception as e:
+        r[f"pred_{t}"] = f"[ERROR] {e}"
+    return r
+
+PACK_STATS = collections.Counter(); PACK_LOCK = threading.Lock()
+
+def process_pack(rs, mode):
+    """One packed call for the QA rows of `rs`, single calls for the rest and for any QA row
+    whose numbered line did not parse. A packed row's cost_<mode> is its 1/n share of the
+    call; a fallback row pays its share plus its own call. pack_<mode> is "ok" or "fallback".
+
+    PACK_STATS["saved"] accumulates the prompt tokens packing saved: each row's single-call
+    prompt, converted with the packed call's server prompt tokens per character, minus its
+    share of the packed prompt (completions are assumed the same length either way).
+    """
+    qa = [r for r in rs if r.get("task","qa" if "question" in r else "instr") == "qa"]; t = TIER or mode
+    if len(qa) < 2:
+        return [process(r, mode) for r in rs]
+    messages, max_tokens = pack_prompt(mode, qa); usage = None
+    try:
+        raw, usage, native = call(messages, max_tokens=max_tokens, temperature=0.0, extra={"stop": None}, stream=False)
+        with metrics.span("parse", packed="1"): answers = parse_packed(raw, len(qa))
+        share = norm_cost(usage, native)
+    except Exception:
+        answers = [None] * len(qa); share = None
+    share = share / len(qa) if share is not None else None
+    for r, ans in zip(qa, answers):
+        if ans is not None:
+            r[f"pred_{t}"] = ans; r[f"pack_{t}"] = "ok"
+            if share is not None: r[f"cost_{t}"] = share
+        else:
+            process(r, mode); r[f"pack_{t}"] = "fallback"
+            if share is not None and f"cost_{t}" in r: r[f"cost_{t}"] += share
+    packed = {id(r) for r in qa}
+    for r in rs:
+        if id(r) not in packed: process(r, mode)
+    chars = lambda msgs: sum(len(m["content"]) for m in msgs)
+    pt = (usage or {}).get("prompt_tokens")
+    with PACK_LOCK:
+        PACK_STATS["calls"] += 1; PACK_STATS["rows"] += len(qa); PACK_STATS["fallback"] += answers.count(None)
+        if pt:
+            per_char = pt / chars(messages)
+            PACK_STATS["saved"] += sum(per_char * chars(prompt("qa", mode, r)[0]) for r in qa) - pt
+    return rs
+
+def run_rows(rows, mode, concurrency=1, window=None, pack=1):
+    """Yield processed rows in input order.
+
+    With concurrency > 1 up to `concurrency` calls are in flight at once and at most
+    `window` finished-or-pending rows are buffered while the head of the queue completes.
+    With pack > 1 consecutive rows go out in groups of `pack` through process_pack.
+    """
+    if pack > 1:
+        rows = iter(rows); groups = iter(lambda: list(itertools.islice(rows, pack)), [])
+        for rs in _ordered(process_pack, groups, mode, concurrency, window and max(window // pack, 1)):
+            yield from rs
+        return
+    yield from _ordered(process, rows, mode, concurrency, window)
+
+def _ordered(fn, units, mode, concurrency, window):
+    if concurrency <= 1:
+        for u in units:
+            yield fn(u, mode)
+        return
+    window = max(window or 4*concurrency, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        pending = collections.deque()
+        for u in units:
+            pending.append(ex.submit(fn, u, mode))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 if __name__=="__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--in_jsonl", required=True)
     ap.add_argument("--out_jsonl", required=True)
-    ap.add_argument("--mode", choices=["base","heavy"], required=True)
+    ap.add_argument("--mode", choices=["base","heavy"], required=True, help="prompt style and token limit")
+    ap.add_argument("--model", default=None, help="model id (default: $OPENROUTER_MODEL)")
+    ap.add_argument("--tier", default=None, help="name for the output fields pred_<tier>/cost_<tier> (default: the mode), "
+                    "e.g. --mode heavy --tier mid --model <mid-tier model>")
+    ap.add_argument("--concurrency", type=int, default=1, help="max requests in flight (1 = sequential)")
+    ap.add_argument("--window", type=int, default=None, help="reorder buffer size (default 4x concurrency)")
+    ap.add_argument("--rps", type=float, default=None, help="requests/s ceiling (default: unlimited until the first 429)")
+    ap.add_argument("--tpm", type=float, default=None, help="tokens/min ceiling")
+    ap.add_argument("--max_retries", type=int, default=5, help="retries for 429/5xx/timeouts with jittered backoff")
+    ap.add_argument("--cache", default=None, help="sqlite response cache, e.g. exp/cache/llm.sqlite")
+    ap.add_argument("--cache_max_mb", type=float, default=512.0)
+    ap.add_argument("--cache_only", action="store_true", help="never hit the API; misses become [ERROR] rows")
+    ap.add_argument("--stream", action="store_true", help="SSE responses; stop reading at the first complete FINAL: line and "
+                    "record ttft_<mode>/t_final_<mode> per row")
+    ap.add_argument("--no_early_stop", action="store_true", help="with --stream, read the whole completion anyway")
+    ap.add_argument("--pack", type=int, default=1, help="answer this many consecutive QA rows per call (numbered FINAL: lines), "
+                    "falling back to single calls for rows that do not parse")
+    ap.add_argument("--resume", action="store_true", help="skip ids already completed in out_jsonl (or its .part); retry [ERROR] rows")
+    metrics.add_metrics_args(ap)
     args = ap.parse_args()
-    if not API_KEY:
+    metrics.from_args(args)
+    if args.cache_only and not args.cache:
+        raise SystemExit("--cache_only needs --cache")
+    LIMITER = RateLimiter(args.rps, args.tpm); MAX_RETRIES = args.max_retries
+    STREAM = args.stream; EARLY_STOP = not args.no_early_stop
+    MODEL = args.model or MODEL; TIER = args.tier; tag = TIER or args.mode
+    if args.cache:
+        CACHE = ResponseCache(args.cache, max_mb=args.cache_max_mb, offline=args.cache_only)
+    if not API_KEY and not args.cache_only:
         raise SystemExit("Set OPENROUTER_API_KEY in .env and `source scripts/use_env.sh`")
-    out = open(args.out_jsonl,"w",encoding="utf-8")
+    mount_pool(args.concurrency)
+    field = f"pred_{tag}"
+    done = checkpoint.resume(args.out_jsonl, field) if args.resume else set()
+    t0 = time.time(); n = 0; nerr = 0; ttft = []; tfin = []; nstop = 0; nest = 0
+    out = open(checkpoint.part_path(args.out_jsonl), "a" if args.resume else "w", encoding="utf-8")
     with open(args.in_jsonl,"r",encoding="utf-8") as f:
-        for line in f:
-            r = json.loads(line)
-            task = r.get("task","qa" if "question" in r else "instr")
-            try:
-                final_text, usage, native = run(task, args.mode, r)
-                r[f"pred_{args.mode}"] = final_text
-                c = norm_cost(usage, native)
-                if c is not None: r[f"cost_{args.mode}"] = c
-            except Exception as e:
-                r[f"pred_{args.mode}"] = f"[ERROR] {e}"
-            out.write(json.dumps(r, ensure_ascii=False) + "\n"); out.flush(); time.sleep(0.3)
-    out.close(); print("[ok] wrote", args.out_jsonl)
+        rows = (r for r in map(json.loads, f) if r["id"] not in done)
+        for r in run_rows(rows, args.mode, args.concurrency, args.window, args.pack):
+            out.write(json.dumps(r, ensure_ascii=False) + "\n"); out.flush(); n += 1
+            bad = not checkpoint.ok_row(r, field); nerr += bad
+            metrics.inc("rows_total", stage="call", tier=tag)
+            if bad: metrics.inc("row_errors_total", stage="call", tier=tag)
+            nest += bool(r.get(f"cost_estimated_{tag}"))
+            if r.get(f"ttft_{tag}") is not None:
+                ttft.append(r[f"ttft_{tag}"]); tfin.append(r[f"t_final_{tag}"]); nstop += r[f"early_stop_{tag}"]
+    out.close()
+    dt = time.time() - t0
+    total = checkpoint.finalize(args.in_jsonl, args.out_jsonl)
+    print(f"[ok] wrote {args.out_jsonl} rows={total} called={n} skipped={len(done)} errors={nerr} "
+          f"secs={dt:.1f} rows_per_s={n/max(dt,1e-9):.2f}")
+    if args.pack > 1:
+        ps = PACK_STATS
+        print(f"[pack] size={args.pack} calls={ps['calls']} rows={ps['rows']} fallback={ps['fallback']} "
+              f"parse_fail_rate={ps['fallback']/max(ps['rows'],1):.4f} prompt_tokens_saved_per_row={ps['saved']/max(ps['rows'],1):.1f}")
+    if args.stream:
+        q = lambda v, p: sorted(v)[min(int(p*len(v)), len(v)-1)] if v else float("nan")
+        print(f"[stream] rows={len(ttft)} early_stop={nstop} ttft_p50={q(ttft,.5):.3f} ttft_p95={q(ttft,.95):.3f} "
+              f"t_final_p50={q(tfin,.5):.3f} t_final_p95={q(tfin,.95):.3f} cost_estimated={nest}")
+    print(LIMITER.stats())
+    if CACHE is not None:
+        print(CACHE.stats()); CACHE.close()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Crash-safe JSONL outputs: rows are appended to `<out>.part` one whole line at a time,
+and the finished file is produced in input order with an atomic rename."""
+import os, json
+
+def part_path(out_path):
+    return out_path + ".part"
+
+def ok_row(r, field):
+    v = r.get(field)
+    return isinstance(v, str) and not v.startswith("[ERROR]")
+
+def load_done(path, field):
+    """Ids whose `field` is present and not an [ERROR] marker; torn lines are ignored."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try: r = json.loads(line)
+            except ValueError: continue
+            if ok_row(r, field): done.add(r["id"])
+    return done
+
+def repair_tail(path):
+    """Truncate a trailing partial line left behind by a crash mid-write."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END); pos = size; end = 0
+        while pos > 0:
+            step = min(65536, pos); pos -= step
+            f.seek(pos); i = f.read(step).rfind(b"\n")
+            if i != -1:
+                end = pos + i + 1; break
+        if end != size:
+            f.truncate(end)
+
+def resume(out_path, field):
+    """Prepare `<out>.part` for appending and return the set of ids already completed.
+
+    Completed rows from a previous finished output are carried into the part file so
+    that it is the single source for the final ordered write.
+    """
+    part = part_path(out_path)
+    repair_tail(part)
+    done = load_done(part, field)
+    if os.path.exists(out_path) and os.path.abspath(out_path) != os.path.abspath(part):
+        with open(out_path, "r", encoding="utf-8") as f, open(part, "a", encoding="utf-8") as g:
+            for line in f:
+                try: r = json.loads(line)
+                except ValueError: continue
+                if r["id"] not in done and ok_row(r, field):
+                    g.write(json.dumps(r, ensure_ascii=False) + "\n"); done.add(r["id"])
+    return done
+
+def finalize(in_path, out_path):
+    """Write the part file's rows in `in_path` order to out_path (tmp + os.replace)."""
+    part = part_path(out_path); index = {}
+    with open(part, "rb") as f:
+        off = 0
+        for line in f:
+            index[json.loads(line)["id"]] = off  # the latest attempt for an id wins
+            off += len(line)
+    tmp = out_path + ".tmp"; n = 0
+    with open(in_path, "r", encoding="utf-8") as f, open(part, "rb") as p, open(tmp, "wb") as g:
+        for line in f:
+            off = index.get(json.loads(line)["id"])
+            if off is None: continue
+            p.seek(off); g.write(p.readline()); n += 1
+        g.flush(); os.fsync(g.fileno())
+    os.replace(tmp, out_path); os.remove(part)
+    return n
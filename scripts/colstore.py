@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Columnar experiment store: one memory-mapped Arrow IPC file per column, rows keyed by id.
+
+A store is a directory with id.arrow (the row order), one <column>.arrow per top-level JSONL
+field and columns.json (field order, for export). Stages open only the columns they use,
+memory-mapped, and add columns by writing new files, so text is never re-serialized. Nested
+dicts (score_heavy, probe_probs) become Arrow structs and "score_heavy.f1" names a field.
+pyarrow is only needed by store users; the JSONL path does not import it.
+
+Export is not an exact inverse of import. Arrow has a single null, so a field holding an
+explicit null comes back missing, like a field the row never had. A column (or struct field)
+holding both ints and floats is stored as float64, so its ints come back as 1.0. The stages
+read fields with .get(k, default) and float(), so neither changes their results; compare an
+exported file with its source row by row after json.loads, not with cmp.
+
+    python scripts/colstore.py import --jsonl exp/logs/qa_en.base.scored.jsonl --store exp/store/qa_en
+    python scripts/colstore.py import --jsonl exp/logs/qa_en.heavy.scored.jsonl --store exp/store/qa_en \
+        --columns pred_heavy,cost_heavy,score_heavy
+    python scripts/colstore.py export --store exp/store/qa_en --jsonl out.jsonl
+"""
+import argparse, itertools, json, os
+from urllib.parse import quote
+import numpy as np
+from joinio import score_key, warn_estimated
+try:
+    import pyarrow as pa, pyarrow.compute as pc
+except ImportError:
+    pa = pc = None
+
+def _need():
+    if pa is None: raise SystemExit("the column store needs pyarrow: pip install pyarrow")
+
+def _drop_none(v):
+    if isinstance(v, dict): return {k: _drop_none(x) for k, x in v.items() if x is not None}
+    return v
+
+class _ColumnWriter:
+    """Streams one column to <path>.tmp; the type comes from the first chunk with a non-null value."""
+    def __init__(self, path):
+        self.path = path; self.w = None; self.nulls = 0; self.type = None
+
+    def write(self, arr):
+        if self.w is None:
+            if arr.type == pa.null(): self.nulls += len(arr); return
+            self.type = arr.type; self.sink = pa.OSFile(self.path + ".tmp", "wb")
+            self.w = pa.ipc.new_file(self.sink, pa.schema([("v", self.type)]))
+            if self.nulls: self._put(pa.nulls(self.nulls, self.type))
+        if arr.type != self.type:
+            try: arr = arr.cast(self.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"{os.path.basename(self.path)}: {arr.type} does not match {self.type} from earlier rows") from e
+        self._put(arr)
+
+    def _put(self, arr):
+        self.w.write_batch(pa.record_batch([arr], names=["v"]))
+
+    def close(self):
+        if self.w is None:
+            self.type = pa.null(); self.sink = pa.OSFile(self.path + ".tmp", "wb")
+            self.w = pa.ipc.new_file(self.sink, pa.schema([("v", self.type)])); self._put(pa.nulls(self.nulls))
+        self.w.close(); self.sink.close(); os.replace(self.path + ".tmp", self.path)
+
+class ColumnStore:
+    def __init__(self, path):
+        _need(); self.path = path
+        meta = os.path.join(path, "columns.json")
+        self.names = json.load(open(meta, encoding="utf-8")) if os.path.exists(meta) else []
+
+    def _file(self, name):
+        return os.path.join(self.path, quote(name, safe="") + ".arrow")
+
+    def _save_meta(self):
+        tmp = os.path.join(self.path, "columns.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(self.names, f)
+        os.replace(tmp, os.path.join(self.path, "columns.json"))
+
+    def __contains__(self, name):
+        return name.split(".")[0] in self.names
+
+    def __len__(self):
+        return len(self.column("id"))
+
+    def column(self, name):
+        """A column as a ChunkedArray backed by the memory-mapped file; "a.b" selects struct field b."""
+        top, *fields = name.split(".")
+        if top not in self.names: raise KeyError(f"{self.path}: no column {top!r}")
+        arr = pa.ipc.open_file(pa.memory_map(self._file(top), "r")).read_all().column(0)
+        for f in fields:
+            arr = pc.struct_field(arr, f)
+        return arr
+
+    def numpy(self, name, fill=0.0, dtype=np.float64):
+        if name not in self: return np.full(len(self), fill, dtype=dtype)
+        return self.column(name).fill_null(fill).to_numpy().astype(dtype, copy=False)
+
+    def read(self, names=None):
+        names = names or self.names
+        return pa.table({n: self.column(n) for n in names})
+
+    def rows(self, names=None, chunk=16384):
+        """Yield lists of row dicts holding only `names` (missing and null fields left out)."""
+        t = self.read([n for n in (names or self.names) if n in self])
+        for b in t.to_batches(chunk):
+            yield [_drop_none(r) for r in b.to_pylist()]
+
+    def add(self, cols, ids=None):
+        """Write (or replace) columns given as {name: values}; with `ids`, values are aligned to
+        the store's row order by id and rows absent from `ids` get nulls."""
+        pos = None
+        if ids is not None:
+            ids = pa.array(ids)
+            if not self.column("id").equals(pa.chunked_array([ids])):
+                pos = pc.index_in(self.column("id"), value_set=ids)
+        for name, v in cols.items():
+            arr = v if isinstance(v, (pa.Array, pa.ChunkedArray)) else pa.array(v)
+            if pos is not None: arr = arr.take(pos)
+            if isinstance(arr, pa.ChunkedArray): arr = arr.combine_chunks()
+            w = _ColumnWriter(self._file(name)); w.write(arr); w.close()
+            if name not in self.names: self.names.append(name)
+        self._save_meta()
+
+def struct_column(M, names):
+    """Struct column with one float field per column of the (n, k) matrix M."""
+    _need(); return pa.StructArray.from_arrays([pa.array(M[:,i]) for i in range(M.shape[1])], names=list(names))
+
+def add_columns(store, jsonl, columns=None, chunk=16384):
+    """Add `columns` (default: all new ones) of a JSONL file to an existing store, matched by id.
+
+    The file is streamed in chunks; each chunk's ids are located in the store's id column and
+    only the kept fields are held, as Arrow arrays, until they are scattered into store order.
+    Rows with ids the store lacks are dropped, store rows the file lacks get nulls.
+    """
+    sid = store.column("id"); n = len(sid); parts = {}; pos = []; m = 0
+    with open(jsonl, "r", encoding="utf-8") as f:
+        while True:
+            rows = [json.loads(l) for l in itertools.islice(f, chunk) if l.strip()]
+            if not rows: break
+            at = pc.index_in(pa.array([r["id"] for r in rows]), value_set=sid)
+            hit = np.flatnonzero(at.is_valid().to_numpy(zero_copy_only=False))
+            if not len(hit): continue
+            rows = [rows[i] for i in hit]; pos.append(at.to_numpy(zero_copy_only=False)[hit].astype(np.int64))
+            keys = columns or [k for k in dict.fromkeys(k for r in rows for k in r) if k not in store.names or k in parts]
+            for k in keys:
+                if k == "id": continue
+                if k not in parts: parts[k] = [pa.nulls(m)] if m else []
+                parts[k].append(pa.array([r.get(k) for r in rows]))
+            for k in parts:
+                if k not in keys: parts[k].append(pa.nulls(len(rows)))
+            m += len(rows)
+    src = np.full(n, -1, dtype=np.int64)
+    if pos: src[np.concatenate(pos)] = np.arange(m)  # a repeated id keeps its last row
+    take = pa.array(src, mask=src < 0)
+    cols = {}
+    for k, arrs in parts.items():
+        t = next((a.type for a in arrs if a.type != pa.null()), pa.null())
+        try: arrs = [a.cast(t) if a.type != t else a for a in arrs]
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"{jsonl}: column {k!r} does not have one type across chunks ({t})") from e
+        cols[k] = pa.concat_arrays(arrs).take(take) if arrs else pa.nulls(n)
+    store.add(cols)
+
+def import_jsonl(jsonl, path, columns=None, chunk=16384):
+    """Create a store from a JSONL file, or add its `columns` (default: all new ones) to an existing store by id."""
+    _need()
+    if os.path.exists(os.path.join(path, "id.arrow")):
+        store = ColumnStore(path); add_columns(store, jsonl, columns, chunk)
+        return store
+    os.makedirs(path, exist_ok=True)
+    writers = {}; names = []; n = 0
+    with open(jsonl, "r", encoding="utf-8") as f:
+        while True:
+            rows = [json.loads(l) for l in itertools.islice(f, chunk) if l.strip()]
+            if not rows: break
+            keys = [k for k in dict.fromkeys(k for r in rows for k in r) if columns is None or k == "id" or k in columns]
+            for k in keys:
+                if k not in writers:
+                    writers[k] = _ColumnWriter(os.path.join(path, quote(k, safe="") + ".arrow")); names.append(k)
+                    if n: writers[k].write(pa.nulls(n))
+            for k in names:
+                writers[k].write(pa.array([r.get(k) for r in rows]))
+            n += len(rows)
+    if "id" not in writers: raise ValueError(f"{jsonl}: rows have no id")
+    for w in writers.values(): w.close()
+    store = ColumnStore(path); store.names = names; store._save_meta()
+    return store
+
+def export_jsonl(store, jsonl, columns=None, chunk=16384):
+    """Write the store as JSONL; null fields are left out and mixed int/float columns come back as floats."""
+    n = 0
+    with open(jsonl, "w", encoding="utf-8") as g:
+        for rows in store.rows(columns, chunk):
+            g.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)); n += len(rows)
+    return n
+
+def scored_arrays(store, task, featurize=None, names=("id","task","text","lang","question","instruction","input","probe_probs","probe_margin"), chunk=16384):
+    """joinio.scored_arrays for a store holding both score_base and score_heavy columns."""
+    key = score_key(task); F = None
+    if featurize is not None:
+        F = [featurize(rs) for rs in store.rows(list(names), chunk)]
+        F = np.concatenate(F) if F else np.zeros(0)
+    warn_estimated(int(store.numpy("cost_estimated_heavy", False, bool).sum()))
+    return F, store.numpy(f"score_base.{key}"), store.numpy(f"score_heavy.{key}"), store.numpy("cost_heavy")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["import","export","info"])
+    ap.add_argument("--store", required=True)
+    ap.add_argument("--jsonl", default=None)
+    ap.add_argument("--columns", default=None, help="comma-separated fields (default: all)")
+    a = ap.parse_args()
+    cols = a.columns.split(",") if a.columns else None
+    if a.cmd == "import":
+        s = import_jsonl(a.jsonl, a.store, cols); print(f"[ok] {a.store} rows={len(s)} columns={','.join(s.names)}")
+    elif a.cmd == "export":
+        n = export_jsonl(ColumnStore(a.store), a.jsonl, cols); print(f"[ok] wrote {a.jsonl} rows={n}")
+    else:
+        s = ColumnStore(a.store)
+        for name in s.names:
+            print(f"{name}\t{s.column(name).type}\t{os.path.getsize(s._file(name))}")
+        print(f"[ok] {a.store} rows={len(s)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Per-row token-cost prediction so the gate can price a call before making it.
+
+Features come from the row and the prompt call_openrouter would send (prompts.py, so no HTTP
+client is imported); the model is a linear
+regression per mode (trained by train_cost.py) kept as numpy weights, so predicting a batch
+is one matrix product.
+"""
+import numpy as np, joblib
+from act_feats import prob_matrix, VOC_ACTS
+from prompts import QA_FIXED, INSTR_FIXED, max_tokens
+
+COST_FEATS = ["prompt_tok", "max_tokens", "is_qa", "is_zh", "log_len"] + [f"p_{a}" for a in VOC_ACTS]
+FEATURE_SETS = {"all": set(COST_FEATS),
+                "no_acts": {"prompt_tok", "max_tokens", "is_qa", "is_zh", "log_len"},
+                "prompt_only": {"prompt_tok", "max_tokens"}}
+
+def task_of(rec):
+    return rec.get("task", "qa" if "question" in rec else "instr")
+
+def prompt_chars(recs, is_qa):
+    """Characters of each row's prompt (system + user messages) without building the messages."""
+    n = len(recs)
+    q = np.fromiter((len(str(r.get("question", ""))) if qa else 0 for r, qa in zip(recs, is_qa)), dtype=np.float64, count=n)
+    i = np.fromiter((0 if qa else len(str(r.get("instruction", ""))) + len(str(r.get("input", ""))) for r, qa in zip(recs, is_qa)),
+                    dtype=np.float64, count=n)
+    return np.where(is_qa, QA_FIXED + q, INSTR_FIXED + i)
+
+def cost_features(recs, mode):
+    """(n, len(COST_FEATS)) float64; prompt_tok is the chars/4 estimate call_openrouter uses."""
+    n = len(recs); X = np.zeros((n, len(COST_FEATS)))
+    is_qa = np.fromiter((task_of(r) == "qa" for r in recs), dtype=bool, count=n)
+    X[:, 0] = prompt_chars(recs, is_qa) / 4.0
+    X[:, 1] = np.where(is_qa, max_tokens("qa", mode), max_tokens("instr", mode))
+    X[:, 2] = is_qa
+    X[:, 3] = np.fromiter((r.get("lang", "en") == "zh" for r in recs), dtype=bool, count=n)
+    X[:, 4] = np.log1p(np.fromiter((len(r.get("text", "")) for r in recs), dtype=np.float64, count=n))
+    X[:, 5:] = prob_matrix(recs, VOC_ACTS)
+    return X
+
+def feature_mask(feature_set):
+    return np.array([float(n in FEATURE_SETS[feature_set]) for n in COST_FEATS])
+
+class CostModel:
+    """Loaded train_cost.py bundle: {"kind": "cost_linear", "feature_set", "modes": {mode: {"w", "b"}}}."""
+    def __init__(self, obj):
+        if isinstance(obj, str): obj = joblib.load(obj)
+        if obj.get("kind") != "cost_linear": raise ValueError(f"not a cost model: kind={obj.get('kind')!r}")
+        self.obj = obj; self.mask = feature_mask(obj.get("feature_set", "all"))
+        self.modes = {m: (np.asarray(d["w"], dtype=float), float(d["b"])) for m, d in obj["modes"].items()}
+
+    def predict_X(self, X, mode):
+        w, b = self.modes[mode]
+        return np.maximum((X * self.mask) @ w + b, 0.0)
+
+    def predict(self, recs, mode="heavy"):
+        """Predicted total tokens of a `mode` call for each record."""
+        return self.predict_X(cost_features(recs, mode), mode)
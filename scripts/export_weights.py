@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Flatten act_probe.joblib + voc.joblib into a small versioned JSON weights file for fastgate.py.
+
+The probe keeps the scaler mean/scale and the LR coefficients; the VoC is router.flatten_voc's
+fold list (LR weights + sigmoid calibrator per fold, averaged at predict time). The act_feats
+cue regexes are written next to the weights so fastgate needs no code from this repo's numpy side.
+
+    python scripts/export_weights.py --probe models/act_probe.joblib --voc models/voc.joblib \
+        --out models/gate_weights.json --check exp/logs/qa_en.jsonl --cold_start
+"""
+import json, argparse, pathlib, subprocess, sys, time, os
+import joblib
+from act_feats import RX, VOC_ACTS, FEAT_NAMES, probe_features, voc_features
+from gate_blend import unwrap_clf, pos_probs, model_mask
+from run_probe import probe_batch
+from router import flatten_voc, record_text
+from fastgate import FastGate, FORMAT, VERSION
+
+PROBE_CUES = ["ends_q", "probe_wh", "req", "zh_q", "excl", "ellipsis"]
+VOC_CUES = ["voc_wh", "ends_q", "imperative", "zh_q", "zh_please"]
+
+def export(probe_obj, voc_obj):
+    if probe_obj.get("kind") == "probe_hash":
+        raise SystemExit("[error] hashed probes (train_probe_hash.py) have no compact linear form; export a train_probe.py model")
+    sc, lr = probe_obj["pipe"].named_steps["scaler"], probe_obj["pipe"].named_steps["lr"]
+    if len(lr.classes_) != len(probe_obj["acts"]) or lr.coef_.shape[0] != len(probe_obj["acts"]):
+        raise SystemExit(f"[error] probe was fit on {len(lr.classes_)} of {len(probe_obj['acts'])} acts; retrain it on all of them")
+    clf = unwrap_clf(voc_obj); voc = flatten_voc(clf)
+    if voc is None:
+        raise SystemExit(f"[error] cannot flatten a {type(clf).__name__} VoC model (see router.flatten_voc)")
+    return {"format": FORMAT, "version": VERSION,
+            "rx": {k: RX[k].pattern for k in sorted(set(PROBE_CUES + VOC_CUES))},
+            "probe": {"acts": list(probe_obj["acts"]), "cues": PROBE_CUES, "mean": sc.mean_.tolist(), "scale": sc.scale_.tolist(),
+                      "W": lr.coef_.tolist(), "b": lr.intercept_.tolist()},
+            "voc": {"acts": VOC_ACTS, "cues": VOC_CUES, "feat_names": FEAT_NAMES,
+                    "feature_set": voc_obj.get("feature_set", "all") if isinstance(voc_obj, dict) else "all",
+                    "mask": model_mask(voc_obj).tolist(), "W": voc.W.tolist(), "b": voc.b.tolist(),
+                    "A": voc.A.tolist(), "B": voc.B.tolist(), "const": voc.const}}
+
+def check(gate, probe_obj, voc_obj, path, limit):
+    """Max |fastgate - sklearn predict_proba| over the first `limit` rows of `path`, for both models."""
+    recs = []
+    for l in open(path, "r", encoding="utf-8"):
+        if l.strip(): recs.append(json.loads(l))
+        if len(recs) >= limit: break
+    texts = [record_text(r) for r in recs]; langs = [r.get("lang", "en") for r in recs]
+    P = probe_batch(probe_obj["pipe"], probe_features(texts, langs)); acts = probe_obj["acts"]
+    probs = [{a: float(p[i]) for i, a in enumerate(acts)} for p in P]
+    X = voc_features([{"text": t, "lang": g, "probe_probs": p} for t, g, p in zip(texts, langs, probs)]) * model_mask(voc_obj)
+    V = pos_probs(unwrap_clf(voc_obj), X)
+    dp = dv = 0.0
+    for t, g, p, v in zip(texts, langs, P, V):
+        fp, _ = gate.probe(t, g)
+        dp = max(dp, max(abs(fp[a] - p[i]) for i, a in enumerate(acts)))
+        dv = max(dv, abs(gate.p_gain(gate.voc_features(t, g, fp)) - v))
+    return len(recs), dp, dv
+
+COLD = {
+    "joblib": "import router; r = router.Router({probe!r}, {voc!r}); r.decide({rec!r})",
+    "fastgate": "import fastgate; fastgate.FastGate({weights!r}).decide({rec!r})",
+}
+
+def cold_start(args, rec, repeats):
+    """Median wall time of a fresh interpreter that loads the models and makes one decision."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH")])))
+    out = {}
+    for name, code in COLD.items():
+        src = code.format(rec=rec, **args); ts = []
+        for _ in range(repeats):
+            t0 = time.perf_counter(); subprocess.run([sys.executable, "-c", src], check=True, env=env); ts.append(time.perf_counter() - t0)
+        out[name] = sorted(ts)[len(ts) // 2]
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--probe", default="models/act_probe.joblib")
+    ap.add_argument("--voc", default="models/voc.joblib")
+    ap.add_argument("--out", default="models/gate_weights.json")
+    ap.add_argument("--check", default=None, help="JSONL rows to compare fastgate against the sklearn models on")
+    ap.add_argument("--check_n", type=int, default=10000)
+    ap.add_argument("--tol", type=float, default=1e-9)
+    ap.add_argument("--cold_start", action="store_true", help="time import-to-first-decision for router.Router vs fastgate")
+    ap.add_argument("--repeats", type=int, default=5)
+    a = ap.parse_args()
+    probe_obj, voc_obj = joblib.load(a.probe), joblib.load(a.voc)
+    w = export(probe_obj, voc_obj)
+    pathlib.Path(a.out).parent.mkdir(parents=True, exist_ok=True)
+    tmp = a.out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(w, f)
+    os.replace(tmp, a.out)
+    print(f"[ok] saved {a.out} bytes={os.path.getsize(a.out)} voc_folds={len(w['voc']['W'])} feature_set={w['voc']['feature_set']}")
+    if a.check:
+        n, dp, dv = check(FastGate(w), probe_obj, voc_obj, a.check, a.check_n)
+        print(f"[check] rows={n} max_abs_diff_probe={dp:.3g} max_abs_diff_voc={dv:.3g} tol={a.tol:g}")
+        if max(dp, dv) > a.tol: raise SystemExit(f"[error] fastgate differs from the sklearn models by more than {a.tol:g}")
+    if a.cold_start:
+        rec = {"id": "cold", "task": "qa", "question": "Who wrote Hamlet?", "lang": "en"}
+        t = cold_start({"probe": os.path.abspath(a.probe), "voc": os.path.abspath(a.voc), "weights": os.path.abspath(a.out)}, rec, a.repeats)
+        print(f"[cold-start] repeats={a.repeats} joblib_s={t['joblib']:.3f} fastgate_s={t['fastgate']:.3f} speedup={t['joblib']/max(t['fastgate'],1e-9):.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Dependency-free gate: probe -> VoC -> base/heavy decision from an export_weights.py file.
+
+Only the standard library is imported, so a short-lived worker pays for json/re instead of
+numpy, sklearn and joblib before its first decision. Features follow act_feats row by row
+(the cue regexes are read from the weights file) and are rounded to float32 as act_feats
+does, so probabilities match the sklearn models to ~1e-12.
+
+    python scripts/fastgate.py --weights models/gate_weights.json --in_jsonl rows.jsonl --out_jsonl decisions.jsonl
+    python scripts/fastgate.py --weights models/gate_weights.json --port 8091
+"""
+import json, math, re, struct, sys, time, argparse
+
+FORMAT = "pgbi-gate-weights"
+VERSION = 1
+
+def f32(x):
+    return struct.unpack("f", struct.pack("f", x))[0]
+
+def dot(w, x):
+    return math.fsum(a * b for a, b in zip(w, x))
+
+def record_text(rec):
+    if "text" in rec: return rec["text"]
+    return rec.get("question") if "question" in rec else rec.get("input", "")
+
+class FastGate:
+    def __init__(self, weights):
+        w = json.load(open(weights, encoding="utf-8")) if isinstance(weights, str) else weights
+        if w.get("format") != FORMAT or w.get("version") != VERSION:
+            raise ValueError(f"not a v{VERSION} gate weights file: format={w.get('format')!r} version={w.get('version')!r}")
+        self.rx = {k: re.compile(p) for k, p in w["rx"].items()}
+        p = w["probe"]; self.acts = p["acts"]; self.probe_cues = p["cues"]
+        self.mu, self.sd, self.Wp, self.bp = p["mean"], p["scale"], p["W"], p["b"]
+        v = w["voc"]; self.voc_acts = v["acts"]; self.voc_cues = v["cues"]; self.mask = v["mask"]
+        self.W, self.b, self.A, self.B, self.const = v["W"], v["b"], v["A"], v["B"], v.get("const")
+
+    def _hit(self, name, low):
+        return 1.0 if self.rx[name].search(low) else 0.0
+
+    def probe_features(self, text, lang):
+        """One row of act_feats.probe_features."""
+        t = text.replace("\x00", "\x01"); low = t.lower()
+        return [f32(math.log1p(len(t.strip())))] + [self._hit(c, low) for c in self.probe_cues] + \
+               [float(lang == "zh"), float(lang == "en")]
+
+    def probe(self, text, lang):
+        x = [(v - m) / s for v, m, s in zip(self.probe_features(text, lang), self.mu, self.sd)]
+        z = [dot(w, x) + b for w, b in zip(self.Wp, self.bp)]
+        top = max(z); e = [math.exp(v - top) for v in z]; tot = sum(e); p = [v / tot for v in e]
+        s = sorted(p, reverse=True)
+        return {a: p[i] for i, a in enumerate(self.acts)}, s[0] - s[1] if len(s) >= 2 else s[0]
+
+    def voc_features(self, text, lang, probs):
+        """One row of act_feats.voc_features."""
+        P = [probs.get(a, 0.0) for a in self.voc_acts]; s = sorted(P, reverse=True); tot = sum(P)
+        if tot > 0:
+            Q = [min(max(v / tot, 1e-9), 1.0) for v in P]; H = -sum(q * math.log(q) for q in Q)
+        else:
+            H = math.log(len(P))
+        low = text.replace("\x00", "\x01").lower()
+        x = P[:3] + [s[0] - s[1] if len(s) >= 2 else s[0], H, math.log1p(len(text)), float(lang == "zh")]
+        return [f32(v) for v in x] + [self._hit(c, low) for c in self.voc_cues]
+
+    def p_gain(self, x):
+        if self.const is not None: return self.const
+        x = [v * m for v, m in zip(x, self.mask)]
+        return sum(1.0 / (1.0 + math.exp(a * (dot(w, x) + b) + B)) for w, b, a, B in zip(self.W, self.b, self.A, self.B)) / len(self.W)
+
+    def decide(self, rec, lambda_=0.002, gain_scale=1.0, cost_heavy=100.0):
+        """router.Router.decide without the cost model: cost is the row's cost_heavy or `cost_heavy`."""
+        t0 = time.perf_counter()
+        text = record_text(rec); lang = rec.get("lang", "en")
+        probs, margin = self.probe(text, lang)
+        p = self.p_gain(self.voc_features(text, lang, probs))
+        cost = float(rec["cost_heavy"]) if rec.get("cost_heavy") is not None else cost_heavy
+        use = (p * gain_scale) >= (lambda_ * cost)
+        return {"id": rec.get("id"), "chosen": "heavy" if use else "base", "p_gain": p, "cost_heavy": cost,
+                "probe_probs": probs, "probe_margin": margin, "decision_us": (time.perf_counter() - t0) * 1e6}
+
+def serve(gate, host, port, **kw):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, code, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != "/decide": return self.reply(404, {"error": "not found"})
+            try:
+                rec = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError as e:
+                return self.reply(400, {"error": f"bad json: {e}"})
+            self.reply(200, gate.decide(rec, **kw))
+
+    srv = ThreadingHTTPServer((host, port), Handler); srv.daemon_threads = True
+    print(f"[fastgate] serving http://{host}:{port}/decide", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", default="models/gate_weights.json")
+    ap.add_argument("--in_jsonl", default=None, help="rows to decide (default: stdin)")
+    ap.add_argument("--out_jsonl", default=None, help="decisions (default: stdout)")
+    ap.add_argument("--lambda_", type=float, default=0.002)
+    ap.add_argument("--gain_scale", type=float, default=1.0)
+    ap.add_argument("--cost_heavy", type=float, default=100.0, help="heavy cost assumed when a row carries none")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=None, help="serve /decide instead of reading rows")
+    a = ap.parse_args()
+    gate = FastGate(a.weights); kw = dict(lambda_=a.lambda_, gain_scale=a.gain_scale, cost_heavy=a.cost_heavy)
+    if a.port is not None:
+        return serve(gate, a.host, a.port, **kw)
+    f = open(a.in_jsonl, "r", encoding="utf-8") if a.in_jsonl else sys.stdin
+    g = open(a.out_jsonl, "w", encoding="utf-8") if a.out_jsonl else sys.stdout
+    for line in f:
+        if line.strip(): g.write(json.dumps(gate.decide(json.loads(line), **kw), ensure_ascii=False) + "\n")
+    g.flush()
+
+if __name__ == "__main__":
+    main()
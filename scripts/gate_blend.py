@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
-import json, argparse, joblib, math, numpy as np
-
-def load_map(p):
-    return {json.loads(l)["id"]: json.loads(l) for l in open(p, "r", encoding="utf-8")}
+import json, argparse, itertools, joblib, numpy as np
+from act_feats import voc_features, feature_mask
+from budget import allocate, top_fraction, Pacer
+from joinio import pairs, rows, scored_arrays, add_join_arg, JoinStats
+from cost_model import CostModel
+import metrics
+from results_store import add_results_arg, record
 
 def unwrap_clf(obj):
     """Support both raw sklearn estimators and {'clf': estimator} bundles."""
@@ -13,88 +16,115 @@ def unwrap_clf(obj):
     return obj
 
 def features(rec):
-    p = rec.get("probe_probs", {})
-    def top2(ps):
-        xs = sorted([ps.get(k,0.0) for k in ["question","request","statement","promise","expressive","declaration"]], reverse=True)
-        return (xs[0]-xs[1]) if len(xs)>=2 else (xs[0] if xs else 0.0)
-    def entropy(ps):
-        arr = np.array([ps.get(k,0.0) for k in ["question","request","statement","promise","expressive","declaration"]], dtype=float)
-        if arr.sum() <= 0: return math.log(6)
-        arr /= arr.sum(); arr = arr.clip(1e-9, 1.0)
-        return float(-(arr*np.log(arr)).sum())
-    cues = {
-        "starts_wh": int(rec["text"].lower().startswith(("who","what","when","where","why","how","which"))),
-        "ends_qmark": int(rec["text"].strip().endswith(("?","？"))),
-        "imperative": int("please" in rec["text"].lower() or "请" in rec["text"]),
-        "zh_qmark": int("？" in rec["text"]),
-        "zh_request_please": int("请" in rec["text"]),
-    }
-    return [
-        p.get("question",0.0), p.get("request",0.0), p.get("statement",0.0),
-        top2(p), entropy(p), math.log(1+len(rec.get("text",""))),
-        float(rec.get("lang","en")=="zh"), float(cues["starts_wh"]), float(cues["ends_qmark"]),
-        float(cues["imperative"]), float(cues["zh_qmark"]), float(cues["zh_request_please"])
-    ]
+    """12-dim VoC feature vector for one record; see act_feats.voc_features."""
+    return voc_features([rec])[0].tolist()
 
-def pos_prob(clf, X):
-    """Return P(y=1) robustly even if the classifier saw one class."""
-    P = clf.predict_proba(X)
+def pos_probs(clf, X):
+    """Return P(y=1) per row robustly even if the classifier saw one class."""
+    X = np.asarray(X, dtype=float)
+    if X.shape[0] == 0:
+        return np.zeros(0)
+    with metrics.span("voc"): P = clf.predict_proba(X)
     if getattr(P, "ndim", 2) == 1:
         P = P.reshape(1, -1)
+    classes = list(getattr(clf, "classes_", []))
     if P.shape[1] == 2:
-        try:
-            classes = list(getattr(clf, "classes_", [0,1]))
-            idx1 = classes.index(1) if 1 in classes else 1
-        except Exception:
-            idx1 = 1
-        return float(P[0, idx1])
+        return P[:, classes.index(1) if 1 in classes else 1]
     # single-column probability (e.g., Dummy on single-class data)
-    try:
-        classes = list(getattr(clf, "classes_", []))
-        if classes and classes[0] == 1:
-            return float(P[0,0])
-        else:
-            return 0.0
-    except Exception:
-        return 0.0
+    if classes and classes[0] == 1:
+        return P[:, 0]
+    return np.zeros(P.shape[0])
+
+def pos_prob(clf, X):
+    """P(y=1) for the first row of X."""
+    return float(pos_probs(clf, X)[0])
+
+def model_mask(model):
+    fs = model.get("feature_set", "all") if isinstance(model, dict) else "all"
+    return feature_mask(fs)
+
+def chunks(it, n=16384):
+    while True:
+        c = list(itertools.islice(it, n))
+        if not c: return
+        yield c
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--task", choices=["qa","instr"], required=True)
     ap.add_argument("--base_scored", required=True)
-    ap.add_argument("--heavy_scored", required=True)
+    ap.add_argument("--heavy_scored", default=None, help="needed for quality; optional with --cost_model")
     ap.add_argument("--voc_model", required=True)
+    ap.add_argument("--cost_model", default=None, help="train_cost.py model: gate on predicted heavy cost instead of cost_heavy")
     ap.add_argument("--lambda_", type=float, default=0.002)
     ap.add_argument("--gain_scale", type=float, default=1.0)
     ap.add_argument("--out_jsonl", required=True)
-    a = ap.parse_args()
+    ap.add_argument("--budget_tokens", type=float, default=None, help="pick rows by gain/cost until this many heavy tokens")
+    ap.add_argument("--heavy_frac", type=float, default=None, help="heavy on this fraction of rows, largest expected gain first")
+    ap.add_argument("--online", action="store_true", help="with --budget_tokens: pace the budget row by row in file order")
+    ap.add_argument("--explore", type=float, default=0.0, help="send this random fraction of the other rows to heavy too, "
+                    "recording explore and p_heavy so VoC labels can be reweighted (train_voc_online.py)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--expected_rows", type=int, default=None, help="online pacing horizon (default: N)")
+    add_join_arg(ap); add_results_arg(ap); metrics.add_metrics_args(ap)
+    a = ap.parse_args(); metrics.from_args(a)
 
-    base  = load_map(a.base_scored)
-    heavy = load_map(a.heavy_scored)
+    if a.heavy_scored is None and a.cost_model is None: ap.error("--heavy_scored is required without --cost_model")
     model = joblib.load(a.voc_model)
-    clf   = unwrap_clf(model)
-
-    N=0; quality=0.0; tokens=0.0
-    out = open(a.out_jsonl, "w", encoding="utf-8")
-    for k,b in base.items():
-        h = heavy[k]
-        X = [features(b)]
-        p = pos_prob(clf, X)
-        cost = float(h.get("cost_heavy", 0.0) or 0.0)
-        use = (p * a.gain_scale) >= (a.lambda_ * cost)
+    clf   = unwrap_clf(model); mask = model_mask(model)
+    cm    = CostModel(a.cost_model) if a.cost_model else None
+    def featurize(recs):
+        p = pos_probs(clf, voc_features(recs) * mask)
+        return np.column_stack([p, cm.predict(recs, "heavy")]) if cm else p[:, None]
 
-        rec = b.copy(); rec["chosen"] = "heavy" if use else "base"
-        if a.task == "qa":
-            sb=b.get("score_base",{}).get("f1",0.0); sh=h.get("score_heavy",{}).get("f1",0.0)
-            quality += (sh if use else sb)
-        else:
-            sb=b.get("score_base",{}).get("rougeL",0.0); sh=h.get("score_heavy",{}).get("rougeL",0.0)
-            quality += (sh if use else sb)
-        tokens += (cost if use else 0.0)
-        out.write(json.dumps(rec, ensure_ascii=False) + "\n")
-        N += 1
-    out.close()
-    print(f"[gate] N={N} avg_quality={quality/max(N,1):.3f} total_tokens={tokens:.1f} lambda={a.lambda_} gain_scale={a.gain_scale}")
+    # pass 1: expected gains and costs only; pass 2 below re-streams the rows for the output
+    if a.heavy_scored:
+        F, sb, sh, costs = scored_arrays(a.base_scored, a.heavy_scored, a.task, featurize, a.join)
+    else:
+        F = [featurize(c) for c in chunks(rows(a.base_scored))]; F = np.concatenate(F) if F else np.zeros((0, 2))
+        sb = sh = costs = None
+    probs = F[:, 0]; price = F[:, 1] if cm else costs
+    gain = probs * a.gain_scale; tag = "gate"; lam = a.lambda_
+    if a.budget_tokens is not None and a.online:
+        pacer = Pacer(a.budget_tokens, a.expected_rows or len(gain), lambda0=a.lambda_)
+        chosen = np.array([pacer.decide(g, c) for g, c in zip(gain.tolist(), price.tolist())], dtype=bool)
+        tag = "gate-budget"; lam = pacer.lam
+    elif a.budget_tokens is not None:
+        chosen, lam, _ = allocate(gain, price, a.budget_tokens); tag = "gate-budget"
+    elif a.heavy_frac is not None:
+        chosen, _ = top_fraction(gain, a.heavy_frac); tag = "gate-budget"
+        picked = chosen & (price > 0)
+        lam = float((gain[picked] / price[picked]).min()) if picked.any() else float("inf")
+    else:
+        chosen = gain >= a.lambda_ * price
+    N = len(gain); explored = np.zeros(N, dtype=bool)
+    if a.explore > 0:
+        explored = ~chosen & (np.random.default_rng(a.seed).random(N) < a.explore); chosen = chosen | explored
+    src = pairs(a.base_scored, a.heavy_scored, a.join, JoinStats()) if a.heavy_scored else ((b, None) for b in rows(a.base_scored))
+    with open(a.out_jsonl, "w", encoding="utf-8") as out:
+        for i, ((b, _), use) in enumerate(zip(src, chosen.tolist())):
+            b["chosen"] = "heavy" if use else "base"
+            if cm: b["cost_heavy_pred"] = float(price[i])
+            if a.explore > 0: b["explore"] = bool(explored[i]); b["p_heavy"] = 1.0 if use and not explored[i] else a.explore
+            out.write(json.dumps(b, ensure_ascii=False) + "\n")
+    pred = f" cost_model={a.cost_model} pred_tokens={float(price[chosen].sum()):.1f}" if cm else ""
+    if a.explore > 0: pred += f" explore={a.explore:g} explored={int(explored.sum())}"
+    if costs is None:
+        print(f"[gate-predict] N={N} heavy={int(np.sum(chosen))} pred_tokens={float(price[chosen].sum()):.1f} lambda={lam:.6g} "
+              f"gain_scale={a.gain_scale} cost_model={a.cost_model}")
+        return
+    quality = float(np.where(chosen, sh, sb).sum()); tokens = float(np.where(chosen, costs, 0.0).sum())
+    params = {"gain_scale": a.gain_scale, "lambda": a.lambda_, "budget_tokens": a.budget_tokens, "heavy_frac": a.heavy_frac,
+              "online": a.online, "explore": a.explore, "seed": a.seed, "join": a.join}
+    record(a.results, "gate_blend.py", "pgbi", a.task, [(lam, quality/max(N,1), tokens, int(np.sum(chosen)))], tag=tag, kind="point", n=N,
+           params={k: v for k, v in params.items() if v is not None}, models={"voc": a.voc_model, "cost": a.cost_model},
+           inputs=[a.base_scored, a.heavy_scored], endpoints=(float(sb.mean()), float(sh.mean()), float(costs.sum())) if N else None)
+    if tag == "gate":
+        print(f"[gate] N={N} avg_quality={quality/max(N,1):.3f} total_tokens={tokens:.1f} lambda={a.lambda_} gain_scale={a.gain_scale}{pred}")
+    else:
+        limit = f"budget_tokens={a.budget_tokens:g}" if a.budget_tokens is not None else f"heavy_frac={a.heavy_frac:g}"
+        print(f"[{tag}] N={N} avg_quality={quality/max(N,1):.3f} total_tokens={tokens:.1f} {limit} "
+              f"heavy={int(np.sum(chosen))} implied_lambda={lam:.6g} mode={'online' if a.online else 'offline'} gain_scale={a.gain_scale}{pred}")
 
 if __name__ == "__main__":
     main()
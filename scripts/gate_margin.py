@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
 import json, argparse
-
-def load_map(p): 
-    return {json.loads(l)["id"]:json.loads(l) for l in open(p,"r",encoding="utf-8")}
+from joinio import pairs, add_join_arg, warn_estimated
+from results_store import add_results_arg, record
 
 def ensure_margin(rec):
     if "probe_margin" in rec:
@@ -18,13 +17,12 @@ ap.add_argument("--base_scored", required=True)
 ap.add_argument("--heavy_scored", required=True)
 ap.add_argument("--tau", type=float, required=True, help="use heavy iff margin < tau")
 ap.add_argument("--out_jsonl", required=True)
+add_join_arg(ap); add_results_arg(ap)
 a=ap.parse_args()
 
-base=load_map(a.base_scored); heavy=load_map(a.heavy_scored)
-N=0; quality=0.0; tokens=0.0
+N=0; quality=0.0; tokens=0.0; heavy=0; est=0
 out=open(a.out_jsonl,"w",encoding="utf-8")
-for k,b in base.items():
-    h = heavy[k]
+for b,h in pairs(a.base_scored, a.heavy_scored, a.join):
     m = ensure_margin(b)
     use = (m < a.tau)
     rec = b.copy(); rec["chosen"] = "heavy" if use else "base"
@@ -34,7 +32,9 @@ for k,b in base.items():
     else:
         sb=b.get("score_base",{}).get("rougeL",0.0); sh=h.get("score_heavy",{}).get("rougeL",0.0)
         quality += (sh if use else sb)
-    tokens += float(h.get("cost_heavy",0.0) or 0.0) if use else 0.0
+    tokens += float(h.get("cost_heavy",0.0) or 0.0) if use else 0.0; heavy += use; est += use and bool(h.get("cost_estimated_heavy"))
     out.write(json.dumps(rec, ensure_ascii=False)+"\n"); N+=1
-out.close()
+out.close(); warn_estimated(est)
+record(a.results, "gate_margin.py", "margin", a.task, [(a.tau, quality/max(N,1), tokens, heavy)], tag="gate-margin", kind="point", n=N,
+       params={"join": a.join}, inputs=[a.base_scored, a.heavy_scored])
 print(f"[gate-margin] N={N} avg_quality={quality/max(N,1):.3f} total_tokens={tokens:.1f} tau={a.tau}")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""K-tier gate: every row goes to argmax_k gain_k - lambda*cost_k over base and the tiers.
+
+Each tier above base has its own VoC model (train_voc.py on build_voc_train.py --tier <name>
+data), so gain_k = gain_scale * P(tier k beats base) and cost_k is the tier's logged cost;
+base has gain 0 and, as in gate_blend, cost 0. budget.tier_events puts every row's upper
+envelope in one sorted event list, so a lambda grid, a token budget and the whole K-way
+frontier are prefix sums over it. With a single tier this is gate_blend / sweep_gate.
+
+    python scripts/gate_tiers.py --task qa --base_scored exp/logs/qa_en.base.scored.jsonl \\
+        --tier mid exp/logs/qa_en.mid.scored.jsonl models/voc_qa_mid.joblib \\
+        --tier heavy exp/logs/qa_en.heavy.scored.jsonl models/voc_qa.joblib --sweep
+"""
+import argparse, json, time
+import numpy as np, joblib
+from act_feats import voc_features
+from gate_blend import unwrap_clf, pos_probs, model_mask
+from joinio import tier_arrays, tier_join, JoinStats
+from budget import tier_events, tier_choice
+from sweep_gate import grid
+from results_store import add_results_arg, record
+
+class TierCurve:
+    """Quality, tokens and tier mix after the first k events."""
+    def __init__(self, S, C, start, row, frm, to):
+        n, K = S.shape; self.n = n
+        self.q0 = float(S[np.arange(n), start].sum()); self.t0 = float(C[np.arange(n), start].sum())
+        self.dq = np.concatenate([[0.0], np.cumsum(S[row, to] - S[row, frm])])
+        self.dt = np.concatenate([[0.0], np.cumsum(C[row, to] - C[row, frm])])
+        mix = np.zeros((len(row) + 1, K)); mix[0] = np.bincount(start, minlength=K)
+        np.subtract.at(mix[1:], (np.arange(len(row)), frm), 1); np.add.at(mix[1:], (np.arange(len(row)), to), 1)
+        self.mix = np.cumsum(mix, axis=0)
+
+    def at(self, k):
+        k = np.asarray(k)
+        return (self.q0 + self.dq[k]) / max(self.n, 1), self.t0 + self.dt[k], self.mix[k]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--task", choices=["qa","instr"], required=True)
+    ap.add_argument("--base_scored", required=True)
+    ap.add_argument("--tier", nargs=3, action="append", required=True, metavar=("NAME", "SCORED", "VOC_MODEL"),
+                    help="a tier above base: scored file with score_<NAME>/cost_<NAME> and its VoC model; repeat per tier")
+    ap.add_argument("--lambda_", type=float, default=0.002)
+    ap.add_argument("--gain_scale", type=float, default=1.0)
+    ap.add_argument("--budget_tokens", type=float, default=None, help="smallest lambda whose frontier point fits this many tokens")
+    ap.add_argument("--out_jsonl", default=None, help="base rows with chosen=<tier> at the selected lambda")
+    ap.add_argument("--sweep", action="store_true", help="print the frontier on a lambda grid instead of one point")
+    ap.add_argument("--values", default=None, help="comma-separated lambdas for --sweep")
+    ap.add_argument("--n", type=int, default=200, help="--sweep grid size without --values: lambdas at quantiles of the breakpoints")
+    add_results_arg(ap)
+    a = ap.parse_args()
+
+    names = ["base"] + [t[0] for t in a.tier]
+    if len(set(names)) != len(names): ap.error("tier names must be distinct and not 'base'")
+    models = [joblib.load(t[2]) for t in a.tier]; clfs = [(unwrap_clf(m), model_mask(m)) for m in models]
+    def featurize(recs):
+        X = voc_features(recs)
+        return np.column_stack([np.zeros(len(recs))] + [pos_probs(clf, X * mask) for clf, mask in clfs])
+    t0 = time.time()
+    G, S, C = tier_arrays(a.base_scored, {t[0]: t[1] for t in a.tier}, a.task, featurize)
+    G = G.reshape(-1, len(names)) * a.gain_scale
+    start, lam, row, frm, to = tier_events(G, C)
+    curve = TierCurve(S, C, start, row, frm, to); N = len(S); t1 = time.time()
+    mixfmt = lambda m: ",".join(f"{n}:{int(c)}" for n, c in zip(names, m))
+    save = lambda tag, kind, pts, **params: record(a.results, "gate_tiers.py", "tiers", a.task,
+        [(x, q, t, N - int(m[0]), {"mix": {n: int(c) for n, c in zip(names, m)}}) for x, q, t, m in pts], tag=tag, kind=kind, n=N,
+        params=dict(params, gain_scale=a.gain_scale, tiers=names), models={n: t[2] for n, t in zip(names[1:], a.tier)},
+        inputs=[a.base_scored] + [t[1] for t in a.tier], endpoints=(float(S[:, 0].mean()), None, None) if N else None)
+
+    if a.sweep:
+        if a.values: xs = grid(a.values, 0, 0, 0)
+        else: xs = np.unique(np.concatenate([[0.0], np.quantile(lam, np.linspace(0, 1, a.n)) if len(lam) else []]))
+        k = len(lam) - np.searchsorted(lam[::-1], xs, side="left")
+        Q, T, M = curve.at(k); save("gate-tiers", "sweep", zip(xs.tolist(), Q.tolist(), T.tolist(), M))
+        print("\n".join(f"[gate-tiers] N={N} avg_quality={q:.3f} total_tokens={t:.1f} lambda={x:g} gain_scale={a.gain_scale} mix={mixfmt(m)}"
+                        for x, q, t, m in zip(xs.tolist(), Q.tolist(), T.tolist(), M)))
+        print(f"[sweep] method=tiers tiers={','.join(names)} points={len(xs)} breakpoints={len(lam)} load_s={t1-t0:.3f} sweep_s={time.time()-t1:.4f}")
+        return
+    if a.budget_tokens is not None:
+        k = int(np.searchsorted(curve.t0 + curve.dt, a.budget_tokens, side="right")) - 1
+        k = max(k, 0); x = float(lam[k-1]) if k else float("inf"); tag = "gate-tiers-budget"
+    else:
+        x = a.lambda_; k = len(lam) - int(np.searchsorted(lam[::-1], x, side="left")); tag = "gate-tiers"
+    q, t, m = curve.at(k); choice = tier_choice(start, row, to, k)
+    save(tag, "point", [(x, q, t, m)], lambda_=a.lambda_, budget_tokens=a.budget_tokens)
+    if a.out_jsonl:
+        src = tier_join(a.base_scored, {t[0]: t[1] for t in a.tier}, JoinStats())
+        with open(a.out_jsonl, "w", encoding="utf-8") as out:
+            for (b, _), c in zip(src, choice.tolist()):
+                b["chosen"] = names[c]; out.write(json.dumps(b, ensure_ascii=False) + "\n")
+    limit = f" budget_tokens={a.budget_tokens:g}" if a.budget_tokens is not None else ""
+    print(f"[{tag}] N={N} avg_quality={q:.3f} total_tokens={t:.1f} lambda={x:g}{limit} gain_scale={a.gain_scale} mix={mixfmt(m)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Join base/heavy scored JSONL files on id without holding either file in a dict.
+
+pairs() yields (base_row, heavy_row) lazily in base-file order, parsing each line once:
+  how="index"  scan the heavy file once into a compact index (8-byte id hash + 8-byte offset
+               per row, sorted for searchsorted) and seek to each match; any row order works.
+  how="merge"  stream two files that are both sorted by id, holding one row of each.
+Ids found on only one side are tallied in JoinStats and reported, not raised as KeyError.
+A repeated id keeps its last row on either side, as the dicts the joins replaced did; the
+dropped rows are tallied as duplicates.
+tier_join() is the index join against several tier files at once (multi-tier gating).
+"""
+import json, re, sys, hashlib, itertools
+from array import array
+import numpy as np
+
+ID_RX = re.compile(rb'^\{"id": "([^"\\]*)"')
+
+def line_id(line):
+    """Row id from a raw JSONL line; skips the full parse when "id" is the first key."""
+    m = ID_RX.match(line)
+    return m.group(1).decode("utf-8") if m else json.loads(line)["id"]
+
+def id_hash(i):
+    return int.from_bytes(hashlib.blake2b(str(i).encode("utf-8"), digest_size=8).digest(), "little")
+
+def rows(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for l in f:
+            if l.strip(): yield json.loads(l)
+
+class JoinStats:
+    def __init__(self, examples=5):
+        self.pairs = 0; self.missing = {"heavy": 0, "base": 0}; self.examples = {"heavy": [], "base": []}; self.limit = examples
+        self.dups = {}
+
+    def miss(self, side, i):
+        """Record id `i` as absent from `side` (heavy, base or a tier name)."""
+        self.missing[side] = self.missing.get(side, 0) + 1; ex = self.examples.setdefault(side, [])
+        if len(ex) < self.limit: ex.append(i)
+
+    def dup(self, side, n=1):
+        """Record `n` rows of `side` dropped because a later row has the same id."""
+        if n: self.dups[side] = self.dups.get(side, 0) + n
+
+    def report(self, file=sys.stdout):
+        if not any(self.missing.values()) and not self.dups: return
+        print(f"[join] pairs={self.pairs} " + " ".join(f"missing_in_{s}={n}" for s, n in self.missing.items())
+              + "".join(f" duplicate_in_{s}={n}" for s, n in self.dups.items()) + " e.g. "
+              + " ".join(f"{s}:{self.examples[s]}" for s in self.missing), file=file)
+
+class OffsetIndex:
+    """id -> byte offset of its line, 16 bytes per row; the last occurrence of a duplicate id wins.
+
+    Earlier rows of a duplicate id are dropped from the index (counted in `dups`), and `last`
+    maps each such id to the offset of the row kept for it.
+    """
+    def __init__(self, path):
+        hs = array("Q"); offs = array("q"); pos = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip(): hs.append(id_hash(line_id(line))); offs.append(pos)
+                pos += len(line)
+        h = np.frombuffer(hs, dtype=np.uint64); order = np.argsort(h, kind="stable")
+        self.h = h[order]; self.off = np.frombuffer(offs, dtype=np.int64)[order]; self.f = open(path, "rb")
+        self.last = {}; self.dups = 0
+        same = np.flatnonzero(self.h[1:] == self.h[:-1])
+        if len(same):  # equal hashes: duplicate ids (or a collision); runs are in file order
+            keep = np.ones(len(self.h), dtype=bool); seen = {}
+            for k in np.union1d(same, same + 1).tolist():
+                self.f.seek(int(self.off[k])); i = line_id(self.f.readline())
+                if i in seen: keep[seen[i]] = False; self.last[i] = int(self.off[k])
+                seen[i] = k
+            self.dups = int((~keep).sum()); self.h = self.h[keep]; self.off = self.off[keep]
+        self.used = np.zeros(len(self.h), dtype=bool)
+
+    def __len__(self):
+        return len(self.h)
+
+    def get(self, i):
+        hv = id_hash(i); k = int(np.searchsorted(self.h, np.uint64(hv), side="right")) - 1
+        while k >= 0 and int(self.h[k]) == hv:  # walk back over hash collisions
+            self.f.seek(int(self.off[k])); r = json.loads(self.f.readline())
+            if r["id"] == i:
+                self.used[k] = True; return r
+            k -= 1
+        return None
+
+    def unused(self):
+        """Ids of rows never returned by get(), in file order."""
+        for off in np.sort(self.off[~self.used]).tolist():
+            self.f.seek(off); yield line_id(self.f.readline())
+
+    def close(self):
+        self.f.close()
+
+def base_rows(path, stats):
+    """rows(path) with one row per id, as a dict keyed by id would hold them: at the position of
+    the id's first row, with the contents of its last. Dropped rows are counted as duplicate_in_base."""
+    idx = OffsetIndex(path)
+    try:
+        stats.dup("base", idx.dups)
+        if not idx.last:
+            yield from rows(path); return
+        done = set()
+        for b in rows(path):
+            i = b["id"]
+            if i not in idx.last: yield b
+            elif i not in done:
+                done.add(i); idx.f.seek(idx.last[i]); yield json.loads(idx.f.readline())
+    finally:
+        idx.close()
+
+def index_join(base_path, heavy_path, stats):
+    idx = OffsetIndex(heavy_path)
+    try:
+        stats.dup("heavy", idx.dups)
+        for b in base_rows(base_path, stats):
+            h = idx.get(b["id"])
+            if h is None: stats.miss("heavy", b["id"]); continue
+            stats.pairs += 1; yield b, h
+        for i in idx.unused(): stats.miss("base", i)
+    finally:
+        idx.close()
+
+def tier_join(base_path, tier_paths, stats=None):
+    """Yield (base_row, [row of each tier file]) for ids present in the base and every tier file.
+
+    Each tier file gets its own OffsetIndex, so this is the index join with K right-hand sides;
+    ids missing from tier k are tallied as missing_in_<k> and ids only in a tier file as missing_in_base.
+    """
+    own = stats is None; stats = JoinStats() if own else stats
+    idx = {name: OffsetIndex(path) for name, path in tier_paths.items()}
+    try:
+        for name, ix in idx.items(): stats.dup(name, ix.dups)
+        for b in base_rows(base_path, stats):
+            got = [(name, ix.get(b["id"])) for name, ix in idx.items()]
+            lost = [name for name, h in got if h is None]
+            if lost:
+                for name in lost: stats.miss(name, b["id"])
+                continue
+            stats.pairs += 1; yield b, [h for _, h in got]
+        for ix in idx.values():
+            for i in ix.unused(): stats.miss("base", i)
+    finally:
+        for ix in idx.values(): ix.close()
+    if own: stats.report()
+
+def _sorted_lines(f, path, stats, side):
+    """(id, line) per id of a file sorted by id; of a run of equal ids the last line is kept and
+    the others counted as duplicate_in_<side>."""
+    prev = None; held = None
+    for n, line in enumerate(f, 1):
+        if not line.strip(): continue
+        i = line_id(line)
+        if prev is not None and i < prev:
+            raise ValueError(f"{path}:{n} id {i!r} < {prev!r}: not sorted by id, use the index join")
+        if i == prev: stats.dup(side)
+        elif held is not None: yield held
+        prev = i; held = (i, line)
+    if held is not None: yield held
+
+def merge_join(base_path, heavy_path, stats):
+    with open(base_path, "rb") as fb, open(heavy_path, "rb") as fh:
+        hs = _sorted_lines(fh, heavy_path, stats, "heavy"); h = next(hs, None)
+        for bid, bline in _sorted_lines(fb, base_path, stats, "base"):
+            while h is not None and h[0] < bid:
+                stats.miss("base", h[0]); h = next(hs, None)
+            if h is not None and h[0] == bid:
+                stats.pairs += 1; yield json.loads(bline), json.loads(h[1]); h = next(hs, None)
+            else:
+                stats.miss("heavy", bid)
+        while h is not None:
+            stats.miss("base", h[0]); h = next(hs, None)
+
+def pairs(base_path, heavy_path, how="index", stats=None):
+    """Yield (base_row, heavy_row) for ids present in both files; see the module docstring.
+
+    Without a `stats` object, missing ids are reported once the join is exhausted.
+    """
+    own = stats is None; stats = JoinStats() if own else stats
+    yield from (merge_join if how == "merge" else index_join)(base_path, heavy_path, stats)
+    if own: stats.report()
+
+def add_join_arg(ap):
+    ap.add_argument("--join", choices=["index","merge"], default="index",
+                    help="index: any row order; merge: both files sorted by id, constant memory")
+
+def warn_estimated(n, tier="heavy", file=sys.stderr):
+    """Warn that `n` rows priced from cost_<tier> carry cost_estimated_<tier> (a streamed call
+    stopped before the server sent usage; call_openrouter.py --stream), so their tokens are a guess."""
+    if n: print(f"[warn] {n} rows have an estimated cost_{tier} (stream stopped before usage); token totals include the estimates", file=file)
+
+def score_key(task):
+    return "f1" if task == "qa" else "rougeL"
+
+def scored_arrays(base_path, heavy_path, task, featurize=None, how="index", chunk=16384, stats=None):
+    """One pass over the joined files -> (F, sb, sh, cost) arrays in base-file order.
+
+    featurize(list of base rows) -> array is applied per chunk and concatenated into F (None
+    without it), so only `chunk` rows are ever held at once.
+    """
+    key = score_key(task); it = pairs(base_path, heavy_path, how, stats); F = []; sb = []; sh = []; cost = []; est = 0
+    while True:
+        c = list(itertools.islice(it, chunk))
+        if not c: break
+        if featurize is not None: F.append(featurize([b for b, _ in c]))
+        sb.extend(b.get("score_base",{}).get(key,0.0) for b, _ in c)
+        sh.extend(h.get("score_heavy",{}).get(key,0.0) for _, h in c)
+        cost.extend(float(h.get("cost_heavy",0.0) or 0.0) for _, h in c); est += sum(bool(h.get("cost_estimated_heavy")) for _, h in c)
+    warn_estimated(est)
+    F = (np.concatenate(F) if F else np.zeros(0)) if featurize is not None else None
+    return F, np.array(sb, dtype=float), np.array(sh, dtype=float), np.array(cost, dtype=float)
+
+def tier_arrays(base_path, tier_paths, task, featurize=None, chunk=16384, stats=None):
+    """scored_arrays for K tiers -> (F, S, C): S[:, 0] is score_base and S[:, k] score_<tier k>,
+    C[:, k] cost_<tier k> with C[:, 0] = 0 (the base call is not counted, as in the binary gate)."""
+    key = score_key(task); names = list(tier_paths); it = tier_join(base_path, tier_paths, stats); F = []; S = []; C = []
+    est = dict.fromkeys(names, 0)
+    while True:
+        c = list(itertools.islice(it, chunk))
+        if not c: break
+        if featurize is not None: F.append(featurize([b for b, _ in c]))
+        S.extend([b.get("score_base",{}).get(key,0.0)] + [h.get(f"score_{n}",{}).get(key,0.0) for n, h in zip(names, hs)] for b, hs in c)
+        C.extend([0.0] + [float(h.get(f"cost_{n}",0.0) or 0.0) for n, h in zip(names, hs)] for _, hs in c)
+        for _, hs in c:
+            for n, h in zip(names, hs): est[n] += bool(h.get(f"cost_estimated_{n}"))
+    for n in names: warn_estimated(est[n], n)
+    F = (np.concatenate(F) if F else np.zeros(0)) if featurize is not None else None
+    K = len(names) + 1
+    return F, np.array(S, dtype=float).reshape(-1, K), np.array(C, dtype=float).reshape(-1, K)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Content-addressed on-disk cache for chat-completion responses (sqlite, stdlib only).
+
+Keys are sha256 over the canonical JSON of the request payload (model, messages and
+decoding params), so any change to the prompt text or max_tokens is a new entry.
+"""
+import json, hashlib, sqlite3, threading, time, pathlib
+
+class CacheMiss(RuntimeError):
+    pass
+
+class ResponseCache:
+    def __init__(self, path, max_mb=512.0, offline=False):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path); self.max_bytes = int(max_mb * 1024 * 1024); self.offline = offline
+        self.hits = 0; self.misses = 0; self.evicted = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                        " size INTEGER NOT NULL, atime REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_atime ON responses(atime)")
+        self.total = self.db.execute("SELECT COALESCE(SUM(size),0) FROM responses").fetchone()[0]
+        if self.total > self.max_bytes:
+            self._evict(int(self.max_bytes * 0.9))
+
+    @staticmethod
+    def key(payload):
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return (msg, usage, native) or None; in offline mode a miss raises CacheMiss."""
+        with self.lock:
+            row = self.db.execute("SELECT value FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.offline:
+                    raise CacheMiss(f"cache miss for {key[:12]} (cache-only mode)")
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE responses SET atime=? WHERE key=?", (time.time(), key))
+        v = json.loads(row[0])
+        return v["msg"], v["usage"], v["native_tokens"]
+
+    def put(self, key, msg, usage, native):
+        value = json.dumps({"msg": msg, "usage": usage, "native_tokens": native}, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            old = self.db.execute("SELECT size FROM responses WHERE key=?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO responses(key,value,size,atime) VALUES(?,?,?,?)",
+                            (key, value, size, time.time()))
+            self.total += size - (old[0] if old else 0)
+            if self.total > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _evict(self, target):
+        """Drop least-recently-used entries until the cache is at most `target` bytes."""
+        while self.total > target:
+            rows = self.db.execute("SELECT key,size FROM responses ORDER BY atime LIMIT 256").fetchall()
+            if not rows:
+                self.total = 0; break
+            drop = []
+            for k, s in rows:
+                drop.append((k,)); self.total -= s
+                if self.total <= target: break
+            self.db.executemany("DELETE FROM responses WHERE key=?", drop)
+            self.evicted += len(drop)
+
+    def stats(self):
+        n = self.hits + self.misses
+        return (f"[cache] hits={self.hits} misses={self.misses} hit_rate={self.hits/max(n,1):.3f} "
+                f"evicted={self.evicted} size_mb={self.total/1048576:.1f} path={self.path}")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
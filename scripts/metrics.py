@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Opt-in counters, latency histograms and timing spans for the scripts and the LLM client.
+
+Nothing is recorded until enable() runs (scripts call it from --metrics / --metrics_port, see
+add_metrics_args). Until then span() hands back one shared no-op context manager and inc() /
+observe() return at once, so an instrumented hot path costs a global lookup and a call.
+Enabled, the registry is written as JSON at exit (and every `every` seconds for long runs)
+and/or served in the Prometheus text format at http://host:port/metrics.
+
+    with metrics.span("probe"): P = probe(texts, langs)          # -> probe_seconds histogram
+    metrics.inc("llm_tokens_total", usage["prompt_tokens"], kind="prompt")
+    python scripts/call_openrouter.py ... --metrics exp/metrics/qa_en.base.json --metrics_port 9100
+
+Worker processes return drain() with their results and the parent merge()s it (score.py).
+"""
+import atexit, bisect, functools, json, os, sys, threading, time
+
+BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)  # seconds; one more bucket for +Inf
+ENABLED = False
+_LOCK = threading.Lock()
+_COUNTERS = {}  # (name, labels) -> value
+_HISTS = {}     # (name, labels) -> [bucket counts, sum, count]
+_STARTED = time.time()
+
+class _Noop:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+NOOP = _Noop()
+
+class _Span:
+    __slots__ = ("key", "t0")
+    def __init__(self, key): self.key = key
+    def __enter__(self):
+        self.t0 = time.perf_counter(); return self
+    def __exit__(self, *exc):
+        _observe(self.key, time.perf_counter() - self.t0); return False
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+def _observe(key, v):
+    i = bisect.bisect_left(BUCKETS, v)
+    with _LOCK:
+        h = _HISTS.get(key)
+        if h is None: h = _HISTS[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        h[0][i] += 1; h[1] += v; h[2] += 1
+
+def span(name, **labels):
+    """Context manager adding the block's wall time to the <name>_seconds histogram."""
+    if not ENABLED: return NOOP
+    return _Span(_key(name + "_seconds", labels))
+
+def timed(name, **labels):
+    """Decorator form of span(); the enabled check happens per call."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kw):
+            if not ENABLED: return fn(*args, **kw)
+            with _Span(_key(name + "_seconds", labels)): return fn(*args, **kw)
+        return inner
+    return wrap
+
+def inc(name, v=1.0, **labels):
+    if not ENABLED: return
+    k = _key(name, labels)
+    with _LOCK: _COUNTERS[k] = _COUNTERS.get(k, 0.0) + v
+
+def observe(name, v, **labels):
+    if ENABLED: _observe(_key(name, labels), v)
+
+def drain():
+    """(counters, histograms) recorded so far, clearing them; picklable for worker processes."""
+    global _COUNTERS, _HISTS
+    with _LOCK:
+        out = (_COUNTERS, _HISTS); _COUNTERS = {}; _HISTS = {}
+    return out
+
+def merge(snap):
+    counters, hists = snap
+    with _LOCK:
+        for k, v in counters.items(): _COUNTERS[k] = _COUNTERS.get(k, 0.0) + v
+        for k, (b, s, n) in hists.items():
+            h = _HISTS.setdefault(k, [[0] * (len(BUCKETS) + 1), 0.0, 0])
+            h[0] = [x + y for x, y in zip(h[0], b)]; h[1] += s; h[2] += n
+
+def quantile(buckets, q):
+    """Bucket-interpolated q-quantile of a histogram (the last finite bound for the +Inf bucket)."""
+    n = sum(buckets)
+    if not n: return None
+    rank = q * n; acc = 0
+    for i, c in enumerate(buckets):
+        if c and acc + c >= rank:
+            if i == len(BUCKETS): return BUCKETS[-1]
+            lo = BUCKETS[i - 1] if i else 0.0
+            return lo + (BUCKETS[i] - lo) * (rank - acc) / c
+        acc += c
+    return BUCKETS[-1]
+
+def _series(key):
+    name, labels = key
+    return name + ("{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else "")
+
+def snapshot():
+    """JSON-ready view of the registry: counters, and per histogram count/sum/mean/p50/p95/p99."""
+    with _LOCK:
+        counters = dict(_COUNTERS); hists = {k: (list(b), s, n) for k, (b, s, n) in _HISTS.items()}
+    H = {}
+    for k, (b, s, n) in sorted(hists.items()):
+        H[_series(k)] = {"count": n, "sum": s, "mean": s / max(n, 1), "p50": quantile(b, .5), "p95": quantile(b, .95),
+                         "p99": quantile(b, .99), "buckets": b}
+    return {"argv": sys.argv, "pid": os.getpid(), "started": _STARTED, "wall_s": time.time() - _STARTED,
+            "bucket_bounds": list(BUCKETS), "counters": {_series(k): v for k, v in sorted(counters.items())}, "histograms": H}
+
+def write(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f: json.dump(snapshot(), f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def prometheus_text():
+    with _LOCK:
+        counters = dict(_COUNTERS); hists = {k: (list(b), s, n) for k, (b, s, n) in _HISTS.items()}
+    out = []; typed = set()
+    for k, v in sorted(counters.items()):
+        if k[0] not in typed: typed.add(k[0]); out.append(f"# TYPE {k[0]} counter")
+        out.append(f"{_series(k)} {v:g}")
+    for (name, labels), (b, s, n) in sorted(hists.items()):
+        if name not in typed: typed.add(name); out.append(f"# TYPE {name} histogram")
+        acc = 0
+        for le, c in zip([f"{x:g}" for x in BUCKETS] + ["+Inf"], b):
+            acc += c; out.append(f"{_series((name + '_bucket', labels + (('le', le),)))} {acc}")
+        out.append(f"{_series((name + '_sum', labels))} {s:.9g}"); out.append(f"{_series((name + '_count', labels))} {n}")
+    return "\n".join(out) + "\n"
+
+def serve(port, host="127.0.0.1"):
+    """Prometheus text at http://host:port/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_response(404); self.end_headers(); return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+    srv = ThreadingHTTPServer((host, port), Handler); srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def enable(path=None, port=None, host="127.0.0.1", every=30.0):
+    """Start recording; write `path` at exit and every `every` seconds, serve on `port` if given."""
+    global ENABLED
+    ENABLED = True
+    if path:
+        atexit.register(write, path)
+        if every:
+            def flush():
+                while True:
+                    time.sleep(every); write(path)
+            threading.Thread(target=flush, daemon=True).start()
+    if port is not None:
+        serve(port, host); print(f"[metrics] serving http://{host}:{port}/metrics", file=sys.stderr, flush=True)
+
+def add_metrics_args(ap):
+    ap.add_argument("--metrics", default=None, help="write counters/latency histograms to this JSON file (see metrics.py)")
+    ap.add_argument("--metrics_port", type=int, default=None, help="serve them in the Prometheus text format on this port")
+
+def from_args(a):
+    if a.metrics or a.metrics_port is not None: enable(a.metrics, a.metrics_port)
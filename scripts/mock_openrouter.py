@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenRouter chat-completions endpoint, for offline benchmarking.
+
+    python scripts/mock_openrouter.py --port 8089 --latency 0.2 &
+    OPENROUTER_URL=http://127.0.0.1:8089/api/v1/chat/completions OPENROUTER_API_KEY=mock \\
+        python scripts/call_openrouter.py --in_jsonl ... --out_jsonl ... --mode base --concurrency 16
+"""
+import json, argparse, hashlib, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def reply_text(messages, malformed=False, think=0, tail=0):
+    """Mock completion: `think` words of reasoning on a line before the answer line and `tail`
+    words of explanation after it (both only when the request allows >= 96 tokens, like heavy)."""
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    m = re.search(r"^(?:Question|Input):\s*(.*)$", user, flags=re.M)
+    answer = m.group(1).strip() if m else "mock"
+    text = ("I think it is " + answer) if malformed else ("FINAL: " + answer)
+    if think: text = " ".join(["hmm"] * think) + "\n" + text
+    if tail: text += "\n" + " ".join(["because"] * tail)
+    return text
+
+def packed_reply(user, malformed_rate=0.0):
+    """Numbered FINAL: lines for a packed prompt; each item is malformed with malformed_rate."""
+    items = re.findall(r"^(\d+)\.\s*(.*)$", user.split("Questions:", 1)[1], flags=re.M)
+    bad = lambda q: int(hashlib.sha1(q.encode("utf-8")).hexdigest()[:8], 16) / 2**32 < malformed_rate
+    return "\n".join(f"{k}. " + (f"I think it is {q}" if bad(q) else f"FINAL: {q}") for k, q in items)
+
+def truncate(text, req):
+    """Cut at the first of the request's stop strings, as the API does."""
+    for st in req.get("stop") or []:
+        if st in text: text = text[:text.index(st)]
+    return text
+
+def unit(req):
+    """Deterministic pseudo-random number in [0,1) for a request payload."""
+    blob = json.dumps([req.get("messages"), req.get("max_tokens")], sort_keys=True).encode("utf-8")
+    return int(hashlib.sha1(blob).hexdigest()[:8], 16) / 2**32
+
+def ntok(s):
+    return max(1, len(s.split()))
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can pool connections
+    disable_nagle_algorithm = True
+    latency = 0.0; jitter = 0.0; per_token = 0.0; error_rate = 0.0; malformed_rate = 0.0
+    token_latency = 0.0; think_words = 0; tail_words = 0
+    quota = None; window = []; lock = threading.Lock()  # server-side requests/s quota -> 429s
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, code, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def over_quota(self):
+        if not self.quota:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.window[:] = [t for t in self.window if now - t < 1.0]
+            if len(self.window) >= self.quota:
+                return True
+            self.window.append(now)
+        return False
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.over_quota():
+            body = b'{"error":{"code":429,"message":"rate limited"}}'
+            self.send_response(429); self.send_header("Retry-After", "1")
+            self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body); return
+        if random.random() < self.error_rate:
+            return self.send_json(502, {"error": {"code": 502, "message": "mock upstream error"}})
+        time.sleep(max(0.0, self.latency + self.per_token * req.get("max_tokens", 0)
+                           + random.uniform(-self.jitter, self.jitter)))
+        messages = req.get("messages", [])
+        long = req.get("max_tokens", 0) >= 96
+        user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        if user.startswith("Questions:"):
+            text = truncate(packed_reply(user, self.malformed_rate), req)
+        else:
+            text = truncate(reply_text(messages, malformed=unit(req) < self.malformed_rate,
+                                       think=self.think_words if long else 0, tail=self.tail_words if long else 0), req)
+        pt = sum(ntok(m.get("content", "")) for m in messages)
+        if req.get("stream"):
+            return self.send_stream(text, pt, (req.get("stream_options") or {}).get("include_usage"))
+        time.sleep(self.token_latency * ntok(text)); ct = ntok(text)
+        self.send_json(200, {
+            "id": "mock", "model": req.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": pt + ct},
+        })
+
+    def send_stream(self, text, pt, usage=False):
+        """SSE in chunked transfer encoding, one word per event, usage on the last event when the
+        request set stream_options.include_usage; a client hanging up mid-stream ends the response."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        def event(obj):
+            data = b"data: " + (obj if isinstance(obj, bytes) else json.dumps(obj).encode("utf-8")) + b"\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data)); self.wfile.flush()
+        words = re.findall(r"\S+\s*|\s+", text) or [""]
+        try:
+            self.wfile.write(b"d\r\n: PROCESSING\n\r\n")  # keep-alive comment, as OpenRouter sends
+            for w in words:
+                time.sleep(self.token_latency)
+                event({"id": "mock", "choices": [{"index": 0, "delta": {"content": w}, "finish_reason": None}]})
+            ct = ntok(text); last = {"id": "mock", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            if usage: last["usage"] = {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": pt + ct}
+            event(last)
+            event(b"[DONE]"); self.wfile.write(b"0\r\n\r\n"); self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds per completion")
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--per_token", type=float, default=0.0, help="extra seconds per requested max_tokens")
+    ap.add_argument("--token_latency", type=float, default=0.0, help="seconds per generated word (streamed or not)")
+    ap.add_argument("--think_words", type=int, default=0, help="heavy replies start with a reasoning line of this many words")
+    ap.add_argument("--tail_words", type=int, default=0, help="heavy replies add an explanation line of this many words after FINAL:")
+    ap.add_argument("--malformed_rate", type=float, default=0.0, help="fraction of prompts (items of packed prompts) answered without FINAL:")
+    ap.add_argument("--quota_rps", type=float, default=None, help="answer 429 + Retry-After above this rate")
+    ap.add_argument("--error_rate", type=float, default=0.0, help="fraction of requests answered with 502")
+    a = ap.parse_args()
+    Handler.latency = a.latency; Handler.jitter = a.jitter
+    Handler.quota = a.quota_rps; Handler.error_rate = a.error_rate
+    Handler.per_token = a.per_token; Handler.malformed_rate = a.malformed_rate
+    Handler.token_latency = a.token_latency; Handler.think_words = a.think_words; Handler.tail_words = a.tail_words
+    srv = ThreadingHTTPServer((a.host, a.port), Handler); srv.daemon_threads = True
+    print(f"[mock] serving http://{a.host}:{a.port}/api/v1/chat/completions latency={a.latency}", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
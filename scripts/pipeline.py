@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Rebuild exp/logs, exp/reports and the figures, re-running only what is stale.
+
+Each stage names its input files, output files and command. The DAG comes from matching one
+stage's outputs to another's inputs. A stage is up to date when the fingerprint of its command,
+selected env vars, code (the script plus the sibling modules it imports) and input file contents
+matches the last successful run and its outputs are unchanged. Stale stages run as soon as
+their upstream stages finish, up to --jobs at once; each one logs to exp/logs/pipeline/<stage>.log.
+
+    python scripts/pipeline.py --dry_run
+    python scripts/pipeline.py --jobs 4 --call_args "--concurrency 16 --cache exp/cache/llm.sqlite"
+    python scripts/pipeline.py --only sweep_pgbi_qa --force score_qa_base
+"""
+import argparse, ast, hashlib, json, os, shlex, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, "scripts")
+PY = sys.executable
+TASKS = ["qa", "instr"]; MODES = ["base", "heavy"]
+ABLATIONS = [("all","all"), ("no_acts","noacts"), ("uncertainty_only","unc"), ("acts_only","acts")]
+LAMBDAS = "0,0.001,0.002,0.005,0.01,0.02"; TAUS = "0.05,0.1,0.15,0.2,0.3"
+
+class Stage:
+    def __init__(self, name, cmds, inputs=(), outputs=(), stdout=None, env=()):
+        self.name = name; self.cmds = [list(map(str, c)) for c in cmds]
+        self.inputs = list(inputs); self.outputs = list(outputs) + ([stdout] if stdout else [])
+        self.stdout = stdout; self.env = list(env)
+
+def py(script, *args):
+    return [PY, f"scripts/{script}", *args]
+
+def stages(a):
+    call = shlex.split(a.call_args or ""); S = []
+    S.append(Stage("labels", [py("merge_and_check.py")],
+                   ["data/acts/label_en.tsv", "data/acts/label_zh.tsv"], ["data/acts/heldout_en.jsonl", "data/acts/heldout_zh.jsonl"]))
+    S.append(Stage("train_probe", [py("train_probe.py")],
+                   ["data/acts/heldout_en.jsonl", "data/acts/heldout_zh.jsonl"], ["models/act_probe.joblib", "exp/reports/probe_report.txt"]))
+    for t in TASKS:
+        L = f"exp/logs/{t}_en"
+        S.append(Stage(f"data_{t}", [py("tsv_to_jsonl.py", "--in_tsv", f"data/tasks/{t}_en.tsv", "--out_jsonl", f"{L}.jsonl", "--task", t)],
+                       [f"data/tasks/{t}_en.tsv"], [f"{L}.jsonl"]))
+        S.append(Stage(f"probe_{t}", [py("run_probe.py", "--in_jsonl", f"{L}.jsonl", "--out_jsonl", f"{L}.probe.jsonl")],
+                       [f"{L}.jsonl", "models/act_probe.joblib"], [f"{L}.probe.jsonl"]))
+        for m in MODES:
+            S.append(Stage(f"call_{t}_{m}", [py("call_openrouter.py", "--in_jsonl", f"{L}.probe.jsonl", "--out_jsonl", f"{L}.{m}.jsonl", "--mode", m, *call)],
+                           [f"{L}.probe.jsonl"], [f"{L}.{m}.jsonl"], env=["OPENROUTER_MODEL", "OPENROUTER_URL"]))
+            S.append(Stage(f"score_{t}_{m}", [py("score.py", "--pred_jsonl", f"{L}.{m}.jsonl", "--out_jsonl", f"{L}.{m}.scored.jsonl",
+                                                 "--gold_jsonl", f"{L}.jsonl", "--modes", m, "--task", t)],
+                           [f"{L}.{m}.jsonl", f"{L}.jsonl"], [f"{L}.{m}.scored.jsonl"]))
+        pair = ["--base_scored", f"{L}.base.scored.jsonl", "--heavy_scored", f"{L}.heavy.scored.jsonl"]
+        S.append(Stage(f"voc_train_{t}", [py("build_voc_train.py", *pair, "--out_train", f"{L}.voc_train.jsonl", "--task", t)],
+                       [f"{L}.base.scored.jsonl", f"{L}.heavy.scored.jsonl"], [f"{L}.voc_train.jsonl"]))
+        S.append(Stage(f"train_voc_{t}", [py("train_voc.py", "--train", f"{L}.voc_train.jsonl", "--out", f"models/voc_{t}.joblib")],
+                       [f"{L}.voc_train.jsonl"], [f"models/voc_{t}.joblib"]))
+        S.append(Stage(f"sweep_pgbi_{t}", [py("sweep_gate.py", "--task", t, *pair, "--voc_model", f"models/voc_{t}.joblib", "--values", LAMBDAS)],
+                       [f"{L}.base.scored.jsonl", f"{L}.heavy.scored.jsonl", f"models/voc_{t}.joblib"], stdout=f"exp/reports/pcurve_pgbi_{t}.txt"))
+        S.append(Stage(f"sweep_margin_{t}", [py("sweep_gate.py", "--task", t, *pair, "--method", "margin", "--values", TAUS)],
+                       [f"{L}.base.scored.jsonl", f"{L}.heavy.scored.jsonl"], stdout=f"exp/reports/pcurve_margin_{t}.txt"))
+    calls = {m: [f"exp/logs/{t}_en.{m}.jsonl" for t in TASKS] for m in MODES}
+    S.append(Stage("train_cost", [py("train_cost.py", "--base", *calls["base"], "--heavy", *calls["heavy"])],
+                   calls["base"] + calls["heavy"], ["models/cost.joblib", "exp/reports/cost_report.txt"]))
+    L = "exp/logs/instr_en"; pair = ["--base_scored", f"{L}.base.scored.jsonl", "--heavy_scored", f"{L}.heavy.scored.jsonl"]
+    models = [f"models/voc_instr_{fs}.joblib" for fs, _ in ABLATIONS]
+    S.append(Stage("train_voc_ablate", [py("train_voc.py", "--train", f"{L}.voc_train.jsonl", "--out", mo, "--feature_set", fs)
+                                        for (fs, _), mo in zip(ABLATIONS, models)], [f"{L}.voc_train.jsonl"], models))
+    S.append(Stage("sweep_ablate", [py("sweep_gate.py", "--task", "instr", *pair, "--voc_model", mo, "--values", LAMBDAS, "--tag", f"gate-{tag}")
+                                    for (_, tag), mo in zip(ABLATIONS, models)],
+                   [f"{L}.base.scored.jsonl", f"{L}.heavy.scored.jsonl", *models], stdout="exp/reports/pcurve_models_instr.txt"))
+    curves = [f"exp/reports/pcurve_{k}_{t}.txt" for k in ("pgbi", "margin") for t in TASKS]
+    logs = [f"exp/logs/{t}_en.{m}.scored.jsonl" for t in TASKS for m in MODES]
+    # summary, tables and plots read exp/results.sqlite, which the sweep stages append to; the curve
+    # reports stay their declared inputs so they run after the sweeps
+    S.append(Stage("summarize", [py("summarize_results.py", "--tables", "paper/tables")], curves + logs,
+                   ["paper/tables/main_results.md", "paper/tables/main_results.tex"], stdout="exp/reports/summary.md"))
+    S.append(Stage("plot_pgbi", [py("plot_budget_curve.py")], curves[:2], ["paper/figs/pcurve_pgbi_qa.png", "paper/figs/pcurve_pgbi_instr.png"]))
+    S.append(Stage("plot_compare", [py("plot_budget_curve_multi.py")], curves, ["paper/figs/pcurve_compare_qa.png", "paper/figs/pcurve_compare_instr.png"]))
+    S.append(Stage("plot_ablate", [py("plot_budget_curve_models.py")], ["exp/reports/pcurve_models_instr.txt"], ["paper/figs/pcurve_voc_ablate_instr.png"]))
+    return S
+
+def local_imports(path, seen=None):
+    """The script plus every sibling module it imports, transitively."""
+    seen = set() if seen is None else seen
+    if path in seen or not os.path.exists(path): return seen
+    seen.add(path)
+    for node in ast.walk(ast.parse(open(path, "rb").read(), path)):
+        names = [n.name for n in node.names] if isinstance(node, ast.Import) else [node.module] if isinstance(node, ast.ImportFrom) and node.module else []
+        for n in names:
+            local_imports(os.path.join(SCRIPTS, n.split(".")[0] + ".py"), seen)
+    return seen
+
+class FileHashes:
+    """sha256 of file contents, re-hashed only when (size, mtime) changes."""
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __call__(self, path):
+        p = os.path.join(ROOT, path)
+        if not os.path.exists(p): return None
+        st = os.stat(p); c = self.cache.get(path)
+        if c and c[0] == st.st_size and c[1] == st.st_mtime_ns: return c[2]
+        h = hashlib.sha256()
+        with open(p, "rb") as f:
+            for b in iter(lambda: f.read(1 << 20), b""): h.update(b)
+        self.cache[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+def fingerprint(stage, fh):
+    code = sorted({os.path.relpath(p, ROOT) for c in stage.cmds if len(c) > 1 and c[1].endswith(".py")
+                   for p in local_imports(os.path.join(ROOT, c[1]))})
+    doc = {"cmds": [c[1:] for c in stage.cmds], "env": {k: os.environ.get(k) for k in stage.env},
+           "code": {p: fh(p) for p in code}, "inputs": {p: fh(p) for p in stage.inputs}}
+    return hashlib.sha256(json.dumps(doc, sort_keys=True).encode()).hexdigest()
+
+def run_stage(stage, log_dir):
+    """Run the stage's commands in order; returns (ok, seconds)."""
+    t0 = time.time(); out = None
+    for p in stage.outputs: os.makedirs(os.path.dirname(os.path.join(ROOT, p)) or ".", exist_ok=True)
+    with open(os.path.join(log_dir, stage.name + ".log"), "w", encoding="utf-8") as log:
+        if stage.stdout: out = open(os.path.join(ROOT, stage.stdout + ".tmp"), "w", encoding="utf-8")
+        try:
+            for c in stage.cmds:
+                log.write("$ " + shlex.join(c) + "\n"); log.flush()
+                rc = subprocess.run(c, cwd=ROOT, stdout=out or log, stderr=log).returncode
+                if rc != 0:
+                    log.write(f"[error] exit {rc}\n"); return False, time.time() - t0
+        finally:
+            if out: out.close()
+    if stage.stdout: os.replace(os.path.join(ROOT, stage.stdout + ".tmp"), os.path.join(ROOT, stage.stdout))
+    return True, time.time() - t0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="stages run at once")
+    ap.add_argument("--only", default=None, help="comma-separated stages to bring up to date (plus their upstream)")
+    ap.add_argument("--force", default=None, help="comma-separated stages to re-run even if fresh")
+    ap.add_argument("--call_args", default="", help="extra call_openrouter.py flags (part of the call stages' fingerprint)")
+    ap.add_argument("--state", default="exp/.pipeline_state.json")
+    ap.add_argument("--dry_run", action="store_true", help="print what would run and why")
+    ap.add_argument("--list", action="store_true", help="print the stages and their inputs/outputs")
+    a = ap.parse_args()
+
+    S = stages(a); by = {s.name: s for s in S}
+    producer = {o: s.name for s in S for o in s.outputs}
+    deps = {s.name: sorted({producer[i] for i in s.inputs if i in producer}) for s in S}
+    if a.list:
+        for s in S: print(f"{s.name}\n  deps: {' '.join(deps[s.name]) or '-'}\n  in:   {' '.join(s.inputs)}\n  out:  {' '.join(s.outputs)}")
+        return
+    force = set(a.force.split(",")) if a.force else set()
+    want = set(by) if not a.only else set()
+    todo = list(a.only.split(",")) if a.only else []
+    while todo:
+        n = todo.pop()
+        if n not in by: raise SystemExit(f"[error] unknown stage {n!r}; see --list")
+        if n not in want: want.add(n); todo.extend(deps[n])
+    for n in force - set(by): raise SystemExit(f"[error] unknown stage {n!r}; see --list")
+
+    state_path = os.path.join(ROOT, a.state)
+    state = json.load(open(state_path, encoding="utf-8")) if os.path.exists(state_path) else {}
+    fh = FileHashes(state.setdefault("files", {})); done = state.setdefault("stages", {})
+    log_dir = os.path.join(ROOT, "exp/logs/pipeline"); os.makedirs(log_dir, exist_ok=True)
+
+    def save():
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        with open(state_path + ".tmp", "w", encoding="utf-8") as f: json.dump(state, f, indent=1)
+        os.replace(state_path + ".tmp", state_path)
+
+    def why_stale(s):
+        """None when `s` is up to date, else the reason it must run."""
+        missing = [i for i in s.inputs if fh(i) is None]
+        if missing:  # e.g. unlabeled checkout: keep whatever outputs are already there
+            return None if all(fh(o) for o in s.outputs) else f"missing input {missing[0]}"
+        if s.name in force: return "forced"
+        prev = done.get(s.name)
+        if not prev: return "never run"
+        if prev["fp"] != fingerprint(s, fh): return "inputs, code or params changed"
+        for o in s.outputs:
+            if fh(o) != prev["outputs"].get(o): return f"output {o} missing or modified"
+        return None
+
+    order = [s.name for s in S if s.name in want]
+    status = {}; secs = {}; ran = set(); t0 = time.time()
+    if a.dry_run:
+        for n in order:
+            upstream = [d for d in deps[n] if d in ran]
+            r = why_stale(by[n])
+            if r and r.startswith("missing input") and not upstream:
+                print(f"[plan] {n:<20} cannot run: {r}"); continue
+            if r or upstream: ran.add(n)
+            # downstream of a rerun stage only reruns if that stage's outputs actually change
+            print(f"[plan] {n:<20} " + (f"run: {r}" if r and not r.startswith("missing input") else
+                                        f"maybe: after {upstream[0]}" if upstream else "fresh"))
+        return
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max(a.jobs, 1)) as ex:
+        while len(status) < len(order):
+            for n in order:
+                if n in status or n in pending.values(): continue
+                if not all(d in status for d in deps[n]): continue
+                s = by[n]; r = why_stale(s)
+                if r is None:
+                    status[n] = "fresh" if done.get(n) else "kept"; continue
+                if any(status[d] in ("failed", "blocked", "missing") for d in deps[n]):
+                    status[n] = "blocked"; continue
+                if r.startswith("missing input"):
+                    print(f"[stage] {n} skipped: {r}"); status[n] = "missing"; continue
+                print(f"[stage] {n} start ({r})", flush=True)
+                pending[ex.submit(run_stage, s, log_dir)] = n
+            if not pending: continue
+            fin, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for f in fin:
+                n = pending.pop(f); ok, dt = f.result(); secs[n] = dt; s = by[n]
+                if ok:
+                    status[n] = "ran"; ran.add(n)
+                    done[n] = {"fp": fingerprint(s, fh), "outputs": {o: fh(o) for o in s.outputs}, "secs": round(dt, 3)}
+                else:
+                    status[n] = "failed"; done.pop(n, None)
+                save()
+                print(f"[stage] {n} {status[n]} secs={dt:.1f}" + ("" if ok else f" (see exp/logs/pipeline/{n}.log)"), flush=True)
+    save()
+    for n in order:
+        print(f"[time] {n:<20} {status[n]:<8} secs={secs.get(n, 0.0):.2f}")
+    c = {k: sum(v == k for v in status.values()) for k in ("ran", "fresh", "kept", "missing", "failed", "blocked")}
+    print(f"[ok] pipeline stages={len(order)} " + " ".join(f"{k}={v}" for k, v in c.items()) +
+          f" stage_s={sum(secs.values()):.1f} wall_s={time.time()-t0:.1f}")
+    if c["failed"] or c["blocked"]: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
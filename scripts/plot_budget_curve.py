@@ -1,23 +1,26 @@
 #!/usr/bin/env python3
-import re, matplotlib.pyplot as plt
+import argparse, matplotlib.pyplot as plt
+from results_store import ResultsStore, add_reader_args, input_roots
 
-def load_points(path):
-    T,Q,L=[],[],[]
-    for line in open(path,"r",encoding="utf-8"):
-        if line.startswith("[gate]"):
-            m = re.search(r"avg_quality=([0-9.]+).*total_tokens=([0-9.]+).*lambda=([0-9.]+)", line)
-            if m:
-                q,t,l = map(float, m.groups())
-                T.append(t); Q.append(q); L.append(l)
-    pts = sorted(zip(T,Q,L))
-    return [p[0] for p in pts], [p[1] for p in pts], [p[2] for p in pts]
+MAX_LABELS = 30  # annotate points with lambda only on short curves
 
-def plot_one(txt_path, png_path, title):
-    x,y,l = load_points(txt_path)
+def load_points(store, task, method="pgbi", tag=None, under=None):
+    """(tokens, quality, lambda) of the latest sweep for a task (else its gate_blend point runs), sorted by tokens."""
+    L, Q, T = store.curve(task, method, tag, under)
+    return T, Q, L
+
+def missing(store, task, what, under):
+    return (f"[error] no {what} sweep or point runs for {task} in {store.path} on unchanged inputs under {' '.join(input_roots(under)) or 'anywhere'}; "
+            "run sweep_gate.py / gate_blend.py, or results_store.py import --inputs <scored logs>")
+
+def plot_one(store, task, png_path, title, under=None):
+    x,y,l = load_points(store, task, under=under)
+    if not x: raise SystemExit(missing(store, task, "pgbi", under))
     plt.figure()
-    plt.plot(x, y, marker="o")
-    for xi, yi, li in zip(x,y,l):
-        plt.text(xi, yi, f"{li:g}", fontsize=8)
+    plt.plot(x, y, marker="o" if len(x) <= MAX_LABELS else None)
+    if len(x) <= MAX_LABELS:
+        for xi, yi, li in zip(x,y,l):
+            plt.text(xi, yi, f"{li:g}", fontsize=8)
     plt.xlabel("Tokens spent on heavy")
     plt.ylabel("Task quality")
     plt.title(title)
@@ -26,5 +29,8 @@ def plot_one(txt_path, png_path, title):
     print("[ok] saved", png_path)
 
 if __name__=="__main__":
-    plot_one("exp/reports/pcurve_pgbi_qa.txt",   "paper/figs/pcurve_pgbi_qa.png",   "PGBI QA: Quality vs Budget")
-    plot_one("exp/reports/pcurve_pgbi_instr.txt","paper/figs/pcurve_pgbi_instr.png","PGBI Instr: Quality vs Budget")
+    ap = argparse.ArgumentParser()
+    add_reader_args(ap)
+    a = ap.parse_args(); store = ResultsStore(a.results)
+    plot_one(store, "qa",    "paper/figs/pcurve_pgbi_qa.png",   "PGBI QA: Quality vs Budget", a.inputs_under)
+    plot_one(store, "instr", "paper/figs/pcurve_pgbi_instr.png","PGBI Instr: Quality vs Budget", a.inputs_under)
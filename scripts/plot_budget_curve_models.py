@@ -1,29 +1,23 @@
 #!/usr/bin/env python3
-import re, matplotlib.pyplot as plt
+import argparse, matplotlib.pyplot as plt
+from results_store import ResultsStore, add_reader_args
+from plot_budget_curve import load_points, missing, MAX_LABELS
 
-def load(path, tag):
-    xs,ys,ls=[],[],[]
-    with open(path,"r",encoding="utf-8") as f:
-        for line in f:
-            if line.startswith(f"[gate-{tag}]"):
-                m=re.search(r"avg_quality=([0-9.]+).*total_tokens=([0-9.]+).*lambda=([0-9.]+)", line)
-                if m:
-                    q,t,l=map(float,m.groups()); xs.append(t); ys.append(q); ls.append(l)
-    pts=sorted(zip(xs,ys,ls))
-    return [p[0] for p in pts],[p[1] for p in pts],[p[2] for p in pts]
-
-def plot_all(txt, out):
+def plot_all(store, task, out, under=None):
     tags=[("all","PGBI (all feats)","o"),
           ("noacts","No-Acts","s"),
           ("unc","Uncertainty-only","+"),
           ("acts","Acts-only","^")]
-    plt.figure()
+    plt.figure(); drawn = 0
     for tag,lab,mark in tags:
-        x,y,l = load(txt, tag)
+        x,y,l = load_points(store, task, "pgbi", f"gate-{tag}", under)
         if x:
-            plt.plot(x,y, marker=mark, label=lab)
-            for xi,yi,li in zip(x,y,l):
-                plt.text(xi,yi,f"{li:g}",fontsize=7)
+            drawn += 1
+            plt.plot(x,y, marker=mark if len(x) <= MAX_LABELS else None, label=lab)
+            if len(x) <= MAX_LABELS:
+                for xi,yi,li in zip(x,y,l):
+                    plt.text(xi,yi,f"{li:g}",fontsize=7)
+    if not drawn: raise SystemExit(missing(store, task, "gate-<ablation>", under))
     plt.xlabel("Tokens spent on heavy")
     plt.ylabel("Task quality")
     plt.title("Instr: VoC ablations")
@@ -32,4 +26,7 @@ def plot_all(txt, out):
     print("[ok] saved", out)
 
 if __name__=="__main__":
-    plot_all("exp/reports/pcurve_models_instr.txt","paper/figs/pcurve_voc_ablate_instr.png")
+    ap = argparse.ArgumentParser()
+    add_reader_args(ap)
+    a = ap.parse_args()
+    plot_all(ResultsStore(a.results), "instr", "paper/figs/pcurve_voc_ablate_instr.png", a.inputs_under)
@@ -1,26 +1,18 @@
 #!/usr/bin/env python3
-import re, matplotlib.pyplot as plt
+import argparse, matplotlib.pyplot as plt
+from results_store import ResultsStore, add_reader_args
+from plot_budget_curve import load_points, missing, MAX_LABELS
 
-def load_points(path, tag):
-    xs,ys,labels=[],[],[]
-    for line in open(path,"r",encoding="utf-8"):
-        if tag=="pgbi" and line.startswith("[gate]"):
-            m = re.search(r"avg_quality=([0-9.]+).*total_tokens=([0-9.]+).*lambda=([0-9.]+)", line)
-            if m: q,t,l = map(float, m.groups()); xs.append(t); ys.append(q); labels.append(l)
-        if tag=="margin" and line.startswith("[gate-margin]"):
-            m = re.search(r"avg_quality=([0-9.]+).*total_tokens=([0-9.]+).*tau=([0-9.]+)", line)
-            if m: q,t,l = map(float, m.groups()); xs.append(t); ys.append(q); labels.append(l)
-    pts = sorted(zip(xs,ys,labels))
-    return [p[0] for p in pts], [p[1] for p in pts], [p[2] for p in pts]
-
-def plot_both(pgbi_txt, margin_txt, png_path, title):
-    x1,y1,l1 = load_points(pgbi_txt, "pgbi")
-    x2,y2,l2 = load_points(margin_txt, "margin")
+def plot_both(store, task, png_path, title, under=None):
+    x1,y1,l1 = load_points(store, task, "pgbi", under=under)
+    x2,y2,l2 = load_points(store, task, "margin", under=under)
+    if not (x1 or x2): raise SystemExit(missing(store, task, "pgbi / margin", under))
     plt.figure()
-    if x1: plt.plot(x1,y1, marker="o", label="PGBI (VoC)")
-    if x2: plt.plot(x2,y2, marker="s", label="Uncertainty (margin)")
-    for xi, yi, li in zip(x1,y1,l1): plt.text(xi, yi, f"{li:g}", fontsize=8)
-    for xi, yi, li in zip(x2,y2,l2): plt.text(xi, yi, f"{li:g}", fontsize=8)
+    if x1: plt.plot(x1,y1, marker="o" if len(x1) <= MAX_LABELS else None, label="PGBI (VoC)")
+    if x2: plt.plot(x2,y2, marker="s" if len(x2) <= MAX_LABELS else None, label="Uncertainty (margin)")
+    for x, y, l in ((x1, y1, l1), (x2, y2, l2)):
+        if len(x) <= MAX_LABELS:
+            for xi, yi, li in zip(x,y,l): plt.text(xi, yi, f"{li:g}", fontsize=8)
     plt.xlabel("Tokens spent on heavy")
     plt.ylabel("Task quality")
     plt.title(title)
@@ -29,5 +21,8 @@ def plot_both(pgbi_txt, margin_txt, png_path, title):
     print("[ok] saved", png_path)
 
 if __name__=="__main__":
-    plot_both("exp/reports/pcurve_pgbi_qa.txt",   "exp/reports/pcurve_margin_qa.txt",   "paper/figs/pcurve_compare_qa.png",   "QA: PGBI vs Uncertainty")
-    plot_both("exp/reports/pcurve_pgbi_instr.txt","exp/reports/pcurve_margin_instr.txt","paper/figs/pcurve_compare_instr.png","Instr: PGBI vs Uncertainty")
+    ap = argparse.ArgumentParser()
+    add_reader_args(ap)
+    a = ap.parse_args(); store = ResultsStore(a.results)
+    plot_both(store, "qa",    "paper/figs/pcurve_compare_qa.png",   "QA: PGBI vs Uncertainty", a.inputs_under)
+    plot_both(store, "instr", "paper/figs/pcurve_compare_instr.png","Instr: PGBI vs Uncertainty", a.inputs_under)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Hashed n-gram act probe: character and word n-grams hashed into a fixed-width sparse matrix.
+
+No vocabulary is stored, so featurizing is stateless and the model is a fixed-size SGD
+logistic regression that train_probe_hash.py fits chunk by chunk with partial_fit.
+bench_probe_hash.py measures batched and single-row prediction throughput.
+"""
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit
+from sklearn.linear_model import SGDClassifier
+
+LANGS = ["en", "zh"]
+SEP = "\x00"
+VERSION = 2  # featurizer layout; models saved by another version must be retrained
+PRIME = np.uint32(16777619); MIX = np.uint32(0x9E3779B1)  # uint32 halves the memory traffic of uint64 hashing
+PRIME_INV = np.uint32(pow(int(PRIME), -1, 2**32))
+WORD_SALT, BIGRAM_SALT = np.uint32(101), np.uint32(102)
+
+def _word_table():
+    """Code point < 0x10000 -> 1 word char (\\w), 2 single-char token (? ! ？ ！), 0 other."""
+    t = np.zeros(0x10000, dtype=np.uint8)
+    for c in range(0x10000):
+        ch = chr(c)
+        if ch.isalnum() or ch == "_": t[c] = 1
+    t[[ord(c) for c in "?？!！"]] = 2
+    return t
+
+_WORD = None
+
+def _hash_cols(h, salt, width):
+    """Multiplicative hash of uint32 h into [0, width): top bits for powers of two, else multiply-shift."""
+    h = (h ^ salt) * MIX
+    if width > 1 and width & (width - 1) == 0: return (h >> np.uint32(33 - width.bit_length())).astype(np.int32)
+    return ((h.astype(np.uint64) * np.uint64(width)) >> np.uint64(32)).astype(np.int32)
+
+def ngram_blocks(texts, char_min, char_n, char_width, word_n, word_width):
+    """([(rows, cols)] per char n, [(rows, cols)] per word n) over the lower-cased texts, one code-point pass.
+
+    Column-at-a-time like act_feats.Column: the texts are joined with NUL into one code-point
+    array. Character char_min..char_n-grams are rolling polynomial hashes over that array (uint32
+    arithmetic, wrapping) with windows that span a separator dropped. Word tokens (runs of \\w,
+    plus ? ! ？ ！ on their own) are hashed from prefix sums of the same codes scaled by inverse
+    powers of the prime, so any run's polynomial hash is a difference and a multiply; bigrams
+    mix neighbouring token hashes within a row. Each position's row is the count of separators
+    before it, so every block comes out sorted by row. No Python loop over characters, tokens or rows.
+    """
+    global _WORD
+    if _WORD is None: _WORD = _word_table()
+    low = SEP.join(t.replace(SEP, " ") for t in texts).lower()
+    codes = np.frombuffer(low.encode("utf-32-le"), dtype=np.uint32)
+    sep = codes == 0; row_of = np.cumsum(sep)  # separators up to and including each position
+    L = len(codes); chars = []; words = []
+
+    h = np.zeros(L, dtype=np.uint32); bad = np.zeros(L, dtype=bool)
+    with np.errstate(over="ignore"):
+        for k in range(char_n):
+            m = L - k  # windows [i, i+k] for i < m
+            if m <= 0: break
+            h = h[:m] * PRIME + codes[k:]; bad = bad[:m] | sep[k:]
+            if k + 1 >= char_min:
+                ok = np.flatnonzero(~bad); chars.append((row_of[ok], _hash_cols(h[ok], np.uint32(k + 1), char_width)))
+
+        kind = np.where(codes < 0x10000, _WORD[np.minimum(codes, 0xFFFF)], 0)  # astral planes (emoji) are not word chars
+        w = kind == 1; prev = np.r_[False, w[:-1]]; nxt = np.r_[w[1:], False]
+        starts = np.flatnonzero((w & ~prev) | (kind == 2)); ends = np.flatnonzero((w & ~nxt) | (kind == 2))
+        ppow = np.cumprod(np.full(L, PRIME), dtype=np.uint32); ipow = np.cumprod(np.full(L, PRIME_INV), dtype=np.uint32)  # P^(i+1), P^-(i+1)
+        G = np.r_[np.uint32(0), np.cumsum(codes * ipow, dtype=np.uint32)]
+        tok = (G[ends + 1] - G[starts]) * ppow[ends]  # sum_j c_j P^(end-j), same for equal tokens anywhere
+        trow = row_of[starts]; words.append((trow, _hash_cols(tok, WORD_SALT, word_width)))
+        if word_n >= 2 and len(tok) > 1:
+            same = np.flatnonzero(trow[:-1] == trow[1:])
+            words.append((trow[same], _hash_cols(tok[same] * MIX ^ tok[same + 1], BIGRAM_SALT, word_width)))
+    return chars, words
+
+def _inv_norm(n, blocks):
+    """1/sqrt(entries per row across blocks): the l2 norm of a row, ignoring repeated n-grams."""
+    cnt = sum((np.bincount(r, minlength=n) for r, _ in blocks), np.zeros(n, dtype=np.int64))
+    return 1.0 / np.sqrt(np.maximum(cnt, 1))
+
+def _block(n, r, c, width):
+    """(n, width) CSR of ones from one row-sorted block; repeated columns stay separate entries."""
+    indptr = np.zeros(n + 1, dtype=np.int64); np.cumsum(np.bincount(r, minlength=n), out=indptr[1:])
+    return sp.csr_matrix((np.ones(len(c)), c, indptr), shape=(n, width))
+
+def _csr(n, blocks, width):
+    """(n, width) CSR from blocks of (rows, cols, vals) each sorted by row, laid out block after block
+    within a row. Duplicate columns are kept (they add up in a dot product), so nothing is sorted."""
+    counts = [np.bincount(r, minlength=n) for r, _, _ in blocks]
+    indptr = np.zeros(n + 1, dtype=np.int64); np.cumsum(sum(counts), out=indptr[1:])
+    indices = np.empty(indptr[-1], dtype=np.int32); data = np.empty(indptr[-1])
+    base = indptr[:-1].copy()
+    for (r, c, v), cnt in zip(blocks, counts):
+        first = np.cumsum(cnt) - cnt  # index of each row's first entry inside the block
+        dest = base[r] + (np.arange(len(r)) - first[r])
+        indices[dest] = c; data[dest] = v; base += cnt
+    return sp.csr_matrix((data, indices, indptr), shape=(n, width))
+
+class HashFeaturizer:
+    """CSR rows: char char_min..char_n-grams | word 1..word_n-grams | language one-hot."""
+    def __init__(self, n_features=2**19, char_min=3, char_n=4, word_n=2):
+        if word_n not in (1, 2): raise ValueError("word_n must be 1 or 2")
+        self.n_features = n_features; self.char_min = char_min; self.char_n = char_n; self.word_n = word_n
+        self.version = VERSION
+
+    @property
+    def width(self):
+        return self.n_features + self.n_features // 4 + len(LANGS)
+
+    def _parts(self, texts, langs):
+        n = len(texts); nw = self.n_features // 4
+        chars, words = ngram_blocks(texts, self.char_min, self.char_n, self.n_features, self.word_n, nw)
+        lang = np.array([LANGS.index(l) if l in LANGS else 0 for l in langs], dtype=np.int64)
+        return n, [(chars, 0, self.n_features), (words, self.n_features, nw)], lang + self.n_features + nw
+
+    def transform(self, texts, langs):
+        """(n, width) CSR for partial_fit; the char and word blocks are each scaled to unit norm per row."""
+        if not len(texts): return sp.csr_matrix((0, self.width))
+        n, groups, lang = self._parts(texts, langs); out = []
+        for blocks, lo, _ in groups:
+            inv = _inv_norm(n, blocks); out += [(r, c + lo, inv[r]) for r, c in blocks]
+        return _csr(n, out + [(np.arange(n), lang, np.ones(n))], self.width)
+
+    def dot(self, texts, langs, W):
+        """transform(texts, langs) @ W without building the (n, width) matrix: one product per block,
+        scaled by the row norms afterwards."""
+        n, groups, lang = self._parts(texts, langs)
+        S = W[lang].copy()
+        for blocks, lo, width in groups:
+            acc = np.zeros_like(S)
+            for r, c in blocks: acc += _block(n, r, c, width) @ W[lo:lo + width]
+            S += acc * _inv_norm(n, blocks)[:, None]
+        return S
+
+class HashProbe:
+    def __init__(self, acts, n_features=2**19, alpha=1e-5, seed=0):
+        self.acts = list(acts); self.feat = HashFeaturizer(n_features)
+        self.sgd = SGDClassifier(loss="log_loss", alpha=alpha, random_state=seed)
+        self._W = None
+
+    def __getstate__(self):
+        return dict(self.__dict__, _W=None)
+
+    def partial_fit(self, texts, langs, y):
+        self.sgd.partial_fit(self.feat.transform(texts, langs), y, classes=np.arange(len(self.acts))); self._W = None
+
+    def check(self):
+        if getattr(self.feat, "version", 1) != VERSION:
+            raise SystemExit(f"[error] hashed probe featurizer v{getattr(self.feat, 'version', 1)} != v{VERSION}; retrain with train_probe_hash.py")
+
+    def predict_proba(self, texts, langs):
+        """(n, len(acts)) probabilities, columns in `acts` order; SGDClassifier.predict_proba's OvR
+        normalization against a cached C-ordered (width, classes) copy of coef_, which sklearn
+        would otherwise re-copy on every call."""
+        P = np.zeros((len(texts), len(self.acts)))
+        if not len(texts): return P
+        if getattr(self, "_W", None) is None: self._W = np.ascontiguousarray(self.sgd.coef_.T)
+        p = expit(self.feat.dot(texts, langs, self._W) + self.sgd.intercept_)
+        p = np.hstack([1 - p, p]) if p.shape[1] == 1 else p / p.sum(axis=1, keepdims=True)
+        P[:, self.sgd.classes_] = p
+        return P
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""Prompt construction shared by call_openrouter.py and cost_model.py (stdlib only).
+
+Kept apart from the HTTP client so pricing a row at gate time does not import requests, the
+rate limiter or the response cache.
+"""
+QA_SYSTEM = "Return exactly one line: FINAL: <answer>. No other text."
+QA_USER = "Question: {question}\nOutput one line exactly as: FINAL: <answer>"
+INSTR_SYSTEM = "Think briefly if needed, but output only one line starting with FINAL: and nothing else."
+INSTR_USER = "Instruction: {instruction}\nInput: {input}\nOutput one line exactly as: FINAL: <output>"
+MAX_TOKENS = {"qa": (32, 96), "instr": (128, 256)}  # (base, any other mode)
+
+# prompt characters besides the row's own fields, for prompt_chars
+QA_FIXED = len(QA_SYSTEM) + len(QA_USER.format(question=""))
+INSTR_FIXED = len(INSTR_SYSTEM) + len(INSTR_USER.format(instruction="", input=""))
+
+def max_tokens(task, mode):
+    return MAX_TOKENS["qa" if task == "qa" else "instr"][mode != "base"]
+
+def prompt(task, mode, inp):
+    """(messages, max_tokens) for one row."""
+    if task == "qa":
+        sys_msgs = [{"role":"system","content":QA_SYSTEM}]
+        user = [{"role":"user","content": QA_USER.format(question=inp['question'])}]
+    else:
+        sys_msgs = [{"role":"system","content":INSTR_SYSTEM}]
+        user = [{"role":"user","content": INSTR_USER.format(instruction=inp['instruction'], input=inp['input'])}]
+    return sys_msgs+user, max_tokens(task, mode)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Client-side pacing for provider calls: adaptive token buckets plus jittered retry backoff."""
+import collections, random, threading, time, email.utils
+
+def retry_after_secs(value):
+    """Parse a Retry-After header (delta-seconds or HTTP-date); None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+class RateLimiter:
+    """Requests/s and tokens/min buckets that halve the request rate on 429 and creep back
+    up on success (AIMD). rps=None starts unlimited and engages at the first 429.
+
+    `throttled` sums the time every worker spent blocked here or in backoff.
+    """
+
+    def __init__(self, rps=None, tpm=None, min_rps=0.1, recover=0.05):
+        self.target = rps; self.rate = rps; self.tpm = tpm
+        self.min_rps = min_rps; self.recover = recover
+        self.req_level = 1.0; self.tok_level = float(tpm or 0)
+        self.last = time.monotonic(); self.pause_until = 0.0; self.last_cut = 0.0
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic(); self.sent = 0; self.ok = 0
+        self.recent = collections.deque(maxlen=4096)  # send times, to estimate the live rate
+        self.throttled = 0.0; self.retries = {}
+
+    def _refill(self, now):
+        dt = now - self.last; self.last = now
+        if self.rate:
+            self.req_level = min(max(1.0, self.rate), self.req_level + dt * self.rate)
+        if self.tpm:
+            self.tok_level = min(float(self.tpm), self.tok_level + dt * self.tpm / 60.0)
+
+    def acquire(self, tokens=0):
+        """Block until a request of ~`tokens` tokens fits both buckets."""
+        while True:
+            with self.lock:
+                now = time.monotonic(); self._refill(now)
+                need_tok = min(float(tokens), float(self.tpm)) if self.tpm else 0.0
+                wait = self.pause_until - now
+                if self.rate and self.req_level < 1.0:
+                    wait = max(wait, (1.0 - self.req_level) / self.rate)
+                if self.tpm and self.tok_level < need_tok:
+                    wait = max(wait, (need_tok - self.tok_level) * 60.0 / self.tpm)
+                if wait <= 0:
+                    if self.rate: self.req_level -= 1.0
+                    if self.tpm: self.tok_level -= need_tok
+                    self.sent += 1; self.recent.append(now)
+                    return
+                self.throttled += wait
+            time.sleep(wait)
+
+    def settle(self, estimated, actual):
+        """Refund (or charge) the difference between the estimated and billed tokens."""
+        if self.tpm and actual is not None:
+            with self.lock:
+                self.tok_level = min(float(self.tpm), self.tok_level + estimated - actual)
+
+    def on_success(self):
+        with self.lock:
+            self.ok += 1
+            if self.rate and self.target and self.rate < self.target:
+                self.rate = min(self.target, self.rate + self.recover * self.target)
+
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            if retry_after:
+                self.pause_until = max(self.pause_until, now + retry_after)
+            if now - self.last_cut < 1.0:  # a burst of 429s from in-flight calls counts as one signal
+                return
+            self.last_cut = now
+            if not self.rate:  # first 429 while unlimited: start from the rate sent over the last second
+                self.target = max(self.min_rps, float(sum(1 for t in self.recent if now - t < 1.0)))
+                self.rate = self.target
+                self.req_level = 0.0
+            self.rate = max(self.min_rps, self.rate * 0.5)
+
+    def backoff(self, reason, attempt, retry_after=None, base=0.5, cap=30.0):
+        """Sleep with full-jitter exponential backoff, never shorter than Retry-After."""
+        d = random.uniform(0.0, min(cap, base * (2 ** attempt)))
+        if retry_after: d = max(d, retry_after)
+        with self.lock:
+            self.retries[reason] = self.retries.get(reason, 0) + 1; self.throttled += d
+        time.sleep(d)
+
+    def stats(self):
+        dt = time.monotonic() - self.t0
+        rate = f"{self.rate:.2f}" if self.rate else "unlimited"
+        retries = ",".join(f"{k}:{v}" for k, v in sorted(self.retries.items())) or "0"
+        return (f"[rate] ok={self.ok} sent={self.sent} rps={self.ok/max(dt,1e-9):.2f} retries={retries} "
+                f"throttled_worker_s={self.throttled:.1f} rps_limit={rate}")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Indexed store of gate results (sqlite, stdlib only) so summaries, tables and plots need no log parsing.
+
+A run is one invocation of a gate script: method (pgbi, margin, tiers), task, tag (the line
+prefix it prints, e.g. gate-all), kind (sweep, or point for a single gate run), params, N, the sha256 of every model it used and its inputs
+as path/size/mtime (scored files can be large). Its points are (x, quality, tokens, heavy,
+extra) at full precision, x being lambda (pgbi, tiers) or tau (margin). Runs that see the whole
+joined data also keep the all-base and all-heavy endpoints. Readers take the latest sweep per
+(task, method, tag), so one-off gate runs do not replace a curve; without a sweep they build the
+curve from the newest point run per lambda/tau (the one-gate_blend-run-per-lambda workflow).
+Readers only look at runs whose inputs lie under --inputs_under (exp/logs and exp/store, where
+colstore.py stores live) and still match the recorded size/mtime, so benchmark runs on synthetic
+data or sweeps of since-rescored logs are skipped, with a warning naming how many were.
+
+    python scripts/results_store.py import --report exp/reports/pcurve_pgbi_qa.txt \
+        --inputs exp/logs/qa_en.base.scored.jsonl exp/logs/qa_en.heavy.scored.jsonl
+    python scripts/results_store.py ls
+    python scripts/results_store.py points --task qa --method pgbi
+"""
+import argparse, hashlib, json, os, pathlib, re, sqlite3, sys, time
+
+DEFAULT = "exp/results.sqlite"
+UNDER = ["exp/logs", "exp/store"]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, time REAL NOT NULL, script TEXT NOT NULL,
+    method TEXT NOT NULL, task TEXT NOT NULL, tag TEXT NOT NULL, kind TEXT NOT NULL, n INTEGER, params TEXT, models TEXT, inputs TEXT,
+    base_quality REAL, heavy_quality REAL, heavy_tokens REAL, argv TEXT);
+CREATE INDEX IF NOT EXISTS runs_key ON runs(task, method, tag, kind, run_id);
+CREATE TABLE IF NOT EXISTS points (run_id INTEGER NOT NULL REFERENCES runs(run_id), x REAL, quality REAL NOT NULL,
+    tokens REAL NOT NULL, heavy INTEGER, extra TEXT);
+CREATE INDEX IF NOT EXISTS points_run ON points(run_id);
+"""
+_SHA = {}
+
+def file_sha256(path):
+    """sha256 of a model file, memoized per (path, size, mtime)."""
+    st = os.stat(path); k = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if k not in _SHA:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for b in iter(lambda: f.read(1 << 20), b""): h.update(b)
+        _SHA[k] = h.hexdigest()
+    return _SHA[k]
+
+def file_stamp(path):
+    st = os.stat(path); return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self.db = sqlite3.connect(self.path, timeout=60, isolation_level=None)  # pipeline stages append concurrently
+        self.db.execute("PRAGMA journal_mode=WAL"); self.db.executescript(SCHEMA)
+
+    def add_run(self, script, method, task, points, tag=None, kind="sweep", n=None, params=None, models=None, inputs=None, endpoints=None):
+        """Insert a run and its points [(x, quality, tokens[, heavy[, extra dict]]), ...]; returns run_id.
+
+        models: {role: path} (hashed); inputs: [path] (stamped); endpoints: (base_quality, heavy_quality, heavy_tokens).
+        """
+        models = {k: {"path": p, "sha256": file_sha256(p)} for k, p in (models or {}).items() if p}
+        inputs = {os.path.abspath(p): file_stamp(p) for p in (inputs or []) if p and os.path.exists(p)}
+        bq, hq, ht = endpoints or (None, None, None)
+        rows = [(float(p[0]) if p[0] is not None else None, float(p[1]), float(p[2]),
+                 int(p[3]) if len(p) > 3 and p[3] is not None else None,
+                 json.dumps(p[4], ensure_ascii=False) if len(p) > 4 and p[4] else None) for p in points]
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            cur = self.db.execute("INSERT INTO runs(time, script, method, task, tag, kind, n, params, models, inputs, base_quality,"
+                                  " heavy_quality, heavy_tokens, argv) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                                  (time.time(), script, method, task, tag or method, kind, n, json.dumps(params or {}, sort_keys=True),
+                                   json.dumps(models, sort_keys=True), json.dumps(inputs, sort_keys=True), bq, hq, ht,
+                                   json.dumps(sys.argv)))
+            rid = cur.lastrowid
+            self.db.executemany("INSERT INTO points(run_id, x, quality, tokens, heavy, extra) VALUES (?,?,?,?,?,?)",
+                                [(rid,) + r for r in rows])
+        return rid
+
+    def runs(self, task=None, method=None, tag=None, kind="sweep", latest=True, under=None):
+        """Run rows as dicts, newest first; with latest only the newest per (task, method, tag, kind).
+
+        under: only runs whose inputs all lie below one of these directories (or this one) and,
+        where the files still exist, match the recorded size/mtime.
+        """
+        where, args = [], []
+        for col, v in (("task", task), ("method", method), ("tag", tag), ("kind", kind)):
+            if v is not None: where.append(f"{col}=?"); args.append(v)
+        cur = self.db.execute("SELECT * FROM runs" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY run_id DESC", args)
+        names = [d[0] for d in cur.description]; out = []; seen = set()
+        for r in cur.fetchall():
+            d = dict(zip(names, r))
+            for k in ("params", "models", "inputs", "argv"): d[k] = json.loads(d[k]) if d[k] else None
+            if input_roots(under) and not inputs_under(d, under): continue
+            if latest:
+                k = (d["task"], d["method"], d["tag"], d["kind"])
+                if k in seen: continue
+                seen.add(k)
+            out.append(d)
+        return out
+
+    def points(self, run_id):
+        """[(x, quality, tokens, heavy, extra)] of a run, sorted by tokens then x."""
+        cur = self.db.execute("SELECT x, quality, tokens, heavy, extra FROM points WHERE run_id=? ORDER BY tokens, x", (run_id,))
+        return [(x, q, t, h, json.loads(e) if e else None) for x, q, t, h, e in cur.fetchall()]
+
+    def curve_points(self, task, method, tag=None, under=None):
+        """(points, run): the latest sweep's points, else the newest point run's point per x; ([], None) without either.
+
+        run is the sweep or the newest point run used (for its endpoints); run["kind"] tells which.
+        """
+        tag = tag or ("gate" if method == "pgbi" else f"gate-{method}")
+        skipped = sum(not inputs_under(r, under) for r in self.runs(task, method, tag, None, latest=False)) if input_roots(under) else 0
+        if skipped:
+            print(f"[warn] skipped {skipped} {tag} runs for {task}/{method} whose inputs are not under {' '.join(input_roots(under))} "
+                  "or changed since (see --inputs_under)", file=sys.stderr)
+        rs = self.runs(task, method, tag, "sweep", under=under)
+        if rs: return self.points(rs[0]["run_id"]), rs[0]
+        rs = self.runs(task, method, tag, "point", latest=False, under=under)
+        byx = {}
+        for r in rs:
+            for p in self.points(r["run_id"]): byx.setdefault(p[0], p)
+        pts = sorted(byx.values(), key=lambda p: (p[2], float("inf") if p[0] is None else p[0]))
+        if pts:
+            print(f"[warn] no {tag} sweep for {task}/{method}; curve built from {len(rs)} point runs ({len(pts)} points)", file=sys.stderr)
+        return pts, (rs[0] if rs else None)
+
+    def curve(self, task, method, tag=None, under=None):
+        """(xs, quality, tokens) of curve_points() sorted by tokens, or empty lists."""
+        pts, _ = self.curve_points(task, method, tag, under)
+        return [p[0] for p in pts], [p[1] for p in pts], [p[2] for p in pts]
+
+    def close(self):
+        self.db.close()
+
+def input_roots(under):
+    """Directories of an --inputs_under value (a path or a list; empty means no filter)."""
+    return [u for u in ([under] if isinstance(under, str) else under or []) if u]
+
+def inputs_under(run, under):
+    """True if every recorded input of `run` lies below a directory of `under` and, if it still exists, is unchanged."""
+    roots = [os.path.join(os.path.abspath(u), "") for u in input_roots(under)]
+    if not run["inputs"]: return False
+    for p, st in run["inputs"].items():
+        p = os.path.abspath(p)
+        if not any(p.startswith(r) for r in roots): return False
+        if os.path.exists(p) and file_stamp(p) != st: return False
+    return True
+
+def add_results_arg(ap):
+    ap.add_argument("--results", default=DEFAULT, help="append this run to a results_store.py sqlite file ('' to skip)")
+
+def add_reader_args(ap):
+    ap.add_argument("--results", default=DEFAULT)
+    ap.add_argument("--inputs_under", nargs="*", default=UNDER,
+                    help="only read runs whose inputs lie under these directories, unchanged since (no value or '' for all)")
+
+def record(path, script, method, task, points, **kw):
+    """ResultsStore(path).add_run(...) for scripts with --results; a no-op when path is empty."""
+    if not path: return None
+    st = ResultsStore(path)
+    try: return st.add_run(script, method, task, points, **kw)
+    finally: st.close()
+
+LINE = re.compile(r"^\[(gate[\w-]*)\]\s+(.*)$")
+KV = re.compile(r"(\w+)=(\S+)")
+
+def import_report(store, path, task=None, inputs=None):
+    """Load the [gate*] lines of an old report into one run per tag; returns {tag: points}.
+
+    inputs: the scored files the report was computed from (recorded instead of the report itself).
+    """
+    task = task or ("qa" if "_qa" in os.path.basename(path) else "instr" if "_instr" in os.path.basename(path) else None)
+    if task is None: raise ValueError(f"{path}: cannot tell the task from the file name; pass --task")
+    runs = {}
+    for line in open(path, "r", encoding="utf-8"):
+        m = LINE.match(line.strip())
+        if not m: continue
+        kv = dict(KV.findall(m.group(2)))
+        if "avg_quality" not in kv or "total_tokens" not in kv: continue
+        x = kv.get("lambda", kv.get("tau", kv.get("implied_lambda")))
+        extra = {"mix": {k: int(v) for k, v in (p.split(":") for p in kv["mix"].split(","))}} if "mix" in kv else None
+        r = runs.setdefault(m.group(1), {"n": int(kv["N"]) if "N" in kv else None, "points": [],
+                                         "params": {k: kv[k] for k in ("gain_scale", "budget_tokens", "heavy_frac") if k in kv}})
+        r["points"].append((float(x) if x not in (None, "inf") else None, float(kv["avg_quality"]), float(kv["total_tokens"]),
+                            int(kv["heavy"]) if "heavy" in kv else None, extra))
+    for tag, r in runs.items():
+        method = "margin" if tag.startswith("gate-margin") else "tiers" if tag.startswith("gate-tiers") else "pgbi"
+        store.add_run(f"import:{path}", method, task, r["points"], tag=tag, n=r["n"], params=r["params"], inputs=inputs or [path])
+    return {tag: r["points"] for tag, r in runs.items()}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["import", "ls", "points"])
+    ap.add_argument("--results", default=DEFAULT)
+    ap.add_argument("--report", nargs="*", default=[], help="import: gate report .txt files ([gate*] lines)")
+    ap.add_argument("--inputs", nargs="*", default=None, help="import: scored files the reports came from (default: the report)")
+    ap.add_argument("--task", default=None)
+    ap.add_argument("--method", default=None)
+    ap.add_argument("--tag", default=None)
+    ap.add_argument("--kind", default=None, choices=["sweep", "point"], help="ls/points: only sweeps or single gate runs")
+    ap.add_argument("--all", action="store_true", help="ls: every run, not only the latest per (task, method, tag, kind)")
+    ap.add_argument("--inputs_under", nargs="*", default=None, help="ls/points: only runs whose inputs lie under these directories, unchanged since")
+    a = ap.parse_args()
+    st = ResultsStore(a.results)
+    if a.cmd == "import":
+        for p in a.report:
+            got = import_report(st, p, a.task, a.inputs)
+            print(f"[ok] imported {p} " + " ".join(f"{t}={len(v)}" for t, v in got.items()))
+    elif a.cmd == "ls":
+        for r in st.runs(a.task, a.method, a.tag, a.kind, latest=not a.all, under=a.inputs_under):
+            npts = st.db.execute("SELECT COUNT(*) FROM points WHERE run_id=?", (r["run_id"],)).fetchone()[0]
+            print(f"run={r['run_id']} time={time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(r['time']))} task={r['task']} "
+                  f"method={r['method']} tag={r['tag']} kind={r['kind']} N={r['n']} points={npts} script={r['script']} "
+                  + " ".join(f"{k}={v['sha256'][:12]}" for k, v in (r["models"] or {}).items()))
+    else:
+        for r in st.runs(a.task, a.method, a.tag, a.kind or "sweep", under=a.inputs_under):
+            for x, q, t, h, e in st.points(r["run_id"]):
+                print(f"[{r['tag']}] task={r['task']} N={r['n']} avg_quality={q!r} total_tokens={t!r} "
+                      f"{'tau' if r['method'] == 'margin' else 'lambda'}={x!r}"
+                      + (f" heavy={h}" if h is not None else "") + (f" extra={json.dumps(e)}" if e else ""))
+    st.close()
+
+if __name__ == "__main__":
+    main()
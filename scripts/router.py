@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Long-lived PGBI router: probe -> VoC -> base/heavy dispatch in one process.
+
+Models are loaded once and flattened to plain numpy weights, so a gating decision is a
+handful of small dot products instead of several sklearn predict calls.
+
+    python scripts/router.py --probe models/act_probe.joblib --voc models/voc.joblib --port 8090
+    curl -s localhost:8090/decide -d '{"id":"q1","task":"qa","question":"Who wrote Hamlet?"}'
+    curl -s localhost:8090/metrics
+"""
+import json, argparse, time, threading, collections, random
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np, joblib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from act_feats import probe_features, voc_features
+from gate_blend import unwrap_clf, pos_prob, model_mask
+from cost_model import CostModel
+import call_openrouter, metrics
+
+class LinearVoC:
+    """P(gain=1) as the fold average of sigmoid-calibrated linear scores.
+
+    Matches CalibratedClassifierCV(LogisticRegression, method="sigmoid"), a bare binary
+    LogisticRegression (A=-1, B=0) and constant DummyClassifier models.
+    """
+    def __init__(self, W, b, A, B, const=None):
+        self.W = np.asarray(W, dtype=float); self.b = np.asarray(b, dtype=float)
+        self.A = np.asarray(A, dtype=float); self.B = np.asarray(B, dtype=float); self.const = const
+
+    def prob(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if self.const is not None:
+            return np.full(X.shape[0], self.const)
+        D = X @ self.W.T + self.b
+        return (1.0 / (1.0 + np.exp(self.A * D + self.B))).mean(axis=1)
+
+def flatten_voc(clf):
+    """LinearVoC for the model families train_voc.py produces, else None."""
+    name = type(clf).__name__
+    classes = [int(c) for c in getattr(clf, "classes_", [])]
+    if name == "OnlineVoC" and clf.fitted:
+        W, b, A, B = clf.linear(); return LinearVoC([W], [b], [A], [B])
+    if name == "DummyClassifier":
+        return LinearVoC([], [], [], [], const=1.0 if classes[:1] == [1] else 0.0)
+    if name == "LogisticRegression" and classes == [0, 1]:
+        return LinearVoC(clf.coef_, clf.intercept_, [-1.0], [0.0])
+    if name == "CalibratedClassifierCV" and classes == [0, 1] and getattr(clf, "method", "") == "sigmoid":
+        W, b, A, B = [], [], [], []
+        for cc in clf.calibrated_classifiers_:
+            est = getattr(cc, "estimator", None) or getattr(cc, "base_estimator", None)
+            cal = cc.calibrators[0]
+            if type(est).__name__ != "LogisticRegression": return None
+            W.append(est.coef_[0]); b.append(est.intercept_[0]); A.append(cal.a_); B.append(cal.b_)
+        return LinearVoC(W, b, A, B)
+    return None
+
+def record_text(rec):
+    if "text" in rec: return rec["text"]
+    return rec.get("question") if "question" in rec else rec.get("input", "")
+
+class Latency:
+    """Recent latencies (seconds) with percentile readout."""
+    def __init__(self, keep=100000):
+        self.xs = collections.deque(maxlen=keep); self.n = 0; self.lock = threading.Lock()
+
+    def add(self, dt):
+        with self.lock:
+            self.xs.append(dt); self.n += 1
+
+    def summary(self):
+        with self.lock:
+            xs = sorted(self.xs)
+        if not xs:
+            return {"n": self.n}
+        q = lambda f: xs[min(len(xs)-1, int(f*len(xs)))] * 1e3
+        return {"n": self.n, "p50_ms": q(0.50), "p99_ms": q(0.99), "max_ms": xs[-1] * 1e3}
+
+class Router:
+    def __init__(self, probe_model, voc_model, lambda_=0.002, gain_scale=1.0, cost_heavy=100.0,
+                 band=0.05, waste_budget=float("inf"), cost_model=None, explore=0.0):
+        obj = joblib.load(probe_model); self.acts = obj["acts"]
+        self.hash_probe = obj["model"] if obj.get("kind") == "probe_hash" else None
+        if self.hash_probe is not None:
+            self.hash_probe.check()
+        else:
+            sc, lr = obj["pipe"].named_steps["scaler"], obj["pipe"].named_steps["lr"]
+            self.mu, self.sd, self.Wp, self.bp = sc.mean_, sc.scale_, lr.coef_, lr.intercept_
+        model = joblib.load(voc_model)
+        self.clf = unwrap_clf(model); self.voc = flatten_voc(self.clf)
+        self.mask = model_mask(model)
+        self.lambda_ = lambda_; self.gain_scale = gain_scale; self.cost_heavy = cost_heavy
+        self.cost_model = CostModel(cost_model) if cost_model else None  # prices requests that carry no cost_heavy
+        self.decide_lat = Latency(); self.call_lat = Latency(); self.chosen = collections.Counter()
+        # cascade: rows with |p - threshold| <= band speculate a heavy call next to the base one,
+        # until the tokens burnt on discarded speculative calls reach waste_budget
+        self.band = band; self.waste_budget = waste_budget; self.wasted = 0.0
+        self.lock = threading.Lock(); self.pool = ThreadPoolExecutor(max_workers=32)
+        self.explore = explore  # fraction of gate-skipped requests sent to heavy anyway, for unbiased gain labels
+
+    def probe(self, text, lang):
+        if self.hash_probe is not None:
+            p = self.hash_probe.predict_proba([text], [lang])[0]
+        else:
+            z = ((probe_features([text], [lang])[0] - self.mu) / self.sd) @ self.Wp.T + self.bp
+            z = z - z.max(); e = np.exp(z); p = e / e.sum()
+        s = np.sort(p)[::-1]
+        return {a: float(p[i]) for i, a in enumerate(self.acts)}, float(s[0]-s[1]) if len(s) >= 2 else float(s[0])
+
+    def decide(self, rec):
+        t0 = time.perf_counter()
+        text = record_text(rec); lang = rec.get("lang", "en")
+        with metrics.span("probe"): probs, margin = self.probe(text, lang)
+        x = voc_features([{"text": text, "lang": lang, "probe_probs": probs}])[0] * self.mask
+        if self.voc is not None:
+            with metrics.span("voc"): p = float(self.voc.prob(x)[0])
+        else:
+            p = pos_prob(self.clf, x.reshape(1, -1))
+        if rec.get("cost_heavy") is not None: cost = float(rec["cost_heavy"])
+        elif self.cost_model is not None: cost = float(self.cost_model.predict([dict(rec, text=text, lang=lang, probe_probs=probs)])[0])
+        else: cost = self.cost_heavy
+        use = (p * self.gain_scale) >= (self.lambda_ * cost)
+        explore = not use and self.explore > 0 and random.random() < self.explore
+        dt = time.perf_counter() - t0; self.decide_lat.add(dt)
+        metrics.observe("decide_seconds", dt); metrics.inc("rows_total", stage="decide")
+        d = {"id": rec.get("id"), "chosen": "heavy" if use or explore else "base", "p_gain": p, "cost_heavy": cost,
+             "probe_probs": probs, "probe_margin": margin, "decision_us": dt * 1e6}
+        if self.explore > 0: d["explore"] = explore; d["p_heavy"] = 1.0 if use else self.explore
+        return d
+
+    def route(self, rec):
+        d = self.decide(rec)
+        task = rec.get("task", "qa" if "question" in rec else "instr")
+        t0 = time.perf_counter()
+        try:
+            pred, usage, native = call_openrouter.run(task, d["chosen"], rec)
+            d["pred"] = pred; d["cost"] = call_openrouter.norm_cost(usage, native)
+        except Exception as e:
+            d["pred"] = f"[ERROR] {e}"
+        self.call_lat.add(time.perf_counter() - t0); self.chosen[d["chosen"]] += 1
+        return d
+
+    def _call(self, task, mode, rec):
+        messages, max_tokens = call_openrouter.prompt(task, mode, rec)
+        raw, usage, native = call_openrouter.call(messages, max_tokens=max_tokens, temperature=0.0)
+        return raw, call_openrouter.norm_cost(usage, native) or 0.0
+
+    def _discard(self, fut):
+        if fut.cancelled() or fut.exception() is not None: return
+        with self.lock:
+            self.wasted += fut.result()[1]
+
+    def cascade(self, rec, policy="cascade"):
+        """Base-first cascade with escalation when the base output has no usable FINAL: line.
+
+        policy="cascade": clear heavy rows go straight to heavy, rows near the threshold start
+        heavy speculatively alongside base (cancelled or discarded if the gate chose base and
+        base is fine).
+        policy="sequential": always base first, then heavy if the gate or a bad base asks for it.
+        Both policies answer with heavy for the same rows (p >= threshold, or a bad base output),
+        so they differ only in latency and in the base / speculative tokens spent getting there.
+        """
+        d = self.decide(rec); task = rec.get("task", "qa" if "question" in rec else "instr")
+        thr = self.lambda_ * d["cost_heavy"] / self.gain_scale; p = d["p_gain"]
+        t0 = time.perf_counter(); tokens = 0.0; spec = None
+        d.update(escalated=False, speculated=False)
+        try:
+            if policy == "cascade" and p >= thr + self.band:
+                raw, tokens = self._call(task, "heavy", rec); d["chosen"] = "heavy"
+            else:
+                if policy == "cascade" and abs(p - thr) <= self.band and self.wasted < self.waste_budget:
+                    spec = self.pool.submit(self._call, task, "heavy", rec); d["speculated"] = True
+                raw, tokens = self._call(task, "base", rec); d["chosen"] = "base"
+                bad = not call_openrouter.has_final(raw)
+                if bad or p >= thr:
+                    raw2, c2 = spec.result() if spec is not None else self._call(task, "heavy", rec)
+                    raw = raw2; tokens += c2; d["chosen"] = "heavy"; d["escalated"] = bad; spec = None
+            d["pred"] = call_openrouter.extract_final(raw)
+        except Exception as e:
+            d["pred"] = f"[ERROR] {e}"
+        if spec is not None and not spec.cancel():
+            spec.add_done_callback(self._discard)
+        d["tokens"] = tokens; d["latency_ms"] = (time.perf_counter() - t0) * 1e3
+        self.call_lat.add(d["latency_ms"] / 1e3); self.chosen[d["chosen"]] += 1
+        return d
+
+    def metrics(self):
+        return {"decision": self.decide_lat.summary(), "dispatch": self.call_lat.summary(),
+                "chosen": dict(self.chosen), "lambda": self.lambda_, "gain_scale": self.gain_scale,
+                "wasted_tokens": self.wasted, "voc_fast_path": self.voc is not None}
+
+def serve(router, host, port):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, code, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics": return self.reply(200, router.metrics())
+            if self.path == "/metrics/prometheus":
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200); self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body))); self.end_headers(); self.wfile.write(body); return
+            self.reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                rec = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError as e:
+                return self.reply(400, {"error": f"bad json: {e}"})
+            if self.path == "/decide": return self.reply(200, router.decide(rec))
+            if self.path == "/route": return self.reply(200, router.route(rec))
+            if self.path == "/cascade": return self.reply(200, router.cascade(rec))
+            self.reply(404, {"error": "not found"})
+
+    srv = ThreadingHTTPServer((host, port), Handler); srv.daemon_threads = True
+    print(f"[router] serving http://{host}:{port} (/decide, /route, /cascade, /metrics, /metrics/prometheus)", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+def compare_cascade(router, path, concurrency):
+    rows = [json.loads(l) for l in open(path, "r", encoding="utf-8")]
+    res = {}
+    for policy in ("sequential", "cascade"):
+        router.wasted = 0.0
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            out = list(ex.map(lambda r: router.cascade(r, policy), rows))
+        router.pool.shutdown(wait=True); router.pool = ThreadPoolExecutor(max_workers=32)
+        lat = sorted(d["latency_ms"] for d in out); n = max(len(lat), 1)
+        tok = sum(d["tokens"] for d in out) + router.wasted
+        heavy = sorted(str(d["id"]) for d in out if d["chosen"] == "heavy")
+        res[policy] = (sum(lat)/n, lat[len(lat)//2], lat[min(len(lat)-1, int(0.99*len(lat)))], tok, len(heavy), heavy)
+        print(f"[cascade] policy={policy} N={len(out)} mean_ms={res[policy][0]:.1f} p50_ms={res[policy][1]:.1f} "
+              f"p99_ms={res[policy][2]:.1f} tokens={tok:.0f} wasted={router.wasted:.0f} "
+              f"heavy={res[policy][4]} escalated={sum(d['escalated'] for d in out)} "
+              f"speculated={sum(d['speculated'] for d in out)}")
+    s, c = res["sequential"], res["cascade"]
+    print(f"[cascade] latency_saving={1-c[0]/max(s[0],1e-9):.3f} token_saving={1-c[3]/max(s[3],1e-9):.3f} "
+          f"heavy_sequential={s[4]} heavy_cascade={c[4]} same_routing={s[5] == c[5]}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--probe", default="models/act_probe.joblib")
+    ap.add_argument("--voc", default="models/voc.joblib")
+    ap.add_argument("--lambda_", type=float, default=0.002)
+    ap.add_argument("--gain_scale", type=float, default=1.0)
+    ap.add_argument("--cost_heavy", type=float, default=100.0, help="heavy cost assumed when a request carries none")
+    ap.add_argument("--cost_model", default=None, help="train_cost.py model used instead of --cost_heavy")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--band", type=float, default=0.05, help="cascade: speculate heavy when |p - threshold| <= band")
+    ap.add_argument("--waste_budget", type=float, default=float("inf"), help="cascade: stop speculating after this many discarded tokens")
+    ap.add_argument("--bench_jsonl", default=None, help="time decide() over a file instead of serving")
+    ap.add_argument("--cascade_jsonl", default=None, help="run a file through cascade and sequential escalation and compare")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--explore", type=float, default=0.0, help="send this random fraction of gate-skipped requests to heavy (logged as explore/p_heavy)")
+    ap.add_argument("--stream", action="store_true", help="stream completions and stop at the FINAL: line (see call_openrouter)")
+    metrics.add_metrics_args(ap)
+    a = ap.parse_args(); metrics.from_args(a)
+    router = Router(a.probe, a.voc, a.lambda_, a.gain_scale, a.cost_heavy, a.band, a.waste_budget, a.cost_model, a.explore)
+    if a.bench_jsonl:
+        for line in open(a.bench_jsonl, "r", encoding="utf-8"):
+            router.decide(json.loads(line))
+        m = router.decide_lat.summary()
+        print(f"[router-bench] N={m['n']} p50_ms={m['p50_ms']:.4f} p99_ms={m['p99_ms']:.4f} fast_path={router.voc is not None}")
+        return
+    call_openrouter.mount_pool(64); call_openrouter.STREAM = a.stream
+    if a.cascade_jsonl:
+        return compare_cascade(router, a.cascade_jsonl, a.concurrency)
+    serve(router, a.host, a.port)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,75 @@
 #!/usr/bin/env python3
-import json, argparse, joblib, numpy as np, math
-from train_probe import feats
-ap=argparse.ArgumentParser()
-ap.add_argument("--in_jsonl", required=True)
-ap.add_argument("--out_jsonl", required=True)
-ap.add_argument("--model", default="models/act_probe.joblib")
-a=ap.parse_args()
-obj=joblib.load(a.model); pipe=obj["pipe"]; ACTS=obj["acts"]
-def softmax(z): z=np.array(z); z-=z.max(); e=np.exp(z); return (e/e.sum()).tolist()
-with open(a.in_jsonl,"r",encoding="utf-8") as f, open(a.out_jsonl,"w",encoding="utf-8") as g:
-    for line in f:
-        r=json.loads(line); x=np.array([feats(r["text"], r.get("lang","en"))])
-        if hasattr(pipe.named_steps["lr"],"decision_function"):
-            z=pipe.named_steps["lr"].decision_function(pipe.named_steps["scaler"].transform(x)).ravel()
-            p=softmax(z)
-        else:
-            p=pipe.predict_proba(x)[0].tolist()
-        s=sorted(p, reverse=True); margin=float(s[0]-s[1]) if len(s)>=2 else float(s[0])
-        r["probe_probs"]={ACTS[i]:float(p[i]) for i in range(len(ACTS))}
-        r["probe_top"]=ACTS[int(np.argmax(p))]; r["probe_margin"]=margin
-        g.write(json.dumps(r, ensure_ascii=False)+"\n")
-print("[ok] wrote", a.out_jsonl)
+import json, argparse, joblib, numpy as np, itertools, time
+from act_feats import probe_features
+from colstore import ColumnStore, struct_column
+import metrics
+
+def softmax_rows(Z):
+    Z = Z - Z.max(axis=1, keepdims=True); E = np.exp(Z)
+    return E / E.sum(axis=1, keepdims=True)
+
+def probe_batch(pipe, X):
+    """Act probabilities for a feature matrix: one transform and one softmax per chunk."""
+    X = np.asarray(X, dtype=np.float64)
+    if hasattr(pipe.named_steps["lr"],"decision_function"):
+        Z = pipe.named_steps["lr"].decision_function(pipe.named_steps["scaler"].transform(X))
+        return softmax_rows(np.atleast_2d(Z))
+    return pipe.predict_proba(X)
+
+def prober(obj):
+    """(texts, langs) -> act probabilities for a train_probe.py or train_probe_hash.py bundle."""
+    if obj.get("kind") == "probe_hash":
+        obj["model"].check(); fn = obj["model"].predict_proba
+    else:
+        fn = lambda texts, langs: probe_batch(obj["pipe"], probe_features(texts, langs))
+    def probe(texts, langs):
+        with metrics.span("probe"): P = fn(texts, langs)
+        metrics.inc("rows_total", len(P), stage="probe"); return P
+    return probe
+
+def margins(P):
+    if P.shape[1] < 2: return P[:,0].copy()
+    top2 = -np.partition(-P, 1, axis=1)[:, :2]
+    return top2[:,0] - top2[:,1]
+
+def annotate(rows, P, acts):
+    M = margins(P); top = P.argmax(axis=1)
+    for r, p, m, t in zip(rows, P.tolist(), M.tolist(), top.tolist()):
+        r["probe_probs"]={acts[i]:p[i] for i in range(len(acts))}
+        r["probe_top"]=acts[t]; r["probe_margin"]=m
+    return rows
+
+def probe_store(store, probe, acts, batch_size):
+    """Score the store's text/lang columns and add probe_probs/probe_top/probe_margin columns."""
+    P=[probe([r.get("text","") for r in rows], [r.get("lang","en") for r in rows]) for rows in store.rows(["text","lang"], batch_size)]
+    P=np.concatenate(P) if P else np.zeros((0,len(acts)))
+    store.add({"probe_probs":struct_column(P, acts), "probe_top":[acts[i] for i in P.argmax(axis=1).tolist()],
+               "probe_margin":margins(P)})
+    return len(P)
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument("--in_jsonl", default=None)
+    ap.add_argument("--out_jsonl", default=None)
+    ap.add_argument("--store", default=None, help="column store (colstore.py) to read text/lang from and add probe columns to")
+    ap.add_argument("--model", default="models/act_probe.joblib", help="train_probe.py or train_probe_hash.py model")
+    ap.add_argument("--batch_size", type=int, default=16384, help="rows featurized and scored per chunk")
+    metrics.add_metrics_args(ap)
+    a=ap.parse_args(); metrics.from_args(a)
+    obj=joblib.load(a.model); probe=prober(obj); ACTS=obj["acts"]
+    t0=time.time(); n=0
+    if a.store:
+        n=probe_store(ColumnStore(a.store), probe, ACTS, a.batch_size); dt=time.time()-t0
+        print(f"[ok] added probe columns to {a.store} rows={n} rows_per_s={n/max(dt,1e-9):.0f}"); return
+    if not (a.in_jsonl and a.out_jsonl): ap.error("--in_jsonl and --out_jsonl are required without --store")
+    with open(a.in_jsonl,"r",encoding="utf-8") as f, open(a.out_jsonl,"w",encoding="utf-8") as g:
+        while True:
+            rows=[json.loads(l) for l in itertools.islice(f, a.batch_size)]
+            if not rows: break
+            annotate(rows, probe([r["text"] for r in rows], [r.get("lang","en") for r in rows]), ACTS)
+            g.write("".join(json.dumps(r, ensure_ascii=False)+"\n" for r in rows)); n+=len(rows)
+    dt=time.time()-t0
+    print(f"[ok] wrote {a.out_jsonl} rows={n} rows_per_s={n/max(dt,1e-9):.0f}")
+
+if __name__=="__main__":
+    main()
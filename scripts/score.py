@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Score base and heavy predictions in one streaming pass: EM/F1 for qa rows, ROUGE-L for instr rows.
+
+Prediction lines are read in chunks and scored on a process pool; at most `window` chunks are
+in flight and finished chunks are written in input order, so memory stays flat on large files.
+The reference is looked up in --gold_jsonl when given, else taken from the row's own
+answer/reference field. With --modes every row is scored for each listed mode, a missing
+pred_<mode> as "" (as score_qa.py/score_instr.py did); without it base and heavy are scored
+where present. Either way the summary line counts the rows that had no prediction.
+
+    python scripts/score.py --pred_jsonl exp/qa.base.jsonl --out_jsonl exp/qa.base.scored.jsonl
+"""
+import argparse, collections, json, os, itertools, time
+from concurrent.futures import ProcessPoolExecutor
+from score_qa import em_f1
+from score_instr import rouge_l
+import metrics
+
+GOLD = {}
+
+def load_gold(path):
+    """id -> reference text; keeps only the strings, not the gold rows."""
+    gold = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for l in f:
+            g = json.loads(l); ref = g.get("answer", g.get("reference"))
+            if ref is not None: gold[g["id"]] = ref
+    return gold
+
+def _init(gold, record=False):
+    global GOLD
+    GOLD = gold
+    if record: metrics.ENABLED = True  # worker processes: results go back to the parent via drain()
+
+def task_of(r, task=None):
+    return task or r.get("task", "qa" if "question" in r else "instr")
+
+def score_row(r, modes, task=None, strict=False):
+    """Add score_<mode> for every mode whose pred_<mode> is in the row, or for every mode with
+    strict (a missing pred scores as "", as score_qa/score_instr did); returns
+    (task, modes scored, modes without a pred_<mode>)."""
+    t = task_of(r, task); lack = [m for m in modes if f"pred_{m}" not in r]
+    done = list(modes) if strict else [m for m in modes if m not in lack]
+    if not done: return t, done, lack
+    ref = GOLD.get(r["id"])
+    if ref is None: ref = r.get("answer" if t == "qa" else "reference")
+    if ref is None: raise KeyError(f"no gold {'answer' if t == 'qa' else 'reference'} for id={r['id']}")
+    for m in done:
+        pred = r.get(f"pred_{m}") or ""
+        with metrics.span("score", task=t):
+            if t == "qa":
+                em, F = em_f1(pred, ref); r[f"score_{m}"] = {"em": em, "f1": F}
+            else:
+                r[f"score_{m}"] = {"rougeL": rouge_l(pred, ref)}
+    return t, done, lack
+
+def score_chunk(lines, modes, task=None, strict=False):
+    """(scored JSONL text, {(task, mode): Counter of n, no_pred and metric sums}, metrics.drain()) for a list of lines."""
+    out = []; tot = {}
+    for l in lines:
+        r = json.loads(l); t, done, lack = score_row(r, modes, task, strict)
+        for m in done:
+            acc = tot.setdefault((t, m), collections.Counter()); acc["n"] += 1; acc.update(r[f"score_{m}"])
+        for m in lack: tot.setdefault((t, m), collections.Counter())["no_pred"] += 1
+        out.append(json.dumps(r, ensure_ascii=False) + "\n")
+    metrics.inc("rows_total", len(lines), stage="score")
+    return "".join(out), tot, metrics.drain()
+
+def scored_chunks(f, modes, task=None, workers=1, chunk=2000, window=None, strict=False):
+    """Yield score_chunk results for consecutive chunks of `f`, in input order."""
+    chunks = iter(lambda: list(itertools.islice(f, chunk)), [])
+    if workers <= 1:
+        for lines in chunks:
+            yield score_chunk(lines, modes, task, strict)
+        return
+    window = max(window or 4*workers, workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(GOLD, metrics.ENABLED)) as ex:
+        pending = collections.deque()
+        for lines in chunks:
+            pending.append(ex.submit(score_chunk, lines, modes, task, strict))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def report(tot, strict=False):
+    """One line per (task, mode) that was scored, counting its rows without pred_<mode> as
+    no_pred_empty (scored as "", with strict) or no_pred_skipped."""
+    for (t, m), s in sorted(tot.items()):
+        if not s["n"]: continue
+        n = s["n"]; miss = f" no_pred_{'empty' if strict else 'skipped'}={s['no_pred']}" if s["no_pred"] else ""
+        if t == "qa": print(f"[QA {m}] N={s['n']} EM={s['em']/n:.3f} F1={s['f1']/n:.3f}{miss}")
+        else: print(f"[INSTR {m}] N={s['n']} ROUGE-L={s['rougeL']/n:.3f}{miss}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pred_jsonl", required=True)
+    ap.add_argument("--out_jsonl", required=True)
+    ap.add_argument("--gold_jsonl", default=None, help="id -> answer/reference (default: the row's own field)")
+    ap.add_argument("--modes", default=None, help="score every row for these modes, a missing pred_<mode> as \"\" "
+                    "(default: base,heavy, only where pred_<mode> is present)")
+    ap.add_argument("--task", choices=["qa","instr"], default=None, help="override the row's task field")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk", type=int, default=2000, help="rows per worker task")
+    ap.add_argument("--window", type=int, default=None, help="chunks in flight (default 4x workers)")
+    metrics.add_metrics_args(ap)
+    a = ap.parse_args(); metrics.from_args(a)
+    strict = a.modes is not None; modes = [m for m in (a.modes or "base,heavy").split(",") if m]
+    if a.gold_jsonl: _init(load_gold(a.gold_jsonl))
+    t0 = time.time(); tot = {}; n = 0
+    with open(a.pred_jsonl, "r", encoding="utf-8") as f, open(a.out_jsonl, "w", encoding="utf-8") as g:
+        for text, sums, snap in scored_chunks(f, modes, a.task, a.workers, a.chunk, a.window, strict):
+            g.write(text); n += text.count("\n"); metrics.merge(snap)
+            for k, s in sums.items(): tot.setdefault(k, collections.Counter()).update(s)
+    dt = time.time() - t0
+    report(tot, strict)
+    print(f"[ok] wrote {a.out_jsonl} rows={n} workers={a.workers} secs={dt:.1f} rows_per_s={n/max(dt,1e-9):.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,59 @@
 #!/usr/bin/env python3
-import json, argparse
+import json, argparse, itertools
+
 def lcs(a,b):
-    n,m=len(a),len(b); dp=[[0]*(m+1) for _ in range(n+1)]
-    for i in range(n):
-        for j in range(m):
-            dp[i+1][j+1]=dp[i][j]+1 if a[i]==b[j] else max(dp[i][j+1], dp[i+1][j])
-    return dp[n][m]
+    """LCS length of two token lists, bit-parallel (Allison-Dix / Hyyrö).
+
+    Each token of the shorter list owns one bit of an int; every token of the longer list
+    then updates the whole DP row with a few big-int operations, O(n*ceil(m/64)) word ops.
+    """
+    if len(a) < len(b): a, b = b, a
+    m = len(b)
+    if m == 0: return 0
+    masks = {}
+    for j, t in enumerate(b): masks[t] = masks.get(t, 0) | (1 << j)
+    full = (1 << m) - 1; V = full
+    for t in a:
+        U = V & masks.get(t, 0)
+        V = ((V + U) | (V - U)) & full
+    return m - bin(V).count("1")
+
+def lcs_dp(a,b):
+    """Reference two-row DP, kept for checks and benchmarks."""
+    prev = [0]*(len(b)+1)
+    for x in a:
+        cur = [0]
+        for j, y in enumerate(b):
+            cur.append(prev[j]+1 if x == y else max(prev[j+1], cur[j]))
+        prev = cur
+    return prev[-1]
+
 def rouge_l(pred, ref):
     A=pred.strip().split(); B=ref.strip().split()
     if not A or not B: return 0.0
     L=lcs(A,B); prec=L/len(A); rec=L/len(B)
     return (2*prec*rec/(prec+rec)) if (prec+rec)>0 else 0.0
-ap=argparse.ArgumentParser()
-ap.add_argument("--gold_jsonl", required=True); ap.add_argument("--pred_jsonl", required=True)
-ap.add_argument("--mode", choices=["base","heavy"], required=True); ap.add_argument("--out_jsonl", required=True)
-a=ap.parse_args()
-M={"n":0,"rougeL":0.0}
-gold={json.loads(l)["id"]:json.loads(l) for l in open(a.gold_jsonl,"r",encoding="utf-8")}
-out=open(a.out_jsonl,"w",encoding="utf-8")
-for l in open(a.pred_jsonl,"r",encoding="utf-8"):
-    r=json.loads(l); gid=r["id"]; pred=r.get(f"pred_{a.mode}",""); ref=gold[gid]["reference"]
-    s=rouge_l(pred, ref); r[f"score_{a.mode}"]={"rougeL":s}; out.write(json.dumps(r, ensure_ascii=False)+"\n")
-    M["n"]+=1; M["rougeL"]+=s
-out.close(); print(f"[INSTR {a.mode}] N={M['n']} ROUGE-L={M['rougeL']/max(M['n'],1):.3f}")
+
+def rouge_l_batch(preds, refs):
+    """ROUGE-L F for aligned lists of predictions and references."""
+    return [rouge_l(p, r) for p, r in zip(preds, refs)]
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument("--gold_jsonl", required=True); ap.add_argument("--pred_jsonl", required=True)
+    ap.add_argument("--mode", choices=["base","heavy"], required=True); ap.add_argument("--out_jsonl", required=True)
+    a=ap.parse_args()
+    M={"n":0,"rougeL":0.0}
+    gold={json.loads(l)["id"]:json.loads(l) for l in open(a.gold_jsonl,"r",encoding="utf-8")}
+    out=open(a.out_jsonl,"w",encoding="utf-8"); f=open(a.pred_jsonl,"r",encoding="utf-8")
+    while True:
+        rows=[json.loads(l) for l in itertools.islice(f, 1000)]
+        if not rows: break
+        S=rouge_l_batch([r.get(f"pred_{a.mode}","") for r in rows], [gold[r["id"]]["reference"] for r in rows])
+        for r,s in zip(rows,S):
+            r[f"score_{a.mode}"]={"rougeL":s}; out.write(json.dumps(r, ensure_ascii=False)+"\n")
+            M["n"]+=1; M["rougeL"]+=s
+    f.close(); out.close(); print(f"[INSTR {a.mode}] N={M['n']} ROUGE-L={M['rougeL']/max(M['n'],1):.3f}")
+
+if __name__=="__main__":
+    main()
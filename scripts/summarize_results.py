@@ -1,48 +1,88 @@
 #!/usr/bin/env python3
-import re, json
-
-def best_from_file(path, tag, param_name):
-    best=None
-    with open(path,"r",encoding="utf-8") as f:
-        for line in f:
-            if line.startswith(tag):
-                m=re.search(rf"avg_quality=([0-9.]+).*total_tokens=([0-9.]+).*{param_name}=([0-9.]+)", line)
-                if m:
-                    q,t,thr = float(m.group(1)), float(m.group(2)), float(m.group(3))
-                    if (best is None) or (q>best[0]) or (q==best[0] and t<best[1]):
-                        best=(q,t,thr)
-    return best
+"""Summary tables from the results store (results_store.py): best PGBI / margin point per task.
+
+Points come from the latest sweep, or without one from the newest gate_blend / gate_margin run
+per lambda / tau, among runs on unchanged inputs under --inputs_under (see results_store.py).
+Base and heavy rows come from the endpoints that run recorded; runs imported from old reports
+have none, so those fall back to averaging the scored logs. With --tables the same numbers are
+written to <dir>/main_results.md and main_results.tex.
+
+    python scripts/summarize_results.py --tables paper/tables
+"""
+import argparse, os, sys
+from joinio import rows, score_key, warn_estimated
+from results_store import ResultsStore, add_reader_args, input_roots
+
+TASKS = [("qa", "QA"), ("instr", "Instruction")]
+
+def best_point(store, task, method, tag, under):
+    """(quality, tokens, x) with the highest quality, fewest tokens among ties, and its run; None without points."""
+    pts, run = store.curve_points(task, method, tag, under)
+    if not pts: return None, run
+    x, q, t, _, _ = max(pts, key=lambda p: (p[1], -p[2]))
+    return (q, t, x), run
 
 def base_heavy_avg(base_scored, heavy_scored, task):
-    b=[json.loads(l) for l in open(base_scored,"r",encoding="utf-8")]
-    h=[json.loads(l) for l in open(heavy_scored,"r",encoding="utf-8")]
-    if task=="qa":
-        qb=sum(x.get("score_base",{}).get("f1",0.0) for x in b)/max(len(b),1)
-        qh=sum(x.get("score_heavy",{}).get("f1",0.0) for x in h)/max(len(h),1)
-    else:
-        qb=sum(x.get("score_base",{}).get("rougeL",0.0) for x in b)/max(len(b),1)
-        qh=sum(x.get("score_heavy",{}).get("rougeL",0.0) for x in h)/max(len(h),1)
+    key=score_key(task)
+    nb=qb=0.0
+    for x in rows(base_scored): nb+=1; qb+=x.get("score_base",{}).get(key,0.0)
+    nh=qh=th=0.0; est=0
+    for x in rows(heavy_scored):
+        nh+=1; qh+=x.get("score_heavy",{}).get(key,0.0); th+=float(x.get("cost_heavy",0.0) or 0.0); est+=bool(x.get("cost_estimated_heavy"))
+    warn_estimated(est)
     tb=0.0
-    th=sum(float(x.get("cost_heavy",0.0) or 0.0) for x in h)
-    return (qb,tb),(qh,th)
-
-def table(task):
-    if task=="qa":
-        base,heavy = base_heavy_avg("exp/logs/qa_en.base.scored.jsonl","exp/logs/qa_en.heavy.scored.jsonl","qa")
-        pgbi = best_from_file("exp/reports/pcurve_pgbi_qa.txt","[gate]","lambda")
-        marg = best_from_file("exp/reports/pcurve_margin_qa.txt","[gate-margin]","tau")
+    return (qb/max(nb,1),tb),(qh/max(nh,1),th)
+
+def summary(store, task, under):
+    """{"base", "heavy": (quality, tokens), "pgbi", "margin": (quality, tokens, x) or None} for a task."""
+    pgbi, run = best_point(store, task, "pgbi", "gate", under)
+    marg, _ = best_point(store, task, "margin", "gate-margin", under)
+    if pgbi is None and marg is None:
+        print(f"[warn] no pgbi / margin runs for {task} in {store.path} on unchanged inputs under {' '.join(input_roots(under)) or 'anywhere'}; only base and heavy are shown",
+              file=sys.stderr)
+    if run and run["base_quality"] is not None and run["heavy_quality"] is not None:
+        base, heavy = (run["base_quality"], 0.0), (run["heavy_quality"], run["heavy_tokens"])
     else:
-        base,heavy = base_heavy_avg("exp/logs/instr_en.base.scored.jsonl","exp/logs/instr_en.heavy.scored.jsonl","instr")
-        pgbi = best_from_file("exp/reports/pcurve_pgbi_instr.txt","[gate]","lambda")
-        marg = best_from_file("exp/reports/pcurve_margin_instr.txt","[gate-margin]","tau")
+        L = f"exp/logs/{task}_en"
+        base, heavy = base_heavy_avg(f"{L}.base.scored.jsonl", f"{L}.heavy.scored.jsonl", task)
+    return {"base": base, "heavy": heavy, "pgbi": pgbi, "margin": marg}
 
+def table(s, task):
     print(f"\n### {task.upper()} summary")
     print("| Method | Quality | Tokens | Note |")
     print("|---|---:|---:|---|")
-    print(f"| Base | {base[0]:.3f} | {base[1]:.0f} | — |")
-    print(f"| Heavy | {heavy[0]:.3f} | {heavy[1]:.0f} | all heavy |")
-    if pgbi: print(f"| PGBI (best λ={pgbi[2]:g}) | {pgbi[0]:.3f} | {pgbi[1]:.0f} | learned gate |")
-    if marg: print(f"| Margin (best τ={marg[2]:g}) | {marg[0]:.3f} | {marg[1]:.0f} | uncertainty baseline |")
+    print(f"| Base | {s['base'][0]:.3f} | {s['base'][1]:.0f} | — |")
+    print(f"| Heavy | {s['heavy'][0]:.3f} | {s['heavy'][1]:.0f} | all heavy |")
+    if s["pgbi"]: print(f"| PGBI (best λ={s['pgbi'][2]:g}) | {s['pgbi'][0]:.3f} | {s['pgbi'][1]:.0f} | learned gate |")
+    if s["margin"]: print(f"| Margin (best τ={s['margin'][2]:g}) | {s['margin'][0]:.3f} | {s['margin'][1]:.0f} | uncertainty baseline |")
+
+def table_rows(s):
+    out = [("Base", "Base", s["base"], "—"), ("Heavy", "Heavy", s["heavy"], "all heavy")]
+    if s["pgbi"]: out.append((f"PGBI (λ={s['pgbi'][2]:g})", f"PGBI ($\\lambda={s['pgbi'][2]:g}$)", s["pgbi"], "learned gate"))
+    if s["margin"]: out.append((f"Margin (τ={s['margin'][2]:g})", f"Margin ($\\tau={s['margin'][2]:g}$)", s["margin"], "uncertainty baseline"))
+    return out
+
+def write_tables(sums, out_dir):
+    os.makedirs(out_dir, exist_ok=True); md = []; tex = ["\\begin{tabular}{lrrl}\\toprule"]
+    for i, (task, title) in enumerate(TASKS):
+        md += ([""] if i else []) + [f"### {title}", "| Method | Quality | Tokens | Note |", "|---|---:|---:|---|"]
+        tex.append(("\\midrule" if i else "") + f"\\multicolumn{{4}}{{c}}{{{title}}}\\\\\\midrule")
+        for name_md, name_tex, v, note in table_rows(sums[task]):
+            md.append(f"| {name_md} | {v[0]:.3f} | {v[1]:.0f} | {note} |"); tex.append(f"{name_tex} & {v[0]:.3f} & {v[1]:.0f} & {note} \\\\")
+    tex.append("\\bottomrule\\end{tabular}")
+    for ext, lines in (("md", md), ("tex", tex)):
+        path = os.path.join(out_dir, f"main_results.{ext}")
+        with open(path, "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+
+def main():
+    ap = argparse.ArgumentParser()
+    add_reader_args(ap)
+    ap.add_argument("--tables", default=None, help="also write main_results.md/.tex to this directory")
+    a = ap.parse_args()
+    store = ResultsStore(a.results)
+    sums = {task: summary(store, task, a.inputs_under) for task, _ in TASKS}
+    for task, _ in TASKS: table(sums[task], task)
+    if a.tables: write_tables(sums, a.tables)
 
 if __name__=="__main__":
-    table("qa"); table("instr")
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Whole budget curve in one pass instead of one gate_blend / gate_margin run per point.
+
+PGBI uses heavy iff p*gain_scale >= lambda*cost, i.e. iff lambda <= p*gain_scale/cost, so after
+one batched predict_proba and one sort by that ratio every lambda is a prefix of the rows:
+quality and tokens come from cumulative sums at searchsorted positions. The margin baseline
+(heavy iff margin < tau) is the same with rows sorted by margin.
+
+Lines are printed in the gate_blend / gate_margin format; the points also go to the results
+store (--results) at full precision, which is what the summary, tables and plots read.
+"""
+import argparse, time
+import numpy as np, joblib
+from act_feats import voc_features, prob_matrix, top2_margin, VOC_ACTS
+from gate_blend import unwrap_clf, pos_probs, model_mask
+from joinio import scored_arrays, add_join_arg
+from cost_model import CostModel
+import colstore, metrics
+from results_store import add_results_arg, record
+
+class Curve:
+    """Quality/tokens when the heavy set is the first k rows in `order`."""
+    def __init__(self, sb, sh, cost, order):
+        self.n = len(sb); self.base_sum = float(sb.sum())
+        self.dq = np.concatenate([[0.0], np.cumsum((sh - sb)[order])])
+        self.dt = np.concatenate([[0.0], np.cumsum(cost[order])])
+
+    def at(self, k):
+        k = np.asarray(k)
+        return (self.base_sum + self.dq[k]) / max(self.n, 1), self.dt[k]
+
+def pgbi_curve(p, sb, sh, cost, gain_scale, lambdas, price=None):
+    """price: the cost the gate sees (e.g. predicted); tokens are still summed from `cost`."""
+    s = p * gain_scale; price = cost if price is None else price
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(price > 0, s / np.where(price > 0, price, 1.0), np.where(s >= 0, np.inf, -np.inf))
+    order = np.argsort(-ratio, kind="stable")
+    asc = ratio[order][::-1]
+    k = len(asc) - np.searchsorted(asc, lambdas, side="left")  # rows with ratio >= lambda
+    return Curve(sb, sh, cost, order).at(k)
+
+def margin_curve(m, sb, sh, cost, taus):
+    order = np.argsort(m, kind="stable")
+    k = np.searchsorted(m[order], taus, side="left")  # rows with margin < tau
+    return Curve(sb, sh, cost, order).at(k)
+
+def margins(recs):
+    m = top2_margin(prob_matrix(recs, VOC_ACTS))
+    have = np.array(["probe_margin" in r for r in recs], dtype=bool)
+    if have.any():
+        m[have] = [float(r["probe_margin"]) for r, h in zip(recs, have) if h]
+    return m
+
+def grid(values, n, lo, hi):
+    if values:
+        return np.array([float(v) for v in values.split(",")])
+    return np.concatenate([[0.0], np.geomspace(lo, hi, n)])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--task", choices=["qa","instr"], required=True)
+    ap.add_argument("--base_scored", default=None)
+    ap.add_argument("--heavy_scored", default=None)
+    ap.add_argument("--store", default=None, help="column store with score_base/score_heavy/cost_heavy instead of the two files")
+    ap.add_argument("--method", choices=["pgbi","margin"], default="pgbi")
+    ap.add_argument("--voc_model", default="models/voc.joblib")
+    ap.add_argument("--gain_scale", type=float, default=1.0)
+    ap.add_argument("--cost_model", default=None, help="pgbi: order rows by predicted heavy cost (tokens stay actual)")
+    ap.add_argument("--values", default=None, help="comma-separated lambdas (pgbi) or taus (margin)")
+    ap.add_argument("--n", type=int, default=2000, help="grid size when --values is not given")
+    ap.add_argument("--lo", type=float, default=None)
+    ap.add_argument("--hi", type=float, default=None)
+    ap.add_argument("--tag", default=None, help="line prefix, e.g. gate-all (default gate / gate-margin)")
+    add_join_arg(ap); add_results_arg(ap); metrics.add_metrics_args(ap)
+    a = ap.parse_args(); metrics.from_args(a)
+    if not a.store and not (a.base_scored and a.heavy_scored): ap.error("need --store or --base_scored and --heavy_scored")
+
+    t0 = time.time()
+    if a.method == "pgbi":
+        model = joblib.load(a.voc_model); clf = unwrap_clf(model); mask = model_mask(model)
+        cm = CostModel(a.cost_model) if a.cost_model else None
+        featurize = lambda recs: np.column_stack([pos_probs(clf, voc_features(recs) * mask)] + ([cm.predict(recs, "heavy")] if cm else []))
+    else:
+        featurize = margins
+    if a.store:
+        F, sb, sh, cost = colstore.scored_arrays(colstore.ColumnStore(a.store), a.task, featurize)
+    else:
+        F, sb, sh, cost = scored_arrays(a.base_scored, a.heavy_scored, a.task, featurize, a.join)
+    t1 = time.time()
+    if a.method == "pgbi":
+        xs = grid(a.values, a.n, a.lo or 1e-5, a.hi or 1.0)
+        Q, T = pgbi_curve(F[:, 0], sb, sh, cost, a.gain_scale, xs, F[:, 1] if F.shape[1] > 1 else None)
+        tag = a.tag or "gate"; fmt = lambda x: f"lambda={x:g} gain_scale={a.gain_scale}"
+    else:
+        xs = grid(a.values, a.n, a.lo or 1e-3, a.hi or 1.0)
+        Q, T = margin_curve(F, sb, sh, cost, xs)
+        tag = a.tag or "gate-margin"; fmt = lambda x: f"tau={x:g}"
+    t2 = time.time()
+    record(a.results, "sweep_gate.py", a.method, a.task, list(zip(xs.tolist(), Q.tolist(), T.tolist())), tag=tag, n=len(sb),
+           params={"gain_scale": a.gain_scale, "join": a.join} if a.method == "pgbi" else {"join": a.join},
+           models={"voc": a.voc_model, "cost": a.cost_model} if a.method == "pgbi" else {},
+           inputs=[a.store] if a.store else [a.base_scored, a.heavy_scored],
+           endpoints=(float(sb.mean()), float(sh.mean()), float(cost.sum())) if len(sb) else None)
+    print("\n".join(f"[{tag}] N={len(sb)} avg_quality={q:.3f} total_tokens={t:.1f} {fmt(x)}"
+                    for x, q, t in zip(xs.tolist(), Q.tolist(), T.tolist())))
+    print(f"[sweep] method={a.method} points={len(xs)} load_s={t1-t0:.3f} sweep_s={t2-t1:.4f}")
+
+if __name__ == "__main__":
+    main()
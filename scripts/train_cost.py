@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Fit per-mode token-cost regressions from logged calls and report their calibration.
+
+Rows are call_openrouter outputs (or scored files) carrying cost_<mode> = usage.total_tokens;
+rows flagged cost_estimated_<mode> (streamed calls cut before the server reported usage) are left out.
+A random --eval_frac of rows is held out; the report gives MAE, R^2, total predicted/actual
+tokens and a decile table of mean predicted vs mean actual cost, summarized as calib_err
+(row-weighted mean |pred - actual| over deciles, relative to the mean actual cost).
+
+    python scripts/train_cost.py --base exp/logs/qa_en.base.jsonl exp/logs/instr_en.base.jsonl \
+        --heavy exp/logs/qa_en.heavy.jsonl exp/logs/instr_en.heavy.jsonl --out models/cost.joblib
+"""
+import json, argparse, pathlib
+import numpy as np, joblib
+from sklearn.linear_model import Ridge
+from cost_model import cost_features, feature_mask, FEATURE_SETS, COST_FEATS, CostModel
+
+def load(paths, mode):
+    """(rows with a billed cost_<mode>, number skipped because cost_estimated_<mode> marks the cost as a guess)."""
+    recs = []; est = 0
+    for p in paths:
+        for l in open(p, "r", encoding="utf-8"):
+            if not l.strip(): continue
+            r = json.loads(l); c = r.get(f"cost_{mode}")
+            if c is None or str(r.get(f"pred_{mode}", "")).startswith("[ERROR]"): continue
+            if r.get(f"cost_estimated_{mode}"): est += 1; continue
+            recs.append(r)
+    return recs, est
+
+def calibration(pred, y, bins=10):
+    """Lines of the decile table and calib_err."""
+    order = np.argsort(pred, kind="stable"); lines = []; err = 0.0
+    for k, idx in enumerate(np.array_split(order, min(bins, max(len(order), 1)))):
+        if not len(idx): continue
+        mp, my = pred[idx].mean(), y[idx].mean(); err += len(idx) * abs(mp - my)
+        lines.append(f"  bin={k} n={len(idx)} mean_pred={mp:.1f} mean_actual={my:.1f}")
+    return lines, err / max(len(y), 1) / max(y.mean(), 1e-9) if len(y) else 0.0
+
+def report(mode, pred, y):
+    if not len(y): return [f"[cost {mode}] no eval rows"]
+    mae = float(np.abs(pred - y).mean()); ss = float(((y - y.mean())**2).sum())
+    r2 = 1 - float(((y - pred)**2).sum()) / ss if ss > 0 else float("nan")
+    table, ce = calibration(pred, y)
+    return [f"[cost {mode}] n={len(y)} mae={mae:.2f} r2={r2:.3f} total_ratio={pred.sum()/max(y.sum(),1e-9):.4f} calib_err={ce:.4f}"] + table
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", nargs="*", default=[], help="logged base-call JSONL files with cost_base")
+    ap.add_argument("--heavy", nargs="*", default=[], help="logged heavy-call JSONL files with cost_heavy")
+    ap.add_argument("--out", default="models/cost.joblib")
+    ap.add_argument("--feature_set", choices=sorted(FEATURE_SETS), default="all")
+    ap.add_argument("--alpha", type=float, default=1.0, help="ridge penalty")
+    ap.add_argument("--eval_frac", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--report", default="exp/reports/cost_report.txt")
+    a = ap.parse_args()
+
+    mask = feature_mask(a.feature_set); rng = np.random.default_rng(a.seed)
+    bundle = {"kind": "cost_linear", "feature_set": a.feature_set, "feats": COST_FEATS, "modes": {}}
+    lines = [f"[info] feature_set={a.feature_set} alpha={a.alpha} eval_frac={a.eval_frac}"]
+    evals = {}
+    for mode, paths in (("base", a.base), ("heavy", a.heavy)):
+        recs, est = load(paths, mode)
+        if est: lines.append(f"[warn] {mode}: skipped {est} rows with an estimated cost_{mode} (stream stopped before usage)")
+        if not recs: continue
+        X = cost_features(recs, mode) * mask; y = np.array([float(r[f"cost_{mode}"]) for r in recs])
+        test = rng.random(len(y)) < a.eval_frac
+        if test.all() or not test.any(): test = np.zeros(len(y), dtype=bool)
+        reg = Ridge(alpha=a.alpha).fit(X[~test], y[~test])
+        bundle["modes"][mode] = {"w": reg.coef_.tolist(), "b": float(reg.intercept_), "n_train": int((~test).sum())}
+        evals[mode] = (X[test], y[test]) if test.any() else (X, y)
+        if not test.any(): lines.append(f"[warn] {mode}: too few rows to hold out; reporting training fit")
+    if not bundle["modes"]:
+        raise SystemExit("[error] No rows with cost_base/cost_heavy in the given files.")
+    cm = CostModel(bundle)
+    for mode, (X, y) in evals.items():
+        lines += report(mode, cm.predict_X(X, mode), y)
+    pathlib.Path(a.out).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(bundle, a.out)
+    pathlib.Path(a.report).parent.mkdir(parents=True, exist_ok=True)
+    open(a.report, "w").write("\n".join(lines) + "\n")
+    print("\n".join(lines)); print("[ok] saved", a.out)
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,25 @@
 #!/usr/bin/env python3
-import json, pathlib, math, argparse
+import json, pathlib, argparse
 import numpy as np, joblib
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report
 
-ACTS = ["statement","question","request","promise","expressive","declaration"]
-WH = ("who","what","when","where","why","how","which","whom","whose")
-REQ = ("please","kindly","could you","would you","let me","let us","do ","make ","give ","tell ")
+from act_feats import PROBE_ACTS as ACTS, probe_features
 
 def feats(t: str, lang: str):
-    t = t.strip()
-    low = t.lower()
-    L = len(t)
-    return [
-        math.log1p(L),
-        float(t.endswith("?") or t.endswith("？")),
-        float(any(low.startswith(w+" ") for w in WH)),
-        float(("请" in t) or any(p in low for p in REQ)),
-        float("？" in t),
-        float("!" in t or "！" in t),
-        float("…" in t or "..." in t),
-        float(lang == "zh"),
-        float(lang == "en"),
-    ]
+    """Single-row probe features; see act_feats.probe_features for the rules."""
+    return probe_features([t], [lang])[0].tolist()
 
 def _load_jsonl(path):
     return [json.loads(x) for x in open(path, "r", encoding="utf-8") if x.strip()]
 
 def _toXY(path):
     data = _load_jsonl(path)
-    X = [feats(d["text"], d.get("lang","en")) for d in data]
+    X = probe_features([d["text"] for d in data], [d.get("lang","en") for d in data])
     y = [ACTS.index(d["gold_act"]) for d in data]
-    return np.array(X), np.array(y)
+    return X.astype(np.float64), np.array(y)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Train the hashed n-gram act probe out of core (see probe_hash.py).
+
+Labeled JSONL ({text, lang, gold_act}) is read in --chunk rows at a time, shuffled within the
+chunk and fed to partial_fit, for --epochs passes over the files; memory depends on the chunk
+size and the hash width, not on the corpus. Rows whose id hashes below --eval_pct percent are
+held out and scored in a final streaming pass.
+
+    python scripts/train_probe_hash.py --train data/acts/heldout_en.jsonl data/acts/heldout_zh.jsonl
+    python scripts/run_probe.py --model models/act_probe_hash.joblib --in_jsonl ... --out_jsonl ...
+"""
+import json, pathlib, argparse, itertools, zlib, time
+import numpy as np, joblib
+from sklearn.metrics import classification_report
+from act_feats import PROBE_ACTS as ACTS
+from probe_hash import HashProbe
+
+def chunks(paths, n):
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            while True:
+                lines = list(itertools.islice(f, n))
+                if not lines: break
+                rows = [r for r in map(json.loads, filter(str.strip, lines)) if r.get("gold_act") in ACTS]
+                if rows: yield rows
+
+def held_out(r, pct):
+    return zlib.crc32(str(r.get("id", r["text"])).encode("utf-8")) % 100 < pct
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--train", nargs="+", default=["data/acts/heldout_en.jsonl", "data/acts/heldout_zh.jsonl"])
+    ap.add_argument("--out", default="models/act_probe_hash.joblib")
+    ap.add_argument("--report", default="exp/reports/probe_hash_report.txt")
+    ap.add_argument("--n_features", type=int, default=2**19, help="char n-gram hash width (word n-grams get a quarter)")
+    ap.add_argument("--alpha", type=float, default=1e-5)
+    ap.add_argument("--epochs", type=int, default=5)
+    ap.add_argument("--chunk", type=int, default=20000)
+    ap.add_argument("--eval_pct", type=float, default=10.0, help="percent of rows held out by id hash (0: report the training fit)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    paths = [p for p in args.train if pathlib.Path(p).exists()]
+    if not paths: raise SystemExit("[error] No labeled data. Run merge_and_check + fill TSVs.")
+    model = HashProbe(ACTS, args.n_features, args.alpha, args.seed); rng = np.random.default_rng(args.seed)
+    t0 = time.time(); n = 0
+    for ep in range(args.epochs):
+        for rows in chunks(paths, args.chunk):
+            rows = [r for r in rows if not held_out(r, args.eval_pct)]
+            if not rows: continue
+            rows = [rows[i] for i in rng.permutation(len(rows))]
+            model.partial_fit([r["text"] for r in rows], [r.get("lang","en") for r in rows], [ACTS.index(r["gold_act"]) for r in rows])
+            n += len(rows)
+    if n == 0: raise SystemExit("[error] every row is held out; lower --eval_pct")
+    dt = time.time() - t0
+    pathlib.Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({"kind": "probe_hash", "model": model, "acts": ACTS}, args.out)
+
+    y = []; pred = []
+    for rows in chunks(paths, args.chunk):
+        rows = [r for r in rows if held_out(r, args.eval_pct)] if args.eval_pct > 0 else rows
+        if not rows: continue
+        P = model.predict_proba([r["text"] for r in rows], [r.get("lang","en") for r in rows])
+        y.extend(ACTS.index(r["gold_act"]) for r in rows); pred.extend(P.argmax(axis=1).tolist())
+    head = f"[info] train_rows={n // args.epochs} epochs={args.epochs} eval={'heldout' if args.eval_pct > 0 else 'train'} eval_rows={len(y)}\n"
+    rep = head + (classification_report(y, pred, labels=list(range(len(ACTS))), target_names=ACTS, digits=3, zero_division=0) if y else "")
+    pathlib.Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    open(args.report, "w").write(rep)
+    print("[ok] saved", args.out, f"fit_secs={dt:.1f} rows_per_s={n/max(dt,1e-9):.0f}")
+    print(rep)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Update the VoC model incrementally from new build_voc_train.py rows.
+
+The checkpoint holds the OnlineVoC state and, per training file, the byte offset already
+consumed, so a refresh reads only the lines appended since the last run: its cost depends on
+the new rows, not on the size of the log history. Rows carrying p_heavy (the probability the
+gate sent them to heavy, written by gate_blend/router --explore) are weighted by 1/p_heavy, so
+the rows that only exploration sent to heavy stand in for every row the gate skipped.
+
+    python scripts/train_voc_online.py --train exp/logs/qa_en.voc_train.jsonl --model models/voc_online.joblib
+"""
+import argparse, json, os, time
+import numpy as np, joblib
+from sklearn.metrics import roc_auc_score, brier_score_loss
+from act_feats import voc_features, feature_mask, FEAT_NAMES
+from voc_online import OnlineVoC
+
+def new_lines(path, offset, batch):
+    """Yield (list of parsed rows, end offset) for whole lines after `offset`; a torn last line is left for next time."""
+    with open(path, "rb") as f:
+        f.seek(offset); rows = []
+        for line in f:
+            if not line.endswith(b"\n"): break
+            offset += len(line)
+            if line.strip(): rows.append(json.loads(line))
+            if len(rows) >= batch:
+                yield rows, offset; rows = []
+        if rows: yield rows, offset
+
+def save(bundle, path):
+    tmp = path + ".tmp"; joblib.dump(bundle, tmp); os.replace(tmp, path)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--train", nargs="+", required=True, help="VoC training JSONL files (append-only logs)")
+    ap.add_argument("--model", default="models/voc_online.joblib", help="checkpoint, read if present and rewritten")
+    ap.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    ap.add_argument("--feature_set", choices=["all","no_acts","uncertainty_only","acts_only"], default="all")
+    ap.add_argument("--batch", type=int, default=4096)
+    ap.add_argument("--checkpoint_every", type=int, default=50, help="batches between checkpoints")
+    ap.add_argument("--alpha", type=float, default=1e-4)
+    ap.add_argument("--eta0", type=float, default=0.01)
+    ap.add_argument("--calib_lr", type=float, default=0.1)
+    ap.add_argument("--seed", type=int, default=0)
+    a = ap.parse_args()
+
+    if os.path.exists(a.model) and not a.fresh:
+        bundle = joblib.load(a.model)
+        if bundle.get("kind") != "voc_online": raise SystemExit(f"[error] {a.model} is not an online VoC checkpoint")
+        if bundle["feature_set"] != a.feature_set: raise SystemExit(f"[error] checkpoint feature_set={bundle['feature_set']}")
+    else:
+        bundle = {"kind": "voc_online", "clf": OnlineVoC(a.alpha, a.eta0, a.calib_lr, a.seed), "feature_set": a.feature_set,
+                  "feat_names": FEAT_NAMES, "offsets": {}}
+    clf = bundle["clf"]; mask = feature_mask(a.feature_set); offsets = bundle["offsets"]
+    os.makedirs(os.path.dirname(a.model) or ".", exist_ok=True)
+    t0 = time.time(); n = 0; since = 0; P = []; Y = []; W = []
+    for path in a.train:
+        key = os.path.abspath(path); off = offsets.get(key, 0)
+        if off > os.path.getsize(path):
+            print(f"[warn] {path} is shorter than its checkpoint offset; reading it from the start"); off = 0
+        for rows, off in new_lines(path, off, a.batch):
+            X = voc_features(rows) * mask; y = np.array([int(r.get("gain", 0)) for r in rows])
+            w = np.array([1.0 / max(float(r.get("p_heavy", 1.0)), 1e-6) for r in rows])
+            pre = clf.update(X, y, w)
+            if pre is not None: P.append(pre); Y.append(y); W.append(w)
+            n += len(rows); offsets[key] = off; since += 1
+            if since >= a.checkpoint_every:
+                save(bundle, a.model); since = 0
+    save(bundle, a.model)
+    msg = f"[online] new_rows={n} total_rows={clf.n_seen} batches={clf.batches} secs={time.time()-t0:.1f}"
+    if P:
+        P = np.concatenate(P); Y = np.concatenate(Y); W = np.concatenate(W)
+        auc = roc_auc_score(Y, P, sample_weight=W) if 0 < Y.mean() < 1 else float("nan")
+        msg += (f" prequential_auc={auc:.4f} brier={brier_score_loss(Y, P, sample_weight=W):.4f}"
+                f" mean_p={np.average(P, weights=W):.4f} mean_y={np.average(Y, weights=W):.4f}")
+    print(msg); print(f"[ok] saved {a.model}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Incrementally trained VoC model: SGD logistic regression plus online Platt calibration.
+
+OnlineVoC is a drop-in for the train_voc.py classifier (predict_proba, classes_), so gates
+load it from the same {"clf": ...} bundle. Each update() costs O(batch): standardization
+statistics, the SGD weights and the calibration map are running state, never refit on history.
+"""
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -35.0, 35.0)))
+
+class OnlinePlatt:
+    """p = sigmoid(a*s + b) fitted by AdaGrad on the log loss of scores seen before training on them."""
+    def __init__(self, lr=0.1):
+        self.a = 1.0; self.b = 0.0; self.lr = lr; self.g2 = np.full(2, 1e-8); self.n = 0
+
+    def update(self, s, y, w=None, epochs=3):
+        s = np.asarray(s, dtype=float); y = np.asarray(y, dtype=float)
+        w = np.ones(len(y)) if w is None else np.asarray(w, dtype=float)
+        for _ in range(epochs):
+            e = (sigmoid(self.a * s + self.b) - y) * w
+            g = np.array([(e * s).sum(), e.sum()]) / max(w.sum(), 1e-12)
+            self.g2 += g * g; self.a, self.b = np.array([self.a, self.b]) - self.lr * g / np.sqrt(self.g2)
+        self.n += len(y)
+
+    def __call__(self, s):
+        return sigmoid(self.a * np.asarray(s, dtype=float) + self.b)
+
+class OnlineVoC:
+    classes_ = np.array([0, 1])
+
+    def __init__(self, alpha=1e-4, eta0=0.01, calib_lr=0.1, seed=0):
+        self.scaler = StandardScaler()
+        self.sgd = SGDClassifier(loss="log_loss", alpha=alpha, learning_rate="adaptive", eta0=eta0, random_state=seed)
+        self.platt = OnlinePlatt(calib_lr); self.n_seen = 0; self.batches = 0
+
+    @property
+    def fitted(self):
+        return hasattr(self.sgd, "coef_")
+
+    def score(self, X):
+        return self.sgd.decision_function(self.scaler.transform(X))
+
+    def update(self, X, y, w=None):
+        """Calibrate on this batch's scores from the current weights (prequential, so the
+        calibration data is never data the weights were trained on), then train on it.
+        Returns those pre-update probabilities, or None for the very first batch."""
+        X = np.asarray(X, dtype=float); y = np.asarray(y, dtype=int)
+        pre = None
+        if self.fitted:
+            s = self.score(X); pre = self.platt(s); self.platt.update(s, y, w)
+        self.scaler.partial_fit(X, sample_weight=w)
+        self.sgd.partial_fit(self.scaler.transform(X), y, classes=self.classes_, sample_weight=w)
+        self.n_seen += len(y); self.batches += 1
+        return pre
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=float)
+        p = self.platt(self.score(X)) if self.fitted else np.full(len(X), 0.5)
+        return np.column_stack([1.0 - p, p])
+
+    def linear(self):
+        """(W, b, A, B) with P = 1/(1+exp(A*(X@W + b) + B)) in raw feature space, for router.LinearVoC."""
+        sd = self.scaler.scale_; w = self.sgd.coef_[0] / sd
+        return w, float(self.sgd.intercept_[0] - (self.scaler.mean_ / sd) @ self.sgd.coef_[0]), -self.platt.a, -self.platt.b